@@ -0,0 +1,257 @@
+"""Reproducible benchmarks for the simulator, graph handling and rendering.
+
+Runs on any Linux box: rendering goes through the virtual LED matrix.
+
+    python benchmarks/bench.py run --output results.json
+    python benchmarks/bench.py run --sizes 81,1089,10201,100489,1000000
+    python benchmarks/bench.py compare baseline.json results.json
+
+Graphs are seeded 8-spaced lattices (81 nodes is the 9x9 grid the demo
+uses) with 2-4 random connections per node, like ``GraphManager`` makes.
+Each benchmark reports the best of ``--repeat`` runs; benchmarks that are
+too slow for a size (``MAX_NODES``) are skipped and left out of that size's
+results.  Timings depend on the machine, so no baseline is committed: keep
+the output of a ``run`` on the target machine (e.g. the Pi) as the baseline
+and compare later runs against it.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DIJK_MATRIX', 'virtual')
+
+from GraphManager import GraphManager
+from LEDGraphVisualizer import LEDGraphVisualizer
+from BatchSimulator import BatchSimulator
+from dijkstra import DijkstraSimulator
+
+DEFAULT_SIZES = [81, 289, 1089, 10201, 100489]
+STEP = 8
+# batch_step 同时跑的查询数和步数
+BATCH_QUERIES = 16
+BATCH_STEPS = 200
+
+# GraphManager 的生成和连通性修复至少是 O(n^2)（千级节点已需要数十秒），大图上直接跳过
+MAX_NODES = {
+    'generate': 289,
+    'connectivity': 289,
+}
+
+
+def make_lattice_graph(n_nodes, seed, min_connections=2, max_connections=4,
+                       min_weight=1, max_weight=10, distance_factor=2.5):
+    """Seeded random graph on a sqrt(n) x sqrt(n) lattice, built with NumPy."""
+    rng = np.random.default_rng(seed)
+    side = int(round(n_nodes ** 0.5))
+    reach = int(distance_factor)
+    offsets = np.array([(dx, dy) for dx in range(-reach, reach + 1) for dy in range(-reach, reach + 1)
+                        if 1 <= (dx * dx + dy * dy) ** 0.5 <= distance_factor])
+
+    xs, ys = np.divmod(np.arange(side * side), side)
+    nx_ = xs[:, None] + offsets[:, 0]
+    ny_ = ys[:, None] + offsets[:, 1]
+    valid = (nx_ >= 0) & (nx_ < side) & (ny_ >= 0) & (ny_ < side)
+
+    # 每个节点随机挑选 k 个合法邻居：对随机数排序，越界的排到最后
+    keys = np.where(valid, rng.random(valid.shape), np.inf)
+    order = np.argsort(keys, axis=1)
+    k = rng.integers(min_connections, max_connections + 1, size=len(xs))
+    k = np.minimum(k, valid.sum(axis=1))
+    picked = np.arange(len(offsets))[None, :] < k[:, None]
+
+    src = np.repeat(np.arange(len(xs)), k)
+    chosen = order[picked]
+    dst_x = nx_[src, chosen]
+    dst_y = ny_[src, chosen]
+    weights = rng.integers(min_weight, max_weight + 1, size=len(src))
+
+    graph = {(int(x) * STEP, int(y) * STEP): [] for x, y in zip(xs, ys)}
+    for sx, sy, dx, dy, w in zip((xs[src] * STEP).tolist(), (ys[src] * STEP).tolist(),
+                                 (dst_x * STEP).tolist(), (dst_y * STEP).tolist(), weights.tolist()):
+        graph[(sx, sy)].append(((dx, dy), w))
+    last = (side - 1) * STEP
+    return graph, (0, 0), (last, last)
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def bench_size(n_nodes, seed, repeat, frames):
+    graph, start, end = make_lattice_graph(n_nodes, seed)
+    n_edges = sum(len(edges) for edges in graph.values())
+    results = {}
+
+    results['build_graph'] = best_of(repeat, lambda: make_lattice_graph(n_nodes, seed))
+
+    if n_nodes <= MAX_NODES['generate']:
+        side = int(round(n_nodes ** 0.5))
+
+        def generate():
+            gm = GraphManager(width=(side - 1) * STEP, height=(side - 1) * STEP, step=STEP,
+                              start_node=start, end_node=end, seed=seed)
+            gm.generate_new_graph()
+        results['generate'] = best_of(repeat, generate)
+
+    gm = GraphManager(start_node=start, end_node=end)
+    gm.graph = graph
+    gm.nodes = set(graph)
+    gm._calculate_stats()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'graph.pkl')
+        results['save'] = best_of(repeat, lambda: gm.save_to_file(path))
+        results['load'] = best_of(repeat, lambda: GraphManager.load_from_file(path))
+
+    if n_nodes <= MAX_NODES['connectivity']:
+        def connectivity():
+            copy = GraphManager(start_node=start, end_node=end, seed=seed)
+            copy.graph = {node: list(edges) for node, edges in graph.items()}
+            copy.nodes = set(graph)
+            copy.ensure_connectivity()
+        results['connectivity'] = best_of(repeat, connectivity)
+
+    results['simulator_init'] = best_of(repeat, lambda: DijkstraSimulator(graph, start, end))
+
+    steps = 0
+
+    def solve():
+        nonlocal steps
+        simulator = DijkstraSimulator(graph, start, end)
+        steps = 0
+        while simulator.step() is not None:
+            steps += 1
+    results['solve'] = best_of(repeat, solve)
+    results['step'] = results['solve'] / max(steps, 1)
+
+    # 批量引擎每步推进全部查询，按“每步每个查询”的耗时记录
+    rng = random.Random(seed)
+    nodes = sorted(graph)
+    queries = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(BATCH_QUERIES)]
+    batch_simulator = BatchSimulator(graph, queries)
+    batch_steps = 0
+
+    def batch():
+        nonlocal batch_steps
+        batch_simulator.reset()
+        batch_steps = batch_simulator.run(max_steps=BATCH_STEPS)
+    results['batch_step'] = best_of(repeat, batch) / max(batch_steps, 1) / BATCH_QUERIES
+
+    # 超过 64x64 个节点时 LEDGraphVisualizer 自动切换到密度渲染，所以所有规模都能测
+    simulator = DijkstraSimulator(graph, start, end)
+    for _ in range(max(steps // 2, 1)):
+        state = simulator.step()
+    visualizer = LEDGraphVisualizer(graph, start, end, matrix_backend='virtual')
+    results['render_led'] = best_of(repeat, lambda: [visualizer.draw_frame(state)
+                                                     for _ in range(frames)]) / frames
+
+    return {'nodes': len(graph), 'edges': n_edges, 'steps': steps, 'seconds': results}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': {},
+    }
+    for n_nodes in args.sizes:
+        # 模拟器找到路径时会打印整条路径，这里静音
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = bench_size(n_nodes, args.seed, args.repeat, args.frames)
+        report['results'][str(n_nodes)] = result
+        summary = ', '.join(f"{name} {seconds * 1000:.3f}ms" for name, seconds in result['seconds'].items())
+        print(f"n={result['nodes']} e={result['edges']}: {summary}")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        return compare_files(args.baseline, args.output, args.threshold)
+    return 0
+
+
+def compare_files(baseline_path, current_path, threshold):
+    """Print the per-benchmark ratio and return 1 if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressions = 0
+    for size, result in current.items():
+        if size not in baseline:
+            continue
+        for name, seconds in result['seconds'].items():
+            before = baseline[size]['seconds'].get(name)
+            if not before or seconds is None:
+                continue
+            ratio = seconds / before
+            flag = ''
+            if ratio > 1 + threshold:
+                flag = '  REGRESSION'
+                regressions += 1
+            elif ratio < 1 - threshold:
+                flag = '  faster'
+            print(f"n={size:>8} {name:<16} {before * 1000:10.3f}ms -> {seconds * 1000:10.3f}ms  x{ratio:.2f}{flag}")
+    print(f"{regressions} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmarks and write JSON results")
+    run_parser.add_argument('--sizes', type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_SIZES)
+    run_parser.add_argument('--seed', type=int, default=1234)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--frames', type=int, default=10, help="frames per render measurement")
+    run_parser.add_argument('--output', default='bench_results.json')
+    run_parser.add_argument('--baseline', help="compare against this results file afterwards")
+    run_parser.add_argument('--threshold', type=float, default=0.15)
+
+    compare_parser = commands.add_parser('compare', help="flag regressions against a baseline")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        return run(args)
+    return compare_files(args.baseline, args.current, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
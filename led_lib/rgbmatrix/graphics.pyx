@@ -1,7 +1,9 @@
 # distutils: language = c++
 
+cimport cython
 from libcpp cimport bool
 from libc.stdint cimport uint8_t, uint32_t
+from libc.stdlib cimport abs
 
 from . cimport core
 
@@ -49,6 +51,77 @@ def DrawCircle(core.Canvas c, int x, int y, int r, Color color):
 def DrawLine(core.Canvas c, int x1, int y1, int x2, int y2, Color color):
     cppinc.DrawLine(c._getCanvas(), x1, y1, x2, y2, color.__color)
 
+@cython.cdivision(True)
+cdef inline void _DrawLine(cppinc.Canvas *canvas, int x1, int y1, int x2, int y2,
+                           uint8_t r, uint8_t g, uint8_t b) nogil:
+    # Same pixels as framebuffer.line_pixels (integer Bresenham walking the
+    # major axis from its lower end, error starting at dx / 2).
+    cdef bint steep = abs(y2 - y1) > abs(x2 - x1)
+    cdef int t, x, y, dx, dy, error, y_step
+    if steep:
+        t = x1; x1 = y1; y1 = t
+        t = x2; x2 = y2; y2 = t
+    if x1 > x2:
+        t = x1; x1 = x2; x2 = t
+        t = y1; y1 = y2; y2 = t
+    dx = x2 - x1
+    dy = abs(y2 - y1)
+    error = dx / 2
+    y = y1
+    y_step = 1 if y1 < y2 else -1
+    for x in range(x1, x2 + 1):
+        if steep:
+            canvas.SetPixel(y, x, r, g, b)
+        else:
+            canvas.SetPixel(x, y, r, g, b)
+        error -= dy
+        if error < 0:
+            y += y_step
+            error += dx
+
+cdef _check_colors(const uint8_t[:, ::1] colors, Py_ssize_t n):
+    if colors.shape[1] != 3 or colors.shape[0] not in (1, n):
+        raise ValueError("colors must have shape (1, 3) or (n, 3)")
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def DrawLines(core.Canvas c, const int[::1] x1, const int[::1] y1, const int[::1] x2,
+              const int[::1] y2, const uint8_t[:, ::1] colors):
+    """Draw n segments in one call, without the GIL.
+
+    Coordinates are C-int arrays of length n; colors is a uint8 array of
+    shape (n, 3), or (1, 3) for one color.  Segments are drawn in order.
+    """
+    cdef Py_ssize_t n = x1.shape[0]
+    if y1.shape[0] != n or x2.shape[0] != n or y2.shape[0] != n:
+        raise ValueError("x1, y1, x2 and y2 must have the same length")
+    _check_colors(colors, n)
+    cdef cppinc.Canvas *canvas = c._getCanvas()
+    cdef Py_ssize_t i, k
+    cdef bint per_segment = colors.shape[0] > 1
+    with nogil:
+        for i in range(n):
+            k = i if per_segment else 0
+            _DrawLine(canvas, x1[i], y1[i], x2[i], y2[i],
+                      colors[k, 0], colors[k, 1], colors[k, 2])
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def SetPixels(core.Canvas c, const int[::1] xs, const int[::1] ys,
+              const uint8_t[:, ::1] colors):
+    """Set n pixels in one call, without the GIL (colors as in DrawLines)."""
+    cdef Py_ssize_t n = xs.shape[0]
+    if ys.shape[0] != n:
+        raise ValueError("xs and ys must have the same length")
+    _check_colors(colors, n)
+    cdef cppinc.Canvas *canvas = c._getCanvas()
+    cdef Py_ssize_t i, k
+    cdef bint per_pixel = colors.shape[0] > 1
+    with nogil:
+        for i in range(n):
+            k = i if per_pixel else 0
+            canvas.SetPixel(xs[i], ys[i], colors[k, 0], colors[k, 1], colors[k, 2])
+
 # Local Variables:
 # mode: python
 # End:
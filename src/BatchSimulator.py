@@ -0,0 +1,182 @@
+"""Many Dijkstra searches on one graph, advanced in lockstep.
+
+``BatchSimulator`` keeps K (start, end) queries in shared ``(K, n_nodes)``
+NumPy arrays (distance, parent edge, ``uint8`` state plane) instead of K
+``DijkstraSimulator`` objects with their own dicts.  Every ``step()`` pops
+one heap entry per unfinished query, like ``DijkstraSimulator.step()``
+does, and then relaxes the out-edges of all popped nodes at once through
+the CSR arrays of ``GraphIndex``: the per-step NumPy overhead is paid once
+for the whole batch.  Only the K binary heaps stay per query.
+
+A query stops when its end node is settled (or its heap runs dry), so the
+searches can race; ``get_state(k)`` gives a ``DijkState`` view of query
+``k`` that the visualizers accept like a simulator state.
+"""
+import heapq
+
+import numpy as np
+
+from GraphIndex import GraphIndex
+from dijkstra import (DijkState, NodeMapping, VisitedSet, UNVISITED, FRONTIER, VISITED,
+                      CURRENT, PATH)
+from timing import timed
+
+
+class BatchSimulator:
+    def __init__(self, graph, queries):
+        """``queries`` is a sequence of ``(start_node, end_node)`` pairs."""
+        self.graph = graph
+        self.index = GraphIndex(graph)
+        node_id = self.index.node_id
+        self.queries = [(start, end) for start, end in queries]
+        self.starts = np.array([node_id[start] for start, _ in self.queries], dtype=np.int64)
+        self.ends = np.array([node_id[end] for _, end in self.queries], dtype=np.int64)
+        self.reset()
+
+    def __len__(self):
+        return len(self.queries)
+
+    def reset(self):
+        k, n = len(self.queries), self.index.n_nodes
+        rows = np.arange(k)
+        self.dist = np.full((k, n), np.inf, dtype=np.float64)
+        self.dist[rows, self.starts] = 0
+        # 前驱由父边推出（edge_src），不再单独存一份
+        self.parent_edge = np.full((k, n), -1, dtype=np.int32)
+        self.plane = np.full((k, n), UNVISITED, dtype=np.uint8)
+        self.plane[rows, self.starts] = FRONTIER
+        self.current = np.full(k, -1, dtype=np.int64)
+        self.processing_edge = np.full(k, -1, dtype=np.int64)
+        self.finished = np.zeros(k, dtype=np.bool_)
+        self.paths = [[] for _ in range(k)]
+        # 堆里存 (distance, node_id)；编号按节点排序，出堆顺序与单个模拟器一致
+        self.heaps = [[(0, int(start))] for start in self.starts]
+        self.steps = 0
+
+    @property
+    def done(self):
+        return bool(self.finished.all())
+
+    def _pop(self, q):
+        """Pop one entry of query ``q``; returns the node id to expand or -1."""
+        heap = self.heaps[q]
+        if not heap:
+            self.finished[q] = True
+            return -1
+        _, u = heapq.heappop(heap)
+        plane = self.plane[q]
+        if plane[u] >= VISITED:
+            return -1
+
+        # 上一个当前节点变回已访问（路径上的保持 PATH）
+        current = self.current[q]
+        if current >= 0 and plane[current] == CURRENT:
+            plane[current] = VISITED
+        self.current[q] = u
+        plane[u] = CURRENT
+
+        if u == self.ends[q]:
+            path = self.path_ids(q, u)
+            plane[path] = PATH
+            self.paths[q] = [self.index.nodes[v] for v in path]
+            self.finished[q] = True
+            return -1
+        return u
+
+    @timed('batch_step')
+    def step(self):
+        """Advance every unfinished query by one pop.
+
+        Returns the queries that were still running, None once all are done.
+        """
+        active = np.flatnonzero(~self.finished)
+        if not len(active):
+            return None
+        self.steps += 1
+
+        popped = [(q, self._pop(q)) for q in active.tolist()]
+        popped = [(q, u) for q, u in popped if u >= 0]
+        if popped:
+            qs, us = np.array(popped, dtype=np.int64).T
+            self._relax(qs, us)
+        return active
+
+    def _relax(self, qs, us):
+        index = self.index
+        first = index.indptr[us]
+        counts = index.indptr[us + 1] - first
+        # 所有弹出节点的出边摊平成一组 (query, edge)，只看还没确定的邻居
+        total = int(counts.sum())
+        if not total:
+            return
+        offsets = np.cumsum(counts) - counts
+        eids = np.arange(total) - np.repeat(offsets - first, counts)
+        eq = np.repeat(qs, counts)
+        vs = index.edge_dst[eids]
+        candidate = np.repeat(self.dist[qs, us], counts) + index.weights[eids]
+        open_ = self.plane[eq, vs] < VISITED
+        eids, eq, vs, candidate = eids[open_], eq[open_], vs[open_], candidate[open_]
+        if not len(eq):
+            return
+
+        # 单个模拟器把最后检查的一条边留作 processing_edge（同一查询的边编号递增）
+        last = np.ones(len(eq), dtype=np.bool_)
+        last[:-1] = eq[1:] != eq[:-1]
+        self.processing_edge[eq[last]] = eids[last]
+
+        better = candidate < self.dist[eq, vs]
+        if not better.any():
+            return
+        eids, eq, vs, candidate = eids[better], eq[better], vs[better], candidate[better]
+
+        # 平行边：同一 (query, node) 只保留最短的一条，距离相同取先出现的
+        order = np.lexsort((eids, candidate, vs, eq))
+        eids, eq, vs, candidate = eids[order], eq[order], vs[order], candidate[order]
+        keep = np.ones(len(eq), dtype=np.bool_)
+        keep[1:] = (eq[1:] != eq[:-1]) | (vs[1:] != vs[:-1])
+        eids, eq, vs, candidate = eids[keep], eq[keep], vs[keep], candidate[keep]
+
+        self.dist[eq, vs] = candidate
+        self.parent_edge[eq, vs] = eids
+        self.plane[eq, vs] = FRONTIER
+        heaps = self.heaps
+        for q, distance, v in zip(eq.tolist(), candidate.tolist(), vs.tolist()):
+            heapq.heappush(heaps[q], (distance, v))
+
+    def run(self, max_steps=None):
+        """Step until every query is finished (or ``max_steps``), return the step count."""
+        while not self.done and (max_steps is None or self.steps < max_steps):
+            self.step()
+        return self.steps
+
+    def path_ids(self, q, v):
+        """Node ids from the start of query ``q`` to ``v`` along the parent edges."""
+        path = []
+        parent_edge = self.parent_edge[q]
+        while v >= 0:
+            path.append(v)
+            eid = parent_edge[v]
+            v = int(self.index.edge_src[eid]) if eid >= 0 else -1
+        return path[::-1]
+
+    def get_state(self, q):
+        """``DijkState`` view of query ``q`` (arrays are shared, not copied)."""
+        index = self.index
+        current = self.current[q]
+        processing_edge = self.processing_edge[q]
+        edge_src = index.edge_src
+        return DijkState(
+            current_node=index.nodes[current] if current >= 0 else self.queries[q][0],
+            visited=VisitedSet(index, self.plane[q]),
+            current_path=self.paths[q],
+            processing_edge=index.edge_nodes(processing_edge) if processing_edge >= 0 else None,
+            distances=NodeMapping(index, self.dist[q], float),
+            previous=NodeMapping(index, self.parent_edge[q],
+                                 lambda eid: index.nodes[edge_src[eid]] if eid >= 0 else None),
+            tree=None,
+            node_state=self.plane[q],
+            step=self.steps
+        )
+
+    def get_states(self):
+        return [self.get_state(q) for q in range(len(self.queries))]
@@ -0,0 +1,113 @@
+"""Level-of-detail rendering for graphs with more nodes than the panel has LEDs.
+
+Every node is binned onto the pixel the ``Viewport`` puts it on (again only
+when the view changes; nodes outside the view go to a spare bin that is
+never drawn).  The renderer keeps a ``(n_states, pixels)`` table counting how
+many nodes of each state (see ``dijkstra.UNVISITED`` ...) fall on every
+pixel and updates it only for the nodes whose state changed since the last
+frame.  Finding those nodes is one vectorized comparison of the ``uint8``
+state plane (n bytes, and ``renderer.describe_frame`` copies the plane once
+per frame too), so a frame still touches every node once, but only at
+memcpy-like speed; the Python-level and per-pixel work is bounded by the
+panel size and the number of changed nodes.
+"""
+import numpy as np
+
+from dijkstra import (UNVISITED, FRONTIER, VISITED, CURRENT, PATH, N_STATES,
+                      exploring_path, state_plane)
+
+DEFAULT_PALETTE = {
+    UNVISITED: (0, 0, 255),
+    FRONTIER: (255, 255, 0),
+    VISITED: (147, 0, 211),
+    CURRENT: (255, 255, 0),
+    PATH: (255, 165, 0),
+}
+
+
+class DensityRenderer:
+    def __init__(self, index, viewport, palette=None, edge_samples=4, edge_brightness=60):
+        self.index = index
+        self.viewport = viewport
+        self.width = viewport.width
+        self.height = viewport.height
+        self.edge_samples = edge_samples
+        self.edge_brightness = edge_brightness
+
+        palette = {**DEFAULT_PALETTE, **(palette or {})}
+        self.palette = np.array([palette[s] for s in range(N_STATES)], dtype=np.float32)
+
+        self.state = np.full(index.n_nodes, UNVISITED, dtype=np.uint8)
+        self.version = None
+        self.rebin()
+
+    def rebin(self):
+        """Recompute node pixels, edge layer and counts for the current view."""
+        n_pixels = self.width * self.height
+        xs, ys = self.viewport.screen_coords(self.index.coords)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        # 视口外的节点放进最后一个多余的格子
+        self.node_bin = np.where(inside, ys * self.width + xs, n_pixels)
+        self.node_count = np.bincount(self.node_bin, minlength=n_pixels + 1)[:n_pixels]
+        self.edge_layer = self._edge_layer(xs, ys)
+        self.counts = np.zeros((N_STATES, n_pixels + 1), dtype=np.int64)
+        np.add.at(self.counts, (self.state, self.node_bin), 1)
+        self.version = self.viewport.version
+
+    def _edge_layer(self, xs, ys):
+        """Static gray layer, log-scaled by how many edges cross each pixel."""
+        n_pixels = self.width * self.height
+        edges = self.viewport.visible_edges(self.index)
+        src, dst = self.index.edge_src[edges], self.index.edge_dst[edges]
+        t = np.linspace(0.0, 1.0, self.edge_samples + 2, dtype=np.float32)[:, np.newaxis]
+        ex = np.rint(xs[src] + (xs[dst] - xs[src]) * t).astype(np.int64)
+        ey = np.rint(ys[src] + (ys[dst] - ys[src]) * t).astype(np.int64)
+        inside = (ex >= 0) & (ex < self.width) & (ey >= 0) & (ey < self.height)
+        density = np.bincount((ey * self.width + ex)[inside], minlength=n_pixels)
+        if not density.any():
+            return np.zeros((self.width * self.height, 3), dtype=np.float32)
+        level = np.log1p(density) / np.log1p(density.max()) * self.edge_brightness
+        return np.repeat(level[:, np.newaxis], 3, axis=1).astype(np.float32)
+
+    def sync(self, node_state):
+        """Move the nodes whose state changed between the per-state counts.
+
+        Compares the whole plane with the last one (O(n), vectorized).
+        """
+        changed = np.flatnonzero(node_state != self.state)
+        if not len(changed):
+            return 0
+        bins = self.node_bin[changed]
+        np.subtract.at(self.counts, (self.state[changed], bins), 1)
+        new = node_state[changed]
+        np.add.at(self.counts, (new, bins), 1)
+        self.state[changed] = new
+        return len(changed)
+
+    def bins(self, nodes):
+        return self.node_bin[[self.index.node_id[node] for node in nodes]]
+
+    def render(self, state, marks=()):
+        """``(height, width, 3)`` frame of ``state``; ``marks`` are (node, color) drawn on top."""
+        if self.version != self.viewport.version:
+            self.rebin()
+        self.sync(state_plane(state, self.index))
+
+        n_pixels = self.width * self.height
+        occupied = self.node_count > 0
+        # 每个像素按各状态节点数加权混色
+        mix = self.counts[:, :n_pixels][:, occupied].T.astype(np.float32) @ self.palette
+        # 多出的一行接收视口外的节点，最后丢掉
+        pixels = np.zeros((n_pixels + 1, 3), dtype=np.float32)
+        pixels[:n_pixels] = self.edge_layer
+        pixels[:n_pixels][occupied] = mix / self.node_count[occupied, np.newaxis]
+
+        # 路径优先：含路径节点的像素直接显示路径颜色
+        pixels[:n_pixels][self.counts[PATH, :n_pixels] > 0] = self.palette[PATH]
+        if not state.current_path and state.current_node is not None:
+            pixels[self.bins(exploring_path(state))] = self.palette[PATH]
+        for node, color in marks:
+            if node is not None:
+                pixels[self.node_bin[self.index.node_id[node]]] = color
+
+        return pixels[:n_pixels].astype(np.uint8).reshape(self.height, self.width, 3)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class GraphIndex:
+    """Dense integer ids for the nodes and edges of an adjacency-dict graph.
+
+    Nodes are numbered in sorted order and edges are numbered source by
+    source, so the edges leaving node ``i`` are ``indptr[i]:indptr[i+1]``
+    (CSR layout).  Array-based structures (trees, state planes, palettes)
+    are indexed with these ids instead of node tuples.
+    """
+
+    def __init__(self, graph):
+        nodes = set(graph)
+        for edges in graph.values():
+            nodes.update(neighbor for neighbor, _ in edges)
+        self.nodes = sorted(nodes)
+        self.node_id = {node: i for i, node in enumerate(self.nodes)}
+        self.coords = np.array(self.nodes, dtype=np.int64).reshape(-1, 2)
+
+        src, dst, weights = [], [], []
+        for i, node in enumerate(self.nodes):
+            for neighbor, weight in graph.get(node, ()):
+                src.append(i)
+                dst.append(self.node_id[neighbor])
+                weights.append(weight)
+        self.edge_src = np.array(src, dtype=np.int32)
+        self.edge_dst = np.array(dst, dtype=np.int32)
+        self.weights = np.array(weights, dtype=np.float64)
+        self.indptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.edge_src, minlength=len(self.nodes)), out=self.indptr[1:])
+
+        # 平行边只记录第一条
+        self.edge_id = {}
+        for eid, (u, v) in enumerate(zip(src, dst)):
+            self.edge_id.setdefault((self.nodes[u], self.nodes[v]), eid)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_edges(self):
+        return len(self.edge_src)
+
+    def edge_nodes(self, eid):
+        return self.nodes[self.edge_src[eid]], self.nodes[self.edge_dst[eid]]
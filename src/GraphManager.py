@@ -3,18 +3,21 @@ from collections import deque
 import random
 import os
 from typing import Dict, List, Set, Tuple, Optional, Any
+import numpy as np
 from matplotlib import pyplot as plt
 import networkx as nx
 
 
 class GraphManager:
-    def __init__(self, width: int = 64, height: int = 64, step: int = 8, start_node = (0,0), end_node=(64,64)):
+    def __init__(self, width: int = 64, height: int = 64, step: int = 8, start_node = (0,0), end_node=(64,64),
+                 seed: Optional[int] = None):
         """初始化图结构。
 
     Args:
         width (int, optional): 图的宽度，默认为 64。
         height (int, optional): 图的高度，默认为 64。
         setp (int, optional): 步长，默认为 8。
+        seed (int, optional): 随机种子，相同的参数和种子生成完全相同的图；默认不固定。
 
     Attributes:
         width (int): 图的宽度。
@@ -30,13 +33,24 @@ class GraphManager:
         self.nodes = set()
         self.start_node = start_node
         self.end_node = end_node
-        # self.mean_weight = 0
-        # self.weight_deviation = 0
+        self.rng = random.Random(seed)
+        self.mean_weight = 0.0
+        self.weight_deviation = 0.0
+        # 预先算好的全源最短路径表（allpairs.py），有的话端点切换只需查表
+        self.all_pairs = None
+        self.shortest = None
 
     @classmethod
     def load_from_file(cls, filepath: str) -> 'GraphManager':
         if not os.path.exists(filepath):
             raise FileNotFoundError(f"Graph file not found: {filepath}")
+        if filepath.endswith('.npz'):
+            # 语料库格式（corpus.py）
+            from corpus import load_graph
+
+            instance = load_graph(filepath)
+            instance.load_all_pairs(filepath)
+            return instance
         
         try: 
             with open(filepath, 'rb') as f:
@@ -50,7 +64,14 @@ class GraphManager:
             instance.nodes = set(instance.graph.keys())
             instance.start_node = data.get('start', (24, 8))
             instance.end_node = data.get('end', (24, 56))
-            # instance._calculate_stats()
+            # 旧文件没有保存统计量，加载时补算
+            stats = data.get('stats')
+            if stats is None:
+                instance._calculate_stats()
+            else:
+                instance.mean_weight = stats['mean_weight']
+                instance.weight_deviation = stats['weight_deviation']
+            instance.load_all_pairs(filepath)
             return instance
         
         except (pickle.UnpicklingError, EOFError):
@@ -90,12 +111,12 @@ class GraphManager:
                     possible_neighbors.append(other)
             
             if possible_neighbors:
-                num_connections = random.randint(min_connections, 
+                num_connections = self.rng.randint(min_connections, 
                                               min(max_connections, len(possible_neighbors)))
-                selected = random.sample(possible_neighbors, num_connections)
+                selected = self.rng.sample(possible_neighbors, num_connections)
                 
                 for neighbor in selected:
-                    weight = random.randint(min_weight, max_weight)
+                    weight = self.rng.randint(min_weight, max_weight)
                     self.graph[node].append((neighbor, weight))
 
     def ensure_connectivity(self) -> None:
@@ -136,7 +157,7 @@ class GraphManager:
             )
             
             # Add bidirectional connection
-            weight = random.randint(1, 10)
+            weight = self.rng.randint(1, 10)
             self.graph[node1].append((node2, weight))
             self.graph[node2].append((node1, weight))
 
@@ -179,14 +200,28 @@ class GraphManager:
         self.ensure_connectivity()
         if not self.validate_path_exists():
             self.regenerate_until_valid()
-
+        self._calculate_stats()
+
+    def _calculate_stats(self) -> None:
+        """Compute the mean and standard deviation of all edge weights."""
+        weights = np.fromiter((weight for edges in self.graph.values() for _, weight in edges),
+                              dtype=np.float64)
+        if len(weights):
+            self.mean_weight = float(weights.mean())
+            self.weight_deviation = float(weights.std())
+        else:
+            self.mean_weight = self.weight_deviation = 0.0
 
     def save_to_file(self, filepath: str) -> None:
         """Save the graph to a pickle file."""
         data = {
             'graph': self.graph,
             'start': self.start_node,
-            'end': self.end_node
+            'end': self.end_node,
+            'stats': {
+                'mean_weight': self.mean_weight,
+                'weight_deviation': self.weight_deviation,
+            },
         }
         
         with open(filepath, 'wb') as f:
@@ -196,6 +231,10 @@ class GraphManager:
         """Get the graph structure."""
         return self.graph
 
+    def get_stats(self) -> Tuple[float, float]:
+        """Get the (mean, standard deviation) of the edge weights."""
+        return self.mean_weight, self.weight_deviation
+
     def get_endpoints(self) -> Tuple[Tuple[int, int], Tuple[int, int]]:
         """Get start and end nodes."""
         return self.start_node, self.end_node
@@ -203,11 +242,37 @@ class GraphManager:
     def set_endpoints(self, 
                      start: Optional[Tuple[int, int]] = None,
                      end: Optional[Tuple[int, int]] = None) -> None:
-        """Set start and end nodes."""
+        """Set start and end nodes (and look up their shortest path when tables are loaded)."""
         if start is not None and start in self.nodes:
             self.start_node = start
         if end is not None and end in self.nodes:
             self.end_node = end
+        if self.all_pairs is not None:
+            self.shortest = self.shortest_path()
+
+    def load_all_pairs(self, filepath: str) -> bool:
+        """Attach the all-pairs tables built for ``filepath`` if they exist and match."""
+        from allpairs import AllPairs, table_paths
+        from GraphIndex import GraphIndex
+
+        if not os.path.exists(table_paths(filepath)[2]):
+            return False
+        try:
+            self.all_pairs = AllPairs.load(filepath, GraphIndex(self.graph))
+        except ValueError:
+            return False
+        self.shortest = self.shortest_path()
+        return True
+
+    def shortest_path(self,
+                      start: Optional[Tuple[int, int]] = None,
+                      end: Optional[Tuple[int, int]] = None) -> Optional[Tuple[float, List[Tuple[int, int]]]]:
+        """(distance, path) between the endpoints from the tables, None without tables."""
+        if self.all_pairs is None:
+            return None
+        start = self.start_node if start is None else start
+        end = self.end_node if end is None else end
+        return self.all_pairs.distance(start, end), self.all_pairs.path(start, end)
 
 
     def draw_graph(self, 
@@ -272,6 +337,7 @@ def validate_hardcode():
     gm = GraphManager()
     gm.graph = graph
     gm.nodes = set(graph.keys())
+    gm._calculate_stats()
     gm.start_node = (24, 8)
     gm.end_node = (24, 56)
 
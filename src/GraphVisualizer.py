@@ -1,25 +1,44 @@
 import pygame
 import time
-from dijkstra import unpickle_graph, get_stat_weight
+from dijkstra import get_stat_weight, exploring_path, state_plane, N_STATES, VISITED
+from framebuffer import (brightness_lut, canvas_draw_lines, canvas_set_pixels, downsample,
+                         upload_frame)
 from pathlib import Path
 import sys
 
+import numpy as np
+
+from GraphIndex import GraphIndex
+from VirtualMatrix import create_matrix
+from timing import TIMINGS, timed
+
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
-from led_lib.rgbmatrix import RGBMatrix, RGBMatrixOptions
+
+# 边的显示状态，edge_palette 的第二维
+EDGE_IDLE, EDGE_TREE, EDGE_EXPLORING, EDGE_ACTIVE, EDGE_FINAL, EDGE_DIM = range(6)
+
+# 节点调色板在 dijkstra 的状态之后多出起点和终点两项
+NODE_START, NODE_END = N_STATES, N_STATES + 1
 
 
 class GraphVisualizer:
     def __init__(self, graph, start_node, end_node,
                  window_size=(640, 640), grid_size=64,
                  padding=10,
-                 LED_width=64, LED_height=64):
+                 LED_width=64, LED_height=64,
+                 mirror_led=False, led_sampling='stride', led_brightness=0.4,
+                 edge_anim_duration=0.05, matrix_backend=None, show_tree=False,
+                 use_led=True, show_timings=False, weight_stats=None, led_gamma=1.0):
         pygame.init()
         self.graph = graph
         self.window_size = window_size
         self.grid_size = grid_size
         self.scale = window_size[0] // grid_size
-        (self.mean_weight, self.weight_deviation) = get_stat_weight(self.graph)
+        # 权重统计量优先用 GraphManager 随图保存的值
+        if weight_stats is None:
+            weight_stats = get_stat_weight(self.graph)
+        (self.mean_weight, self.weight_deviation) = weight_stats
         self.start_node = start_node
         self.end_node = end_node
 
@@ -43,91 +62,144 @@ class GraphVisualizer:
         self.PURPLE = (147, 0, 211)
         self.ORANGE = (255, 165, 0)  # 用于显示探索路径
         self.WHITE_DIM = (80, 80, 80)  
+        self.TREE_COLOR = (110, 70, 0)  # 最短路径树中的边
+
+        self.index = GraphIndex(graph)
+        self.edge_palette = self.build_edge_palette()
+        # UNVISITED, FRONTIER, VISITED, CURRENT, PATH, 起点, 终点
+        self.node_palette = [self.BLUE, self.BLUE, self.ORANGE, self.YELLOW, self.ORANGE,
+                             self.GREEN, self.RED]
 
-        # LED矩阵初始化
-        self.options = RGBMatrixOptions()
-        self.options.rows = 64
-        self.options.chain_length = 1
-        self.options.parallel = 1
-        self.options.rows = 64
-        self.options.cols = 64
-        self.options.hardware_mapping = 'regular'
-        self.matrix = RGBMatrix(options=self.options)
-
-        max_x = max(node[0] for node in graph.keys())
-        max_y = max(node[1] for node in graph.keys())
-        self.led_scale_x = (self.matrix.width - 4) / max_x
-        self.led_scale_y = (self.matrix.height - 4) / max_y
+        # 镜像模式：只在pygame里绘制一次，然后整帧降采样上传到LED
+        # use_led=False 时LED交给单独的渲染线程（见 renderer.py），这里只画pygame
+        self.use_led = use_led
+        self.mirror_led = mirror_led and use_led
+        self.matrix = None
+        if use_led:
+            # LED矩阵初始化
+            self.matrix = create_matrix(rows=64, cols=64, chain_length=1, parallel=1,
+                                        backend=matrix_backend)
+
+            max_x = max(node[0] for node in graph.keys())
+            max_y = max(node[1] for node in graph.keys())
+            self.led_scale_x = (self.matrix.width - 4) / max_x
+            self.led_scale_y = (self.matrix.height - 4) / max_y
+
+            self.led_sampling = led_sampling
+            self.led_lut = brightness_lut(led_brightness, led_gamma)
+            self.led_canvas = self.matrix.CreateFrameCanvas()
+
+        self.edge_anim_duration = edge_anim_duration
+        self.show_tree = show_tree
+        self.show_timings = show_timings
+        self._font = None
+        self.build_background()
 
     def draw_edge_LED(self, start, end, color):
-        
         """在LED矩阵上绘制边"""
+        if self.mirror_led:
+            return
+        self.draw_edges_LED([start], [end], color)
 
-        # if color == self.WHITE:
-        #     color == self.WHITE_DIM
-    
-        x1, y1 = self.scale_coordinates_LED(*start)
-        x2, y2 = self.scale_coordinates_LED(*end)
-        
-        # 使用Bresenham算法绘制线段
-        dx = abs(x2 - x1)
-        dy = abs(y2 - y1)
-        steep = dy > dx
-        
-        if steep:
-            x1, y1 = y1, x1
-            x2, y2 = y2, x2
-            
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-            
-        dx = x2 - x1
-        dy = abs(y2 - y1)
-        error = dx // 2
-        y = y1
-        y_step = 1 if y1 < y2 else -1
-        
-        for x in range(x1, x2 + 1):
-            if steep:
-                self.matrix.SetPixel(y, x, *color)
-            else:
-                self.matrix.SetPixel(x, y, *color)
-            error -= dy
-            if error < 0:
-                y += y_step
-                error += dx
+    def draw_edges_LED(self, starts, ends, color):
+        """一次调用画出所有线段（Bresenham 在 graphics 的 DrawLines 里完成）"""
+        if self.mirror_led or not len(ends):
+            return
+        x1, y1 = self.led_points(np.asarray(starts, dtype=np.int64).reshape(-1, 2))
+        x2, y2 = self.led_points(np.asarray(ends, dtype=np.int64).reshape(-1, 2))
+        canvas_draw_lines(self.led_canvas, x1, y1, x2, y2, color)
+
+    def led_points(self, coords):
+        """Vectorized ``scale_coordinates_LED`` for an ``(n, 2)`` coordinate array."""
+        return ((coords[:, 0] * self.led_scale_x + 1).astype(np.int64),
+                (coords[:, 1] * self.led_scale_y + 1).astype(np.int64))
 
     def scale_coordinates_LED(self, x, y):
         """将坐标转换为LED矩阵上的坐标"""
         return (int(x*self.led_scale_x+1), int(y*self.led_scale_y+1))
     
-    def draw_exploring_path(self, current_node, previous):
-        """绘制正在探索的路径"""
-        if not current_node:
-            return
-            
-        # 构建从当前节点到起点的路径
-        exploring_path = []
-        current = current_node
-        while current is not None:
-            exploring_path.append(current)
-            current = previous.get(current)
-        exploring_path.reverse()
-        
-        # 绘制探索路径
-        for i in range(len(exploring_path) - 1):
-            self.draw_edge(exploring_path[i], exploring_path[i+1], 0, self.ORANGE)
-            self.draw_edge_LED(exploring_path[i], exploring_path[i+1], self.ORANGE)
+    def update_exploring_path(self, algorithm_state, restored):
+        """增量更新探索路径：只擦除/绘制变化的边，以及被 restored 区域擦掉的边
+
+        返回屏幕上被改动的区域。
+        """
+        path = []
+        if not algorithm_state.current_path and algorithm_state.current_node:
+            path = exploring_path(algorithm_state)
+
+        if algorithm_state.tree is not None and path:
+            # 最短路径树知道路径从哪个位置开始变化，不需要逐个比较
+            keep = max(algorithm_state.tree.path_changed_from() - 1, 0)
+        else:
+            keep = 0
+            while (keep < len(self._path_edges) and keep < len(path) - 1
+                   and self._path_edges[keep] == (path[keep], path[keep+1])):
+                keep += 1
+        keep = min(keep, len(self._path_edges))
+
+        removed = self._path_rects[keep:]
+        for rect in removed:
+            self.screen.blit(self.scene, rect, rect)
+        del self._path_edges[keep:]
+        del self._path_rects[keep:]
+
+        # 被擦掉的区域里仍在路径上的边需要重画
+        redraw = set()
+        for rect in restored + removed:
+            redraw.update(rect.collidelistall(self._path_rects))
+        rects = [self.draw_edge(*self._path_edges[i], EDGE_EXPLORING) for i in sorted(redraw)]
+        for i in range(keep, len(path) - 1):
+            edge = (path[i], path[i+1])
+            rect = self.draw_edge(*edge, EDGE_EXPLORING)
+            self._path_edges.append(edge)
+            self._path_rects.append(rect)
+            rects.append(rect)
+
+        # 节点画在探索路径之上
+        for rect in rects:
+            for i in rect.collidelistall(self._node_rects):
+                node = self._node_list[i]
+                self.draw_node(node, self.node_colors[node])
+        return removed + rects
+
+    def update_tree_edges(self, algorithm_state):
+        """把最短路径树中变化的边画到 scene 上（show_tree=True 时）"""
+        rects = []
+        tree = algorithm_state.tree
+        index = tree.index
+        # 和已画出的树边比较，活的树和帧快照都适用，渲染线程丢帧也不会漏画
+        changed = np.flatnonzero(tree.in_tree != self._tree_edges)
+        self._tree_edges = tree.in_tree.copy()
+        for eid in changed.tolist():
+            in_tree = self._tree_edges[eid]
+            start, end = index.edge_nodes(eid)
+            if in_tree:
+                rect = self.draw_edge(start, end, EDGE_TREE, surface=self.scene)
+            else:
+                rect = self.draw_edge(start, end, EDGE_IDLE, surface=self.scene, eid=eid)
+            for node in (start, end):
+                self.draw_node(node, self.node_colors[node], surface=self.scene)
+            rects.append(rect)
+        for rect in rects:
+            self.screen.blit(self.scene, rect, rect)
+        return rects
 
     
     def draw_node_LED(self, pos, color):
+        if self.mirror_led:
+            return
+        self.draw_nodes_LED(np.array([pos]), color)
 
-        x, y = self.scale_coordinates_LED(*pos)
-        self.matrix.SetPixel(x,y, *color)
-        self.matrix.SetPixel(x+1, y, *color)
-        self.matrix.SetPixel(x, y+1, *color)
-        self.matrix.SetPixel(x+1, y+1, *color)
+    def draw_nodes_LED(self, coords, colors):
+        """2x2 的节点方块，按节点顺序一次写入"""
+        xs, ys = self.led_points(coords)
+        # 每个节点的 4 个像素连在一起，重叠时和逐个绘制的结果相同
+        xs = (xs[:, np.newaxis] + [0, 1, 0, 1]).ravel()
+        ys = (ys[:, np.newaxis] + [0, 0, 1, 1]).ravel()
+        colors = np.asarray(colors, dtype=np.uint8)
+        if colors.ndim == 2:
+            colors = np.repeat(colors, 4, axis=0)
+        canvas_set_pixels(self.led_canvas, xs, ys, colors)
     
     def scale_coordinates(self, x, y):
         """Scale graph coordinates to screen coordinates"""
@@ -144,32 +216,49 @@ class GraphVisualizer:
         return led_x, led_y
 
     def draw_led_from_pygame_surface(self):
-        """Read pixels from Pygame surface and display to LED matrix"""
-        self.matrix.Clear()
+        """Downsample the Pygame surface and upload it to the LED matrix in one go"""
         surface_array = pygame.surfarray.pixels3d(self.screen)
-        
-        # Iterate through the LED matrix
-        for led_y in range(self.matrix.height):
-            for led_x in range(self.matrix.width):
-                pygame_x = int(led_x * self.window_size[0] / self.matrix.width)
-                pygame_y = int(led_y * self.window_size[1] / self.matrix.height)
-                
-                if 0 <= pygame_x < surface_array.shape[0] and 0 <= pygame_y < surface_array.shape[1]:
-                    color = surface_array[pygame_x][pygame_y]
-                    led_color = tuple(int(c * 0.4) for c in color)
-                    self.matrix.SetPixel(led_x, led_y, *led_color)
-        
-        del surface_array  # Release the surface array
+        frame = downsample(surface_array, self.matrix.width, self.matrix.height,
+                           mode=self.led_sampling, extent=self.window_size)
+        del surface_array  # Release the surface lock
+
+        with TIMINGS.stage('led_upload'):
+            upload_frame(self.led_canvas, self.led_lut[frame])
+            self.led_canvas = self.matrix.SwapOnVSync(self.led_canvas)
 
     
-    def draw_edge(self, start, end, weight, color=None, progress=1.0):
+    def weight_brightness(self, weights):
+        """Brightness factor of each weight: heavier edges are drawn darker."""
+        if not self.weight_deviation:
+            return np.ones_like(weights, dtype=np.float64)
+        return np.clip(1.0 - (weights - self.mean_weight) / (2 * self.weight_deviation), 0.2, 1.0)
+
+    def build_edge_palette(self):
+        """``(n_edges, n_states, 3)`` colors of every edge in every display state.
+
+        Idle edges are shaded by their weight; the highlighted states use the
+        brightness of weight 0, as they always have.
+        """
+        state_colors = np.array([self.WHITE, self.TREE_COLOR, self.ORANGE, self.YELLOW,
+                                 self.PURPLE, self.WHITE_DIM], dtype=np.float64)
+        zero = self.weight_brightness(np.zeros(1))[0]
+        # 不在图中的边（理论上不会出现）用 weight 0 的颜色
+        self.state_colors = [tuple(c) for c in (state_colors * zero).astype(np.uint8).tolist()]
+        brightness = np.full((self.index.n_edges, len(state_colors)), zero)
+        brightness[:, EDGE_IDLE] = self.weight_brightness(self.index.weights)
+        return (state_colors[np.newaxis] * brightness[:, :, np.newaxis]).astype(np.uint8)
 
-        if color is None:
-            color = self.WHITE # default color is white
+    def edge_color(self, start, end, state, eid=None):
+        if eid is None:
+            eid = self.index.edge_id.get((start, end))
+            if eid is None:
+                return self.state_colors[state]
+        return tuple(self.edge_palette[eid, state].tolist())
 
-        # Weight Will be used to adjust brightness of the edge.
-        brightness = max(0.2, min(1.0, 1.0 - (weight - self.mean_weight) / (2 * self.weight_deviation)))
-        color = tuple(int(c * brightness) for c in color)
+    def draw_edge(self, start, end, state=EDGE_IDLE, progress=1.0, surface=None, eid=None):
+        if surface is None:
+            surface = self.screen
+        color = self.edge_color(start, end, state, eid)
 
         start_pos = self.scale_coordinates(*start)
         end_pos = self.scale_coordinates(*end)
@@ -181,73 +270,273 @@ class GraphVisualizer:
             intermediate_pos = (x, y)
         
         if intermediate_pos:
-            pygame.draw.line(self.screen, color, start_pos, intermediate_pos)
-            pygame.draw.line(self.screen, self.GRAY, intermediate_pos, end_pos)
-        else:
-            pygame.draw.line(self.screen, color, start_pos, end_pos)
-        
+            rect = pygame.draw.line(surface, self.GRAY, intermediate_pos, end_pos)
+            return rect.union(pygame.draw.line(surface, color, start_pos, intermediate_pos))
+        return pygame.draw.line(surface, color, start_pos, end_pos)
+
+    def node_colors_LED(self, algorithm_state):
+        """LED color of every node in ``_node_list`` as an ``(n, 3)`` array."""
+        plane = state_plane(algorithm_state, self.index)[self._node_ids]
+        colors = np.where((plane >= VISITED)[:, np.newaxis], self.ORANGE, self.BLUE).astype(np.uint8)
+        # 优先级：起点 > 终点 > 当前节点 > 已访问 > 未访问
+        for node, color in ((algorithm_state.current_node, self.YELLOW),
+                            (self.end_node, self.RED), (self.start_node, self.GREEN)):
+            node_id = self.index.node_id.get(node)
+            if node_id is not None:
+                colors[self._node_ids == node_id] = color
+        return colors
+
+    def draw_node(self, node, color, surface=None):
+        if surface is None:
+            surface = self.screen
+        return pygame.draw.circle(surface, color, self.scale_coordinates(*node), 4)
+
+    def build_background(self):
+        """把静态的图（所有边和初始节点）预先绘制到缓存表面上"""
+        self.background = pygame.Surface(self.drawing_area)
+        self.background.fill(self.BLACK)
+        # 按邻接表的顺序画（重叠的双向边以后画的为准），边号 = 起点的 indptr + 序号
+        self._edge_order = self.edge_draw_order()
+        for eid in self._edge_order.tolist():
+            start, end = self.index.edge_nodes(eid)
+            self.draw_edge(start, end, EDGE_IDLE, surface=self.background, eid=eid)
+
+        self._node_list = list(self.graph)
+        self._node_ids = np.array([self.index.node_id[node] for node in self._node_list], dtype=np.int64)
+        self._node_rects = [self.draw_node(node, self.base_node_color(node), surface=self.background)
+                            for node in self._node_list]
+        self.reset_scene()
+
+    def edge_draw_order(self):
+        """Edge ids in the order of the adjacency dict."""
+        indptr, node_id = self.index.indptr, self.index.node_id
+        ranges = [np.arange(indptr[node_id[node]], indptr[node_id[node] + 1]) for node in self.graph]
+        return np.concatenate(ranges) if ranges else np.zeros(0, dtype=np.int64)
 
+    def base_node_color(self, node):
+        return self.GREEN if node == self.start_node else self.RED if node == self.end_node else self.BLUE
+
+    def reset_scene(self):
+        """scene = 背景 + 节点状态，overlay（探索路径、动画边）画在它上面"""
+        self.node_colors = {node: self.base_node_color(node) for node in self._node_list}
+        self._shown = self.shown_states(np.zeros(self.index.n_nodes, dtype=np.uint8))
+
+        self.scene = self.background.copy()
+        self.screen.blit(self.scene, (0, 0))
+        self.path_found = False
+        self.tween = None
+        self._overlay_rects = []
+        self._path_edges = []
+        self._path_rects = []
+        self._tree_edges = np.zeros(self.index.n_edges, dtype=np.bool_)
+        pygame.display.flip()
+
+    def update_graph(self, index, segments):
+        """Adopt an edited edge set on the same nodes (see ``hotreload.py``).
+
+        Only the regions covered by ``segments`` (``(u, v)`` pairs, before
+        and after the edit) are redrawn on the background; the scene is reset.
+        When the edit moves the weight mean or deviation every edge changes
+        brightness, so the whole background is rebuilt instead.
+        """
+        self.index = index
+        weight_stats = get_stat_weight(self.graph)
+        restyled = weight_stats != (self.mean_weight, self.weight_deviation)
+        (self.mean_weight, self.weight_deviation) = weight_stats
+        self.edge_palette = self.build_edge_palette()
+        if restyled:
+            self.build_background()
+            return
+        self._edge_order = self.edge_draw_order()
+        rects = []
+        for start, end in segments:
+            (x1, y1), (x2, y2) = self.scale_coordinates(*start), self.scale_coordinates(*end)
+            rects.append(pygame.Rect(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1))
+        self.redraw_background(rects)
+        self.reset_scene()
+
+    def redraw_background(self, rects):
+        """Redraw edges and nodes inside ``rects`` in the same order as ``build_background``."""
+        coords = self.index.coords * self.scale + self.padding
+        order = self._edge_order
+        src, dst = coords[self.index.edge_src[order]], coords[self.index.edge_dst[order]]
+        low, high = np.minimum(src, dst), np.maximum(src, dst)
+        # 不用 set_clip：pygame 会按裁剪后的端点重新光栅化，像素和整图重画时不同。
+        # 改为在整张草稿表面上画完整的边，再只拷贝脏矩形
+        scratch = pygame.Surface(self.drawing_area)
+        for rect in rects:
+            scratch.fill(self.BLACK, rect)
+            # 包围盒和脏矩形相交的边按原顺序重画
+            hits = ((high[:, 0] >= rect.left) & (low[:, 0] < rect.right)
+                    & (high[:, 1] >= rect.top) & (low[:, 1] < rect.bottom))
+            for eid in order[hits].tolist():
+                start, end = self.index.edge_nodes(eid)
+                self.draw_edge(start, end, EDGE_IDLE, surface=scratch, eid=eid)
+            for i in rect.collidelistall(self._node_rects):
+                node = self._node_list[i]
+                self.draw_node(node, self.base_node_color(node), surface=scratch)
+            self.background.blit(scratch, rect, rect)
+
+    def set_endpoints(self, start_node, end_node):
+        """Switch the highlighted endpoints (redraws the background) and clear the scene."""
+        if (start_node, end_node) == (self.start_node, self.end_node):
+            self.reset_scene()
+            return
+        self.start_node = start_node
+        self.end_node = end_node
+        self.build_background()
+
+    def shown_states(self, plane):
+        """Palette index of every drawn node (``_node_list`` order)."""
+        shown = plane[self._node_ids]
+        for node, kind in ((self.start_node, NODE_START), (self.end_node, NODE_END)):
+            i = self.index.node_id.get(node)
+            if i is not None:
+                shown[self._node_ids == i] = kind
+        return shown
+
+    def update_scene_nodes(self, algorithm_state):
+        """只重绘状态发生变化的节点（比较状态平面，而不是逐个节点判断颜色）"""
+        shown = self.shown_states(state_plane(algorithm_state, self.index))
+        changed = np.flatnonzero(shown != self._shown)
+        self._shown = shown
+        rects = []
+        for k, kind in zip(changed.tolist(), shown[changed].tolist()):
+            node = self._node_list[k]
+            color = self.node_palette[kind]
+            if color != self.node_colors[node]:
+                self.node_colors[node] = color
+                rects.append(self.draw_node(node, color, surface=self.scene))
+        for rect in rects:
+            self.screen.blit(self.scene, rect, rect)
+        return rects
+
+    def restore_overlay(self):
+        """用scene覆盖上一帧临时overlay（动画边、最终路径）所在的区域"""
+        rects = self._overlay_rects
+        for rect in rects:
+            self.screen.blit(self.scene, rect, rect)
+        self._overlay_rects = []
+        return rects
+
+    def animate(self, now=None):
+        """推进正在处理的边的动画，由主循环每次迭代调用"""
+        if self.tween is None:
+            return
+        if now is None:
+            now = time.monotonic()
+        rect = self.tween.advance(self, now)
+        if rect is not None:
+            self._overlay_rects.append(rect)
+            pygame.display.update(rect)
+        if self.tween.done:
+            self.tween = None
+
+    def _draw_frame_LED(self, algorithm_state):
+        """LED上的直接绘制（非镜像模式），画在离屏画布上再交换；每一层只调用一次批量绘制"""
+        self.led_canvas.Clear()
+        index = self.index
+        coords = index.coords
+
+        edges = self._edge_order
+        if algorithm_state.processing_edge:
+            start, end = (index.node_id[node] for node in algorithm_state.processing_edge)
+            edges = edges[(index.edge_src[edges] != start) | (index.edge_dst[edges] != end)]
+        self.draw_edges_LED(coords[index.edge_src[edges]], coords[index.edge_dst[edges]],
+                            self.WHITE_DIM)
+
+        if not algorithm_state.current_path and algorithm_state.current_node:
+            path = exploring_path(algorithm_state)
+            self.draw_edges_LED(path[:-1], path[1:], self.ORANGE)
+
+        self.draw_nodes_LED(coords[self._node_ids], self.node_colors_LED(algorithm_state))
+
+        if algorithm_state.processing_edge and not algorithm_state.current_path:
+            self.draw_edge_LED(*algorithm_state.processing_edge, self.YELLOW)
+
+        path = algorithm_state.current_path
+        self.draw_edges_LED(path[:-1], path[1:], self.PURPLE)
+
+        with TIMINGS.stage('led_upload'):
+            self.led_canvas = self.matrix.SwapOnVSync(self.led_canvas)
+
+    def draw_timing_overlay(self):
+        """左上角显示各阶段耗时 p50/p95/p99，返回绘制区域"""
+        if self._font is None:
+            self._font = pygame.font.SysFont(None, 18)
+        rects = []
+        y = 2
+        for line in TIMINGS.overlay_lines():
+            text = self._font.render(line, True, self.WHITE, self.BLACK)
+            rects.append(self.screen.blit(text, (2, y)))
+            y += text.get_height()
+        return rects
+
+    @timed('pygame_frame')
     def draw_frame(self, algorithm_state):
-        self.screen.fill(self.BLACK)
-        if not algorithm_state.current_path:
-            self.matrix.Clear() 
-
-        # 绘制基础图形(所有边)
-        for start, edges in self.graph.items():
-            for end, weight in edges:
-                if algorithm_state.processing_edge == (start, end):
-                    continue
-                self.draw_edge(start, end, weight, self.WHITE)
-                self.draw_edge_LED(start, end, self.WHITE_DIM)
-
-        # 路径控制
-        if algorithm_state.current_path:
-            self.path_found = True
-        elif algorithm_state.current_node:
-            # 否则绘制探索路径
-            self.draw_exploring_path(
-                algorithm_state.current_node,
-                algorithm_state.previous
-            )
-
-        # 绘制节点
-        for node in self.graph:
-            if node == self.start_node:
-                color = self.GREEN
-            elif node == self.end_node:
-                color = self.RED
-            elif node == algorithm_state.current_node:
-                color = self.YELLOW
-            elif node in algorithm_state.visited:
-                color = self.ORANGE
-            else:
-                color = self.BLUE
-            pygame.draw.circle(self.screen, color, self.scale_coordinates(*node), 4)
-            self.draw_node_LED(node, color)
+        if self.use_led and not self.mirror_led:
+            self._draw_frame_LED(algorithm_state)
+
+        restored = self.restore_overlay()
+        restored += self.update_scene_nodes(algorithm_state)
+        if self.show_tree and algorithm_state.tree is not None:
+            restored += self.update_tree_edges(algorithm_state)
+        overlay = []
+
+        # 路径控制：找到路径后探索路径会被清除
+        # 倒放时路径可能被撤销
+        self.path_found = bool(algorithm_state.current_path)
+        dirty = restored + self.update_exploring_path(algorithm_state, restored)
 
-        # 处理当前正在探索的边
+        # 处理当前正在探索的边：启动补间动画，由 animate() 逐帧推进
+        self.tween = None
         if algorithm_state.processing_edge:
             start, end = algorithm_state.processing_edge
             if not self.path_found:
-                for i in range(0, 101, 30):
-                    progress = i / 100.0
-                    self.draw_edge(start, end, 0, self.YELLOW, progress=progress)
-                    self.draw_edge_LED(start, end, self.YELLOW)
-                    pygame.display.flip()
-                    # time.sleep(1/120)
+                self.tween = EdgeTween(start, end, self.edge_anim_duration)
+                overlay.append(self.tween.advance(self, time.monotonic()))
 
         if self.path_found:
             # 只绘制最终状态
             path = algorithm_state.current_path
-            self.draw_edge(algorithm_state.processing_edge[0], algorithm_state.processing_edge[1], 0, self.WHITE_DIM)
-            pygame.display.flip()
+            if algorithm_state.processing_edge:
+                overlay.append(self.draw_edge(*algorithm_state.processing_edge, EDGE_DIM))
             for i in range(len(path) - 1):
-                self.draw_edge(path[i], path[i+1], 0, self.PURPLE)
-                self.draw_edge_LED(path[i], path[i+1], self.PURPLE)
-                pygame.display.flip()
-            
-            return
-        
-        # self.draw_led_from_pygame_surface()
+                overlay.append(self.draw_edge(path[i], path[i+1], EDGE_FINAL))
+
+        if self.show_timings:
+            overlay += self.draw_timing_overlay()
+
+        self._overlay_rects = overlay
+        if self.mirror_led:
+            self.draw_led_from_pygame_surface()
         
-        pygame.display.flip()
+        with TIMINGS.stage('pygame_flip'):
+            pygame.display.update(dirty + overlay)
+
+
+class EdgeTween:
+    """Time-based progress animation of the edge currently being relaxed."""
+
+    def __init__(self, start, end, duration):
+        self.start = start
+        self.end = end
+        self.duration = duration
+        self.started_at = None
+        self.progress = None
+        self.done = False
+
+    def advance(self, visualizer, now):
+        """Draw the part of the edge that became yellow since the last call."""
+        if self.started_at is None:
+            self.started_at = now
+            self.progress = 0.0
+            return visualizer.draw_edge(self.start, self.end, EDGE_ACTIVE, progress=0.0)
+
+        progress = 1.0 if self.duration <= 0 else min(1.0, (now - self.started_at) / self.duration)
+        if progress <= self.progress:
+            return None
+        self.progress = progress
+        self.done = progress >= 1.0
+        # 黄色部分只会变长，所以不需要先擦除
+        return visualizer.draw_edge(self.start, self.end, EDGE_ACTIVE, progress=progress)
@@ -4,31 +4,49 @@ import sys
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
-from led_lib.rgbmatrix import RGBMatrix, RGBMatrixOptions
-import time
+import asyncio
+
+import numpy as np
+
 from GraphManager import GraphManager
-from dijkstra import DijkstraSimulator
+from dijkstra import VISITED, exploring_path, state_plane
+from DensityRenderer import DensityRenderer
+from GraphIndex import GraphIndex
+from TextOverlay import TextOverlay
+from Viewport import Viewport
+from framebuffer import brightness_lut, draw_lines, draw_points, line_pixels, upload_frame
+from VirtualMatrix import create_matrix
+from timing import TIMINGS, timed
+
+# 多个查询同屏赛跑时每个查询的颜色
+RACE_COLORS = [(255, 0, 0), (0, 255, 0), (0, 128, 255), (255, 255, 0),
+               (255, 0, 255), (0, 255, 255), (255, 128, 0), (255, 255, 255)]
+
 
 class LEDGraphVisualizer:
-    def __init__(self, graph, start_node, end_node, matrix_rows=64, chain_length=1):
-        self.options = RGBMatrixOptions()
-        self.options.rows = matrix_rows
-        self.options.chain_length = chain_length
-        self.options.parallel = 1
-        self.options.rows = 64
-        self.options.cols = 64
-        self.options.hardware_mapping = 'regular'
-
-        self.matrix = RGBMatrix(options=self.options)
+    def __init__(self, graph, start_node, end_node, matrix_rows=64, chain_length=1,
+                 matrix_backend=None, show_timings=False, lod='auto', matrix_cols=64,
+                 parallel=1, follow=False, brightness=1.0, gamma=1.0, matrix=None,
+                 show_hud=False, hud_font=None):
+        # 不在树莓派上时自动使用虚拟矩阵（也可用 DIJK_MATRIX=virtual 强制）
+        # chain_length x parallel 块面板拼成一张 (cols*chain) x (rows*parallel) 的画布
+        # 传入 matrix 时复用已经初始化好的矩阵（切换图时不必重新初始化硬件）
+        if matrix is None:
+            matrix = create_matrix(rows=matrix_rows, cols=matrix_cols, chain_length=chain_length,
+                                   parallel=parallel, backend=matrix_backend)
+        self.matrix = matrix
+        # 双缓冲：在离屏画布上绘制，每帧结束时 SwapOnVSync
+        self.canvas = self.matrix.CreateFrameCanvas()
         self.graph = graph
         self.start_node = start_node
         self.end_node = end_node
 
-        # 计算缩放比例，将图坐标映射到LED矩阵尺寸
+        # 视口负责缩放/平移，zoom=1 时整张图放进画布并留出边距
         max_x = max(node[0] for node in graph.keys())
         max_y = max(node[1] for node in graph.keys())
-        self.scale_x = (self.matrix.width - 4) / max_x  # 留出边距
-        self.scale_y = (self.matrix.height - 4) / max_y
+        self.viewport = Viewport(max_x, max_y, self.matrix.width, self.matrix.height)
+        self.follow = follow
+        self.index = GraphIndex(graph)
         
         # 定义颜色
         self.BLACK = (0, 0, 0)
@@ -40,135 +58,263 @@ class LEDGraphVisualizer:
         self.PURPLE = (147, 0, 211)
         self.ORANGE = (255, 165, 0)
 
+        # 节点状态 -> 颜色（按 dijkstra 的 UNVISITED..PATH 排列），找到路径后已访问节点变紫
+        self.node_palette = np.array([self.BLUE, self.BLUE, self.ORANGE, self.YELLOW, self.ORANGE],
+                                     dtype=np.uint8)
+        self.found_palette = np.array([self.BLUE, self.BLUE, self.PURPLE, self.YELLOW, self.PURPLE],
+                                      dtype=np.uint8)
+
+        self.show_timings = show_timings
+        # 左下角的步数/当前距离/路径长度，hud_font 为 BDF 字体文件，默认内置 3x5 字体
+        self.show_hud = show_hud
+        self.hud = TextOverlay(hud_font)
+
+        # 在 NumPy 帧上绘制，上传时再经过 gamma/亮度查找表
+        self.frame = np.zeros((self.matrix.height, self.matrix.width, 3), dtype=np.uint8)
+        self.lut = brightness_lut(brightness, gamma)
+        self._edge_layer = None
+        self._edge_layer_version = None
+
+        # 视口内节点数超过像素数时改用密度渲染（lod='auto'），也可强制 'density' / 'detail'
+        if lod not in ('auto', 'density', 'detail'):
+            raise ValueError(f"Unknown lod mode: {lod}")
+        self.lod = lod
+        self.density = None
+
+    def set_endpoints(self, start_node, end_node):
+        self.start_node = start_node
+        self.end_node = end_node
+
+    def use_density(self):
+        if self.lod == 'auto':
+            visible = len(self.viewport.visible_nodes(self.index))
+            dense = visible > self.matrix.width * self.matrix.height
+        else:
+            dense = self.lod == 'density'
+        if dense and self.density is None:
+            self.density = DensityRenderer(self.index, self.viewport)
+        return dense
+
     def scale_coordinates(self, x, y):
         """将坐标转换为LED矩阵上的坐标"""
-        return (int(x*self.scale_x+1), int(y*self.scale_y+1))
+        return self.viewport.to_screen(x, y)
 
     def draw_node(self, pos, color):
-
         x, y = self.scale_coordinates(*pos)
-        self.matrix.SetPixel(x,y, *color)
-        self.matrix.SetPixel(x+1, y, *color)
-        self.matrix.SetPixel(x, y+1, *color)
-        self.matrix.SetPixel(x+1, y+1, *color)
+        draw_points(self.frame, [x], [y], color)
 
     def draw_edge(self, start, end, color):
         """在LED矩阵上绘制边"""
         x1, y1 = self.scale_coordinates(*start)
         x2, y2 = self.scale_coordinates(*end)
-        
-        # 使用Bresenham算法绘制线段
-        dx = abs(x2 - x1)
-        dy = abs(y2 - y1)
-        steep = dy > dx
-        
-        if steep:
-            x1, y1 = y1, x1
-            x2, y2 = y2, x2
-            
-        if x1 > x2:
-            x1, x2 = x2, x1
-            y1, y2 = y2, y1
-            
-        dx = x2 - x1
-        dy = abs(y2 - y1)
-        error = dx // 2
-        y = y1
-        y_step = 1 if y1 < y2 else -1
-        
-        for x in range(x1, x2 + 1):
-            if steep:
-                self.matrix.SetPixel(y, x, *color)
-            else:
-                self.matrix.SetPixel(x, y, *color)
-            error -= dy
-            if error < 0:
-                y += y_step
-                error += dx
+        # 放大后线段可能远超画布，先裁剪到画布内
+        clipped = self.viewport.clip_segment(x1, y1, x2, y2)
+        if clipped is None:
+            return
+        draw_lines(self.frame, *clipped, color)
+
+    def draw_path(self, path, color):
+        """一次画出整条路径"""
+        if len(path) < 2:
+            return
+        xs, ys = zip(*(self.scale_coordinates(*node) for node in path))
+        draw_lines(self.frame, xs[:-1], ys[:-1], xs[1:], ys[1:], color)
+
+    def edge_layer(self):
+        """所有可见边的栅格缓存，视口变化时才重画"""
+        if self._edge_layer_version != self.viewport.version:
+            layer = np.zeros_like(self.frame)
+            edges = self.viewport.visible_edges(self.index)
+            xs, ys = self.viewport.screen_coords(self.index.coords)
+            src, dst = self.index.edge_src[edges], self.index.edge_dst[edges]
+            draw_lines(layer, xs[src], ys[src], xs[dst], ys[dst], self.WHITE)
+            self._edge_layer = layer
+            self._edge_layer_version = self.viewport.version
+        return self._edge_layer
+
+    def update_graph(self, index, segments):
+        """Adopt an edited edge set on the same nodes (see ``hotreload.py``).
+
+        The cached edge layer is patched: pixels of the changed ``segments``
+        are cleared and only the edges whose box overlaps them are redrawn.
+        """
+        self.index = index
+        if self.density is not None:
+            self.density.index = index
+            self.density.edge_layer = self.density._edge_layer(
+                *self.viewport.screen_coords(index.coords))
+        if self._edge_layer_version != self.viewport.version or not segments:
+            return
+        layer = self._edge_layer
+        ends = np.array([self.scale_coordinates(*node) for segment in segments for node in segment])
+        x1, y1, x2, y2 = ends[0::2, 0], ends[0::2, 1], ends[1::2, 0], ends[1::2, 1]
+        xs, ys, _ = line_pixels(x1, y1, x2, y2)
+        height, width = layer.shape[:2]
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        layer[ys[inside], xs[inside]] = 0
+
+        edges = self.viewport.visible_edges(index)
+        sx, sy = self.viewport.screen_coords(index.coords)
+        ex1, ey1 = sx[index.edge_src[edges]], sy[index.edge_src[edges]]
+        ex2, ey2 = sx[index.edge_dst[edges]], sy[index.edge_dst[edges]]
+        left, right = np.minimum(x1, x2), np.maximum(x1, x2)
+        top, bottom = np.minimum(y1, y2), np.maximum(y1, y2)
+        # (可见边, 脏线段) 两两比较包围盒
+        hits = ((np.maximum(ex1, ex2)[:, np.newaxis] >= left) & (np.minimum(ex1, ex2)[:, np.newaxis] <= right)
+                & (np.maximum(ey1, ey2)[:, np.newaxis] >= top) & (np.minimum(ey1, ey2)[:, np.newaxis] <= bottom))
+        redraw = hits.any(axis=1)
+        draw_lines(layer, ex1[redraw], ey1[redraw], ex2[redraw], ey2[redraw], self.WHITE)
+
+    def draw_timing_bar(self):
+        """在第一行画出上一帧的耗时，满格为 33ms"""
+        frame_ms = TIMINGS.last('led_frame') * 1000
+        width = min(self.matrix.width, int(frame_ms / 33.3 * self.matrix.width))
+        color = self.GREEN if frame_ms < 16.7 else self.YELLOW if frame_ms < 33.3 else self.RED
+        self.frame[0, :width] = color
+
+    def draw_density_frame(self, algorithm_state):
+        """按像素聚合节点状态绘制（开销只和面板大小有关）"""
+        self.frame[:] = self.density.render(algorithm_state, marks=(
+            (algorithm_state.current_node, self.YELLOW),
+            (self.start_node, self.GREEN),
+            (self.end_node, self.RED),
+        ))
+
+    def draw_detail_frame(self, algorithm_state):
+        # 边从缓存复制，不再每帧重画
+        self.frame[:] = self.edge_layer()
 
-    def draw_frame(self, algorithm_state):
-        """绘制当前算法状态"""
-        # 清空显示
-        if not algorithm_state.current_path:
-            self.matrix.Clear() 
-        
-        # 绘制所有边
-        for start, edges in self.graph.items():
-            for end, weight in edges:
-                self.draw_edge(start, end, self.WHITE)
-        
         # 绘制已访问路径
         if algorithm_state.current_path:
-            path = algorithm_state.current_path
-            for i in range(len(path) - 1):
-                self.draw_edge(path[i], path[i+1], self.ORANGE)
-        elif algorithm_state.current_node and algorithm_state.previous:
-            # 绘制探索路径
-            current = algorithm_state.current_node
-            exploring_path = []
-            while current is not None:
-                exploring_path.append(current)
-                current = algorithm_state.previous.get(current)
-            exploring_path.reverse()
-            
-            for i in range(len(exploring_path) - 1):
-                self.draw_edge(exploring_path[i], exploring_path[i+1], self.ORANGE)
-        
-        # 绘制所有节点
-        for node in self.graph:
-            if node == self.start_node:
-                color = self.GREEN
-            elif node == self.end_node:
-                color = self.RED
-            elif node == algorithm_state.current_node:
-                color = self.YELLOW
-            elif node in algorithm_state.visited:
-                color = self.PURPLE if algorithm_state.current_path else self.ORANGE
-            else:
-                color = self.BLUE
+            self.draw_path(algorithm_state.current_path, self.ORANGE)
+        elif algorithm_state.current_node:
+            # 绘制探索路径（由最短路径树增量维护）
+            self.draw_path(exploring_path(algorithm_state), self.ORANGE)
+
+        # 绘制视口内的节点：状态平面查一次调色板
+        visible = self.viewport.visible_nodes(self.index)
+        palette = self.found_palette if algorithm_state.current_path else self.node_palette
+        plane = state_plane(algorithm_state, self.index)
+        xs, ys = self.viewport.screen_coords(self.index.coords)
+        draw_points(self.frame, xs[visible], ys[visible], palette[plane[visible]])
+        for node, color in ((self.start_node, self.GREEN), (self.end_node, self.RED)):
             self.draw_node(node, color)
-        
+
         # 如果正在处理某条边，特殊显示该边
         if algorithm_state.processing_edge:
             start, end = algorithm_state.processing_edge
             self.draw_edge(start, end, self.YELLOW)
 
+    def update_hud(self, algorithm_state):
+        """Step count, distance of the current node and, once found, the path cost."""
+        lines = []
+        if algorithm_state.step is not None:
+            lines.append(('step', f"S{algorithm_state.step}", self.WHITE))
+        else:
+            self.hud.remove('step')
+        distances = algorithm_state.distances
+        node = algorithm_state.current_node
+        if distances is None:
+            distances = {}
+        if node is not None and node in distances:
+            lines.append(('distance', f"D{distances[node]:g}", self.YELLOW))
+        else:
+            self.hud.remove('distance')
+        if algorithm_state.current_path and self.end_node in distances:
+            lines.append(('cost', f"C{distances[self.end_node]:g}", self.PURPLE))
+        else:
+            self.hud.remove('cost')
+
+        line_height = self.hud.atlas.height + 1
+        y = self.matrix.height - line_height * len(lines)
+        for name, text, color in lines:
+            self.hud.set(name, text, 1, y, color)
+            y += line_height
+
+    @timed('led_frame')
+    def draw_frame(self, algorithm_state):
+        """绘制当前算法状态"""
+        if self.follow and algorithm_state.current_node is not None:
+            self.viewport.follow(algorithm_state.current_node)
+
+        if self.use_density():
+            self.draw_density_frame(algorithm_state)
+        else:
+            self.draw_detail_frame(algorithm_state)
+
+        if self.show_hud:
+            self.update_hud(algorithm_state)
+        self.present()
+
+    @timed('led_frame')
+    def draw_race_frame(self, batch, colors=None):
+        """Draw every query of a ``BatchSimulator`` on the same canvas.
+
+        Nodes settled by several queries get the mix of their colors; each
+        query draws its (exploring) path and its endpoints in its own color.
+        """
+        if colors is None:
+            colors = [RACE_COLORS[q % len(RACE_COLORS)] for q in range(len(batch))]
+        palette = np.array(colors, dtype=np.float32)
+        self.frame[:] = self.edge_layer()
+
+        visible = self.viewport.visible_nodes(self.index)
+        settled = batch.plane[:, visible] >= VISITED
+        count = settled.sum(axis=0)
+        shown = count > 0
+        mix = settled[:, shown].T.astype(np.float32) @ palette / count[shown, np.newaxis]
+        xs, ys = self.viewport.screen_coords(self.index.coords)
+        draw_points(self.frame, xs[visible][shown], ys[visible][shown], mix.astype(np.uint8))
+
+        for q, color in enumerate(colors):
+            state = batch.get_state(q)
+            self.draw_path(state.current_path or exploring_path(state), color)
+            for node in batch.queries[q]:
+                self.draw_node(node, color)
+        if self.show_hud:
+            # 赛跑时各查询的距离不同，只显示步数
+            self.hud.clear()
+            self.hud.set('step', f"S{batch.steps}", 1, self.matrix.height - self.hud.atlas.height - 1,
+                         self.WHITE)
+        self.present()
+
+    def present(self):
+        """HUD and timing bar, then push the frame to the matrix."""
+        if self.show_hud:
+            self.hud.draw(self.frame)
+        if self.show_timings:
+            self.draw_timing_bar()
+
+        with TIMINGS.stage('led_upload'):
+            target = getattr(self.canvas, 'shared_pixels', None)
+            if target is not None:
+                # 共享内存画布（leddriver.py）：查表结果直接写进共享帧
+                np.take(self.lut, self.frame, out=target)
+            else:
+                # gamma/亮度查找表在上传前一次性作用于整帧
+                upload_frame(self.canvas, self.lut[self.frame])
+            self.canvas = self.matrix.SwapOnVSync(self.canvas)
+
 def main():
     # 图结构和算法初始化
+    graph_file = "./assets/graphs/generated_graph.pkl"
     try:
-        graph_manager = GraphManager.load_from_file("./assets/graphs/generated_graph.pkl")
+        graph_manager = GraphManager.load_from_file(graph_file)
     except (FileNotFoundError, ValueError):
         print("No graph found, generating new graph")
         graph_manager = GraphManager()
         graph_manager.generate_new_graph()
-        graph_manager.save_to_file("./assets/graphs/generated_graph.pkl")
-    
-    graph = graph_manager.get_graph()
-    start_node, end_node = graph_manager.get_endpoints()
-    
-    # 创建LED可视化器
-    visualizer = LEDGraphVisualizer(
-        graph=graph,
-        start_node=start_node,
-        end_node=end_node,
-        matrix_rows=64,  
-        chain_length=1
-    )
-    
-    # 创建算法模拟器
-    simulator = DijkstraSimulator(
-        graph=graph,
-        start_node=start_node,
-        end_node=end_node
-    )
+        graph_manager.save_to_file(graph_file)
+
+    # 只驱动LED：仿真每秒10步，LED按30帧刷新，运行中可通过控制套接字重新配置
+    # 卡顿时 kill -USR1 <pid> 采样 10 秒（-USR2 同时记录内存分配），结果写到 profiles/
+    from control import App
 
+    app = App(steps_per_second=10, fps=30, window=False)
+    app.load_graph(graph_file, graph_manager)
     try:
         print("Press CTRL-C to stop")
-        while True:
-            state = simulator.step()
-            if state:
-                visualizer.draw_frame(state)
-            time.sleep(0.1)  # 控制更新速度
+        asyncio.run(app.run())
     except KeyboardInterrupt:
         sys.exit(0)
 
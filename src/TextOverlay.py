@@ -0,0 +1,210 @@
+"""Text labels for the LED frame, blitted from a pre-rasterized glyph atlas.
+
+``graphics.DrawText`` in ``rgbmatrix`` walks the glyph bitmaps and sets
+every lit pixel through the canvas on every frame.  Here a font (a BDF file
+such as the ones shipped with rpi-rgb-led-matrix, or the built-in 3x5 font)
+is rasterized once into a ``GlyphAtlas``: one boolean array holding every
+glyph side by side in a cell as wide as its advance.  A string becomes a
+gather of atlas columns, and ``TextOverlay`` keeps the lit pixel
+coordinates of each label until its text changes, so drawing an unchanged
+label is one fancy-indexed assignment into the frame.
+"""
+import numpy as np
+
+# 内置 3x5 点阵字体，每个字形 5 行，每行 3 列（# 为亮）
+FONT_3X5 = {
+    '0': '### #.# #.# #.# ###', '1': '.#. ##. .#. .#. ###', '2': '### ..# ### #.. ###',
+    '3': '### ..# ### ..# ###', '4': '#.# #.# ### ..# ..#', '5': '### #.. ### ..# ###',
+    '6': '### #.. ### #.# ###', '7': '### ..# ..# .#. .#.', '8': '### #.# ### #.# ###',
+    '9': '### #.# ### ..# ###',
+    'A': '.#. #.# ### #.# #.#', 'B': '##. #.# ##. #.# ##.', 'C': '.## #.. #.. #.. .##',
+    'D': '##. #.# #.# #.# ##.', 'E': '### #.. ##. #.. ###', 'F': '### #.. ##. #.. #..',
+    'G': '.## #.. #.# #.# .##', 'H': '#.# #.# ### #.# #.#', 'I': '### .#. .#. .#. ###',
+    'J': '..# ..# ..# #.# .#.', 'K': '#.# #.# ##. #.# #.#', 'L': '#.. #.. #.. #.. ###',
+    'M': '#.# ### ### #.# #.#', 'N': '##. #.# #.# #.# #.#', 'O': '.#. #.# #.# #.# .#.',
+    'P': '##. #.# ##. #.. #..', 'Q': '.#. #.# #.# ##. .##', 'R': '##. #.# ##. #.# #.#',
+    'S': '.## #.. .#. ..# ##.', 'T': '### .#. .#. .#. .#.', 'U': '#.# #.# #.# #.# ###',
+    'V': '#.# #.# #.# #.# .#.', 'W': '#.# #.# ### ### #.#', 'X': '#.# #.# .#. #.# #.#',
+    'Y': '#.# #.# .#. .#. .#.', 'Z': '### ..# .#. #.. ###',
+    ' ': '... ... ... ... ...', '.': '... ... ... ... .#.', ':': '... .#. ... .#. ...',
+    '-': '... ... ### ... ...', '+': '... .#. ### .#. ...', '=': '... ### ... ### ...',
+    '/': '..# ..# .#. #.. #..', '%': '#.# ..# .#. #.. #.#', '?': '##. ..# .#. ... .#.',
+    '(': '.#. #.. #.. #.. .#.', ')': '.#. ..# ..# ..# .#.', '_': '... ... ... ... ###',
+}
+
+
+class BitmapFont:
+    """Glyph bitmaps of a font.
+
+    ``glyphs`` maps a character to ``(bitmap, x_offset, y_offset, advance)``
+    with the BDF meaning: ``bitmap`` is a ``(h, w)`` bool array whose bottom
+    row sits ``y_offset`` pixels above the baseline.
+    """
+
+    def __init__(self, glyphs, ascent, descent, uppercase_only=False):
+        self.glyphs = glyphs
+        self.ascent = ascent
+        self.descent = descent
+        self.uppercase_only = uppercase_only
+
+    @property
+    def height(self):
+        return self.ascent + self.descent
+
+
+def builtin_font():
+    """The 3x5 font above (uppercase only, one column of spacing)."""
+    glyphs = {}
+    for char, rows in FONT_3X5.items():
+        bitmap = np.array([[c == '#' for c in row] for row in rows.split()], dtype=np.bool_)
+        glyphs[char] = (bitmap, 0, 0, 4)
+    return BitmapFont(glyphs, ascent=5, descent=0, uppercase_only=True)
+
+
+def parse_bdf(path):
+    """Read a BDF bitmap font (only the fields needed to draw glyphs)."""
+    glyphs = {}
+    ascent = descent = None
+    bounding_box = None
+    with open(path, encoding='latin-1') as f:
+        lines = iter(f.read().splitlines())
+    for line in lines:
+        key, _, value = line.partition(' ')
+        if key == 'FONTBOUNDINGBOX':
+            bounding_box = [int(v) for v in value.split()]
+        elif key == 'FONT_ASCENT':
+            ascent = int(value)
+        elif key == 'FONT_DESCENT':
+            descent = int(value)
+        elif key == 'STARTCHAR':
+            encoding, advance, bbx, rows = -1, None, None, []
+            for line in lines:
+                key, _, value = line.partition(' ')
+                if key == 'ENCODING':
+                    encoding = int(value.split()[0])
+                elif key == 'DWIDTH':
+                    advance = int(value.split()[0])
+                elif key == 'BBX':
+                    bbx = [int(v) for v in value.split()]
+                elif key == 'BITMAP':
+                    for line in lines:
+                        if line.startswith('ENDCHAR'):
+                            break
+                        rows.append(line.strip())
+                    break
+            if encoding < 0 or bbx is None:
+                continue
+            w, h, x_offset, y_offset = bbx
+            # 每行是左对齐的十六进制位串，只取前 w 位
+            bits = [int(row, 16) >> (len(row) * 4 - w) if row else 0 for row in rows[:h]]
+            bits += [0] * (h - len(bits))
+            bitmap = np.array([[(value >> (w - 1 - i)) & 1 for i in range(w)] for value in bits],
+                              dtype=np.bool_).reshape(h, w)
+            glyphs[chr(encoding)] = (bitmap, x_offset, y_offset,
+                                     advance if advance is not None else w + 1)
+
+    if ascent is None or descent is None:
+        if bounding_box is None:
+            raise ValueError(f"{path}: no FONT_ASCENT/FONT_DESCENT or FONTBOUNDINGBOX")
+        # 没有字体属性时用整体包围盒推算
+        descent = -bounding_box[3]
+        ascent = bounding_box[1] - descent
+    return BitmapFont(glyphs, ascent, descent)
+
+
+def load_font(path=None):
+    """Font from a BDF file, or the built-in 3x5 font when ``path`` is None."""
+    return parse_bdf(path) if path else builtin_font()
+
+
+class GlyphAtlas:
+    """Every glyph of a font rasterized once, side by side in one bool array.
+
+    The cell of a glyph is as wide as its advance and as tall as the font;
+    ink outside the cell (negative bearings) is cut off.
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.height = font.height
+        chars = sorted(font.glyphs)
+        advances = np.array([max(font.glyphs[c][3], 0) for c in chars], dtype=np.int64)
+        starts = np.cumsum(advances) - advances
+        self.atlas = np.zeros((self.height, int(advances.sum())), dtype=np.bool_)
+        for char, start, advance in zip(chars, starts.tolist(), advances.tolist()):
+            bitmap, x_offset, y_offset, _ = font.glyphs[char]
+            h, w = bitmap.shape
+            top = font.ascent - y_offset - h
+            # 裁掉超出格子的部分
+            y0, y1 = max(top, 0), min(top + h, self.height)
+            x0, x1 = max(x_offset, 0), min(x_offset + w, advance)
+            if y0 < y1 and x0 < x1:
+                self.atlas[y0:y1, start + x0:start + x1] = \
+                    bitmap[y0 - top:y1 - top, x0 - x_offset:x1 - x_offset]
+        self.slot = {char: i for i, char in enumerate(chars)}
+        self.starts = starts
+        self.advances = advances
+        self.missing = self.slot.get('?', self.slot.get(' '))
+
+    def glyph_ids(self, text):
+        if self.font.uppercase_only:
+            text = text.upper()
+        ids = [self.slot.get(char, self.missing) for char in text]
+        return np.array([i for i in ids if i is not None], dtype=np.int64)
+
+    def width(self, text):
+        return int(self.advances[self.glyph_ids(text)].sum())
+
+    def render(self, text):
+        """``(height, width)`` bool mask of ``text``: one gather of atlas columns."""
+        ids = self.glyph_ids(text)
+        advances = self.advances[ids]
+        offsets = np.cumsum(advances) - advances
+        columns = np.arange(int(advances.sum())) - np.repeat(offsets - self.starts[ids], advances)
+        return self.atlas[:, columns]
+
+
+class TextOverlay:
+    """Named text labels drawn on top of a ``(height, width, 3)`` frame.
+
+    ``set()`` may be called every frame: the label is only rasterized again
+    when its text, position or alignment changes.
+    """
+
+    def __init__(self, font=None, background=(0, 0, 0)):
+        self.atlas = GlyphAtlas(font if isinstance(font, BitmapFont) else load_font(font))
+        self.background = background
+        self.labels = {}
+
+    def set(self, name, text, x, y, color, align='left'):
+        """Place ``text`` with its top-left (``align='right'``: top-right) corner at ``(x, y)``."""
+        label = self.labels.get(name)
+        key = (text, x, y, align)
+        if label is None or label['key'] != key:
+            mask = self.atlas.render(text)
+            height, width = mask.shape
+            left = x - width if align == 'right' else x
+            ys, xs = np.nonzero(mask)
+            label = {'key': key, 'ys': ys + y, 'xs': xs + left,
+                     'box': (left - 1, y - 1, left + width, y + height)}
+            self.labels[name] = label
+        label['color'] = color
+
+    def remove(self, name):
+        self.labels.pop(name, None)
+
+    def clear(self):
+        self.labels.clear()
+
+    def draw(self, frame):
+        height, width = frame.shape[:2]
+        for label in self.labels.values():
+            if self.background is not None:
+                # 文字下面先垫一块底色，免得和边混在一起看不清
+                x0, y0, x1, y1 = label['box']
+                frame[max(y0, 0):max(y1, 0), max(x0, 0):max(x1, 0)] = self.background
+            ys, xs = label['ys'], label['xs']
+            if len(xs) and (xs.min() < 0 or ys.min() < 0 or xs.max() >= width or ys.max() >= height):
+                inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+                ys, xs = ys[inside], xs[inside]
+            frame[ys, xs] = label['color']
@@ -0,0 +1,178 @@
+"""Pan/zoom window onto the graph for the LED matrix.
+
+The viewport maps graph coordinates to pixels of the whole matrix canvas,
+which for ``chain_length`` x ``parallel`` panels is ``cols * chain_length``
+by ``rows * parallel`` pixels; the panels are just tiles of that canvas.
+At ``zoom=1`` the whole graph is fitted exactly the way
+``LEDGraphVisualizer.scale_coordinates`` always did (2 pixel margin).
+
+Every change of the view bumps ``version``; the screen positions of all
+nodes and the set of edges crossing the view are computed with NumPy once
+per version, so culling costs nothing while the view stands still.
+
+Input handlers move the view on the main thread while the LED sink reads it
+on its render thread: changes and cache fills both take ``lock``, so a cached
+array is always computed from one complete view and a change in between
+cannot make the lookup fail.
+"""
+import threading
+
+import numpy as np
+
+
+class Viewport:
+    def __init__(self, max_x, max_y, width, height, margin=2, min_zoom=1.0, max_zoom=64.0):
+        self.max_x = max_x
+        self.max_y = max_y
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        # zoom=1 时整张图刚好放进屏幕
+        self.fit_x = (width - 2 * margin) / max_x
+        self.fit_y = (height - 2 * margin) / max_y
+        self.version = 0
+        self.lock = threading.RLock()
+        self._cache = {}
+        self.reset()
+
+    @property
+    def scale_x(self):
+        return self.fit_x * self.zoom
+
+    @property
+    def scale_y(self):
+        return self.fit_y * self.zoom
+
+    def _changed(self):
+        self.version += 1
+        self._cache.clear()
+
+    def _cached(self, key, compute):
+        # 在锁内查找并计算，返回局部变量：另一线程此时清空缓存也不会 KeyError
+        with self.lock:
+            value = self._cache.get(key)
+            if value is None:
+                value = compute()
+                self._cache[key] = value
+            return value
+
+    def reset(self):
+        with self.lock:
+            self.zoom = 1.0
+            # (x0, y0) 是映射到像素 (1, 1) 的图坐标
+            self.x0 = 0.0
+            self.y0 = 0.0
+            self._changed()
+
+    def to_screen(self, x, y):
+        return (int((x - self.x0) * self.scale_x + 1), int((y - self.y0) * self.scale_y + 1))
+
+    def to_world(self, px, py):
+        return ((px - 1) / self.scale_x + self.x0, (py - 1) / self.scale_y + self.y0)
+
+    @property
+    def center(self):
+        return self.to_world(self.width / 2, self.height / 2)
+
+    def center_on(self, x, y):
+        with self.lock:
+            cx, cy = self.center
+            self.x0 += x - cx
+            self.y0 += y - cy
+            self._changed()
+
+    def pan(self, dx, dy):
+        """Move the view by ``(dx, dy)`` pixels."""
+        with self.lock:
+            self.x0 += dx / self.scale_x
+            self.y0 += dy / self.scale_y
+            self._changed()
+
+    def zoom_by(self, factor, around=None):
+        """Zoom keeping ``around`` (graph coordinates, default the center) in place."""
+        with self.lock:
+            zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+            if zoom == self.zoom:
+                return
+            ax, ay = around if around is not None else self.center
+            px, py = (ax - self.x0) * self.scale_x, (ay - self.y0) * self.scale_y
+            self.zoom = zoom
+            self.x0 = ax - px / self.scale_x
+            self.y0 = ay - py / self.scale_y
+            self._changed()
+
+    def follow(self, node, dead_zone=0.25):
+        """Recenter on ``node`` once it leaves the middle of the view.
+
+        ``dead_zone`` is the fraction of the view kept free on every side, so
+        the view only jumps when the frontier gets close to the border.
+        """
+        with self.lock:
+            if self.zoom <= 1.0:
+                return False
+            px, py = self.to_screen(*node)
+            if (dead_zone * self.width <= px < (1 - dead_zone) * self.width
+                    and dead_zone * self.height <= py < (1 - dead_zone) * self.height):
+                return False
+            self.center_on(*node)
+            return True
+
+    def screen_coords(self, coords):
+        """Pixel positions of an ``(n, 2)`` array of graph coordinates (cached per version)."""
+        def compute():
+            xs = ((coords[:, 0] - self.x0) * self.scale_x + 1).astype(np.int64)
+            ys = ((coords[:, 1] - self.y0) * self.scale_y + 1).astype(np.int64)
+            return xs, ys
+        return self._cached(('coords', id(coords)), compute)
+
+    def visible_nodes(self, index, pad=1):
+        """Node ids whose pixel (plus ``pad``) lies on the canvas."""
+        def compute():
+            xs, ys = self.screen_coords(index.coords)
+            return np.flatnonzero((xs >= -pad) & (xs < self.width) & (ys >= -pad) & (ys < self.height))
+        return self._cached(('nodes', id(index), pad), compute)
+
+    def visible_edges(self, index):
+        """Edge ids whose segment crosses the canvas, everything else is culled."""
+        def compute():
+            xs, ys = self.screen_coords(index.coords)
+            return np.flatnonzero(self._segments_visible(
+                xs[index.edge_src], ys[index.edge_src], xs[index.edge_dst], ys[index.edge_dst]))
+        return self._cached(('edges', id(index)), compute)
+
+    def clip_segment(self, x1, y1, x2, y2):
+        """Liang-Barsky clip of a pixel segment to the canvas, None when it misses."""
+        right, bottom = self.width - 1, self.height - 1
+        if 0 <= x1 <= right and 0 <= y1 <= bottom and 0 <= x2 <= right and 0 <= y2 <= bottom:
+            return x1, y1, x2, y2
+        dx, dy = x2 - x1, y2 - y1
+        t0, t1 = 0.0, 1.0
+        for p, q in ((-dx, x1), (dx, right - x1), (-dy, y1), (dy, bottom - y1)):
+            if p == 0:
+                if q < 0:
+                    return None
+                continue
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+            if t0 > t1:
+                return None
+        return (round(x1 + t0 * dx), round(y1 + t0 * dy),
+                round(x1 + t1 * dx), round(y1 + t1 * dy))
+
+    def _segments_visible(self, x1, y1, x2, y2):
+        right, bottom = self.width - 1, self.height - 1
+        # 包围盒不相交的直接剔除
+        overlap = ((np.maximum(x1, x2) >= 0) & (np.minimum(x1, x2) <= right)
+                   & (np.maximum(y1, y2) >= 0) & (np.minimum(y1, y2) <= bottom))
+        # 四个角都在直线同一侧时线段不经过屏幕
+        dx, dy = x2 - x1, y2 - y1
+        sides = [dx * (cy - y1) - dy * (cx - x1)
+                 for cx, cy in ((0, 0), (right, 0), (0, bottom), (right, bottom))]
+        sides = np.stack(sides)
+        crosses = (sides.min(axis=0) <= 0) & (sides.max(axis=0) >= 0)
+        return overlap & crosses
@@ -0,0 +1,203 @@
+"""Headless stand-in for ``led_lib.rgbmatrix`` backed by NumPy.
+
+Implements the part of ``RGBMatrix``/``FrameCanvas`` the project uses
+(SetPixel, Clear, Fill, SetImage, CreateFrameCanvas, SwapOnVSync,
+width/height, plus the batched ``DrawLines``/``SetPixels`` of the graphics
+bindings as canvas methods) and counts the calls made on it.  With
+``record=True`` it also keeps every swapped frame in memory (the last
+``max_frames`` of them when that is set); that is off by default so a
+long-running virtual display does not grow without bound.
+
+With ``emulate_costs=True`` each call also busy-waits for the time it
+roughly takes on a Pi 4, so profiles taken on a build machine have the
+right shape.  The batched calls cost a fixed amount per call plus an amount
+per pixel (the ``'<name>/pixel'`` entries of ``DEFAULT_CALL_COSTS``).
+"""
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from framebuffer import draw_lines
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+
+# 树莓派4B上测得的大致单次调用耗时（秒）
+DEFAULT_CALL_COSTS = {
+    'SetPixel': 1.5e-6,
+    'Clear': 2e-5,
+    'Fill': 2e-5,
+    'SetImage': 3e-4,
+    'SwapOnVSync': 0.0,
+    # 批量接口：一次调用的开销加上原生循环里每个像素的开销
+    'DrawLines': 4e-6,
+    'DrawLines/pixel': 2e-8,
+    'SetPixels': 3e-6,
+    'SetPixels/pixel': 1.5e-8,
+}
+
+
+class VirtualMatrixOptions:
+    """Mirror of ``RGBMatrixOptions`` with the fields the project sets."""
+
+    def __init__(self):
+        self.rows = 32
+        self.cols = 32
+        self.chain_length = 1
+        self.parallel = 1
+        self.hardware_mapping = 'regular'
+        self.brightness = 100
+
+
+class VirtualCanvas:
+    def __init__(self, matrix, width, height):
+        self._matrix = matrix
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def _cost(self, name, pixels=0):
+        self._matrix.stats[name] += 1
+        cost = self._matrix.call_costs.get(name, 0.0)
+        if pixels:
+            # 像素数记在 '<name>/pixel' 下，emulated_time 按同样的键累计
+            self._matrix.stats[name + '/pixel'] += pixels
+            cost += self._matrix.call_costs.get(name + '/pixel', 0.0) * pixels
+        if self._matrix.emulate_costs and cost:
+            deadline = time.perf_counter() + cost
+            while time.perf_counter() < deadline:
+                pass
+
+    def SetPixel(self, x, y, red, green, blue):
+        self._cost('SetPixel')
+        # 和硬件一样，越界的像素直接忽略
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.pixels[y, x] = (red, green, blue)
+
+    def Clear(self):
+        self._cost('Clear')
+        self.pixels.fill(0)
+
+    def Fill(self, red, green, blue):
+        self._cost('Fill')
+        self.pixels[:] = (red, green, blue)
+
+    def DrawLines(self, x1, y1, x2, y2, colors):
+        """``graphics.DrawLines(canvas, ...)``: segments in order, out-of-range pixels ignored."""
+        pixels = draw_lines(self.pixels, x1, y1, x2, y2, colors if len(colors) > 1 else colors[0])
+        self._cost('DrawLines', pixels)
+
+    def SetPixels(self, xs, ys, colors):
+        """``graphics.SetPixels(canvas, ...)``."""
+        self._cost('SetPixels', len(xs))
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        self.pixels[ys[inside], xs[inside]] = colors[inside] if len(colors) > 1 else colors[0]
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        self._cost('SetImage')
+        if image.mode != "RGB":
+            raise Exception("Currently, only RGB mode is supported for SetImage().")
+        src = np.asarray(image, dtype=np.uint8)
+        x0, y0 = max(0, offset_x), max(0, offset_y)
+        x1 = min(self.width, offset_x + src.shape[1])
+        y1 = min(self.height, offset_y + src.shape[0])
+        if x0 < x1 and y0 < y1:
+            self.pixels[y0:y1, x0:x1] = src[y0 - offset_y:y1 - offset_y, x0 - offset_x:x1 - offset_x]
+
+
+class VirtualFrameCanvas(VirtualCanvas):
+    pass
+
+
+class VirtualMatrix(VirtualCanvas):
+    """Drop-in for ``RGBMatrix(options=...)`` that never touches GPIO."""
+
+    def __init__(self, options=None, record=False, max_frames=None,
+                 emulate_costs=False, call_costs=None):
+        options = options or VirtualMatrixOptions()
+        self.options = options
+        self.record = record
+        self.max_frames = max_frames
+        self.emulate_costs = emulate_costs
+        self.call_costs = dict(DEFAULT_CALL_COSTS if call_costs is None else call_costs)
+        self.stats = Counter()
+        self.frames = []
+        self.brightness = getattr(options, 'brightness', 100)
+        super().__init__(self, options.cols * options.chain_length, options.rows * options.parallel)
+        # 当前显示的缓冲区；直接在矩阵上绘制时画的就是它
+        self._front = VirtualFrameCanvas(self, self.width, self.height)
+        self._front.pixels = self.pixels
+
+    def CreateFrameCanvas(self):
+        return VirtualFrameCanvas(self, self.width, self.height)
+
+    def SwapOnVSync(self, canvas, framerate_fraction=1):
+        """Show ``canvas`` and hand back the previously shown buffer, like the hardware."""
+        self._cost('SwapOnVSync')
+        shown, self._front = self._front, canvas
+        self.pixels = canvas.pixels
+        if self.record:
+            self.frames.append(self.pixels.copy())
+            if self.max_frames is not None and len(self.frames) > self.max_frames:
+                del self.frames[0]
+        return shown
+
+    def snapshot(self):
+        """Record what is currently on the matrix (for direct drawing without swaps)."""
+        self.frames.append(self.pixels.copy())
+
+    def frames_array(self):
+        """All recorded frames as one ``(n, height, width, 3)`` array."""
+        if not self.frames:
+            return np.zeros((0, self.height, self.width, 3), dtype=np.uint8)
+        return np.stack(self.frames)
+
+    def emulated_time(self):
+        """Seconds the recorded calls would have taken on the Pi."""
+        return sum(self.call_costs.get(name, 0.0) * count for name, count in self.stats.items())
+
+    def reset_stats(self):
+        self.stats.clear()
+
+
+def create_matrix(rows=64, cols=64, chain_length=1, parallel=1,
+                  hardware_mapping='regular', backend=None, **virtual_kwargs):
+    """Build the LED matrix, falling back to ``VirtualMatrix`` off the Pi.
+
+    ``backend`` is ``'hardware'``, ``'virtual'`` or ``'auto'``; when omitted it
+    is read from the ``DIJK_MATRIX`` environment variable.
+    """
+    backend = backend or os.environ.get('DIJK_MATRIX', 'auto')
+    if backend not in ('auto', 'hardware', 'virtual'):
+        raise ValueError(f"Unknown matrix backend: {backend}")
+
+    if backend != 'virtual':
+        try:
+            from led_lib.rgbmatrix import RGBMatrix, RGBMatrixOptions
+        except ImportError:
+            # core/graphics 只有 aarch64 的 .so，其他平台上回退到虚拟矩阵
+            if backend == 'hardware':
+                raise
+        else:
+            options = RGBMatrixOptions()
+            options.rows = rows
+            options.cols = cols
+            options.chain_length = chain_length
+            options.parallel = parallel
+            options.hardware_mapping = hardware_mapping
+            return RGBMatrix(options=options)
+
+    options = VirtualMatrixOptions()
+    options.rows = rows
+    options.cols = cols
+    options.chain_length = chain_length
+    options.parallel = parallel
+    options.hardware_mapping = hardware_mapping
+    return VirtualMatrix(options, **virtual_kwargs)
@@ -0,0 +1,178 @@
+"""Precomputed all-pairs distance and next-hop tables.
+
+``build_tables`` runs one Dijkstra per source node across a process pool and
+writes two ``n x n`` tables next to the graph file, as ``.npy`` files that
+are opened memory-mapped afterwards::
+
+    graph2.pkl
+    graph2.allpairs.dist.npy   float32, inf when unreachable
+    graph2.allpairs.next.npy   uint16 (uint32 for > 65535 nodes), the node id
+                               of the first hop from row to column
+    graph2.allpairs.json       node/edge count and graph checksum
+
+The workers write their rows straight into the shared mapping, so nothing
+but the source id travels between processes.  The json file is written last
+and only loads tables that were completely built for the same graph.
+
+``AllPairs.path`` follows next hops from the start until it reaches the end,
+no search involved: switching the endpoints of a demo costs a few table reads.
+"""
+import argparse
+import heapq
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from GraphIndex import GraphIndex
+from GraphManager import GraphManager
+from tracing import graph_crc
+
+
+def table_paths(graph_file):
+    """``(dist, next, meta)`` file names that belong to ``graph_file``."""
+    base = os.path.splitext(graph_file)[0] + '.allpairs'
+    return base + '.dist.npy', base + '.next.npy', base + '.json'
+
+
+def hop_dtype(n_nodes):
+    return np.uint16 if n_nodes < np.iinfo(np.uint16).max else np.uint32
+
+
+def _meta(index):
+    return {'nodes': index.n_nodes, 'edges': index.n_edges, 'crc': graph_crc(index)}
+
+
+# 每个工作进程各自持有的 CSR 数组和映射好的表
+_WORKER = {}
+
+
+def _init_worker(indptr, edge_dst, weights, dist_path, next_path):
+    _WORKER['csr'] = (indptr.tolist(), edge_dst.tolist(), weights.tolist())
+    _WORKER['dist'] = np.load(dist_path, mmap_mode='r+')
+    _WORKER['next'] = np.load(next_path, mmap_mode='r+')
+
+
+def _solve_source(s):
+    """Dijkstra from node id ``s``; writes row ``s`` of both tables."""
+    indptr, edge_dst, weights = _WORKER['csr']
+    n = len(indptr) - 1
+    dist = [float('inf')] * n
+    first = [-1] * n
+    settled = bytearray(n)
+    dist[s] = 0.0
+    first[s] = s
+    heap = [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if settled[u]:
+            continue
+        settled[u] = 1
+        hop = first[u]
+        for e in range(indptr[u], indptr[u + 1]):
+            v = edge_dst[e]
+            distance = d + weights[e]
+            if distance < dist[v]:
+                dist[v] = distance
+                # 第一跳沿最短路径树向下继承
+                first[v] = v if u == s else hop
+                heapq.heappush(heap, (distance, v))
+
+    next_row = np.array(first, dtype=np.int64)
+    table = _WORKER['next']
+    next_row[next_row < 0] = np.iinfo(table.dtype).max
+    _WORKER['dist'][s] = dist
+    table[s] = next_row
+    return s
+
+
+def build_tables(graph_file, processes=None, chunksize=None):
+    """Compute the tables for ``graph_file``; returns the ``AllPairs`` result."""
+    graph = GraphManager.load_from_file(graph_file).get_graph()
+    index = GraphIndex(graph)
+    n = index.n_nodes
+    dist_path, next_path, meta_path = table_paths(graph_file)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    np.lib.format.open_memmap(dist_path, mode='w+', dtype=np.float32, shape=(n, n)).flush()
+    np.lib.format.open_memmap(next_path, mode='w+', dtype=hop_dtype(n), shape=(n, n)).flush()
+
+    args = (index.indptr, index.edge_dst, index.weights, dist_path, next_path)
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        _init_worker(*args)
+        for s in range(n):
+            _solve_source(s)
+        _WORKER.clear()
+    else:
+        # 每个任务一个源点，chunksize 只是减少进程间往返
+        chunksize = chunksize or max(1, n // (processes * 16))
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=args) as pool:
+            for _ in pool.imap_unordered(_solve_source, range(n), chunksize=chunksize):
+                pass
+
+    with open(meta_path, 'w') as f:
+        json.dump(_meta(index), f)
+    return AllPairs.load(graph_file, index)
+
+
+class AllPairs:
+    """Distance and path lookups in the memory-mapped tables."""
+
+    def __init__(self, index, dist, next_hop):
+        self.index = index
+        self.dist = dist
+        self.next_hop = next_hop
+        self.missing = np.iinfo(next_hop.dtype).max
+
+    @classmethod
+    def load(cls, graph_file, index):
+        """Open the tables of ``graph_file``; ``index`` must be built from the same graph."""
+        dist_path, next_path, meta_path = table_paths(graph_file)
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta != _meta(index):
+            raise ValueError(f"All-pairs tables of {graph_file} belong to a different graph")
+        return cls(index, np.load(dist_path, mmap_mode='r'), np.load(next_path, mmap_mode='r'))
+
+    def distance(self, start, end):
+        node_id = self.index.node_id
+        return float(self.dist[node_id[start], node_id[end]])
+
+    def path(self, start, end):
+        """Node tuples from ``start`` to ``end``, ``[]`` when unreachable."""
+        nodes = self.index.nodes
+        node_id = self.index.node_id
+        u, t = node_id[start], node_id[end]
+        next_hop = self.next_hop
+        path = [start]
+        # 最短路径最多 n 个节点，多出来说明表已损坏
+        for _ in range(self.index.n_nodes):
+            if u == t:
+                return path
+            u = int(next_hop[u, t])
+            if u == self.missing:
+                return []
+            path.append(nodes[u])
+        raise ValueError(f"Next-hop table loops between {start} and {end}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build all-pairs distance/next-hop tables")
+    parser.add_argument('graph', help="graph pickle; tables are written next to it")
+    parser.add_argument('--processes', type=int, default=None, help="default: one per CPU")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    tables = build_tables(args.graph, args.processes)
+    n = tables.index.n_nodes
+    size = tables.dist.nbytes + tables.next_hop.nbytes
+    print(f"{n} sources in {time.perf_counter() - started:.2f}s, "
+          f"{size / 2 ** 20:.1f} MiB in {os.path.dirname(table_paths(args.graph)[0]) or '.'}")
+
+
+if __name__ == "__main__":
+    main()
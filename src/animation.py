@@ -0,0 +1,236 @@
+"""Offline animation compiler and low-CPU player for the LED matrix.
+
+``compile`` runs ``DijkstraSimulator`` over a graph, renders every frame
+through ``LEDGraphVisualizer`` on a virtual matrix and stores the frames in a
+compact file.  ``play`` streams such a file to the matrix at a fixed rate,
+the same way ``led_lib/samples/gif-viewer.py`` replays precomputed canvases.
+
+File layout (little endian)::
+
+    header   b'DJKANIM1', width u16, height u16, fps f32, frame_count u32
+    frame    kind u8, payload_size u32, zlib(payload)
+
+``K`` frames carry the raw RGB frame, ``D`` frames carry only the runs of
+pixels that changed since the previous frame (u32 run count, u32 starts,
+u32 lengths, RGB bytes of the changed pixels) and ``S`` frames repeat the
+previous frame.
+"""
+import argparse
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from GraphManager import GraphManager
+from LEDGraphVisualizer import LEDGraphVisualizer
+from VirtualMatrix import create_matrix
+from dijkstra import DijkstraSimulator
+from framebuffer import upload_frame
+
+MAGIC = b'DJKANIM1'
+HEADER = struct.Struct('<8sHHfI')
+RECORD = struct.Struct('<BI')
+
+KEYFRAME, DELTA, SAME = b'K'[0], b'D'[0], b'S'[0]
+
+
+def _changed_runs(previous, frame):
+    """(starts, lengths) of runs of pixels that differ between two frames."""
+    changed = np.any(previous.reshape(-1, 3) != frame.reshape(-1, 3), axis=1)
+    edges = np.diff(np.concatenate(([0], changed.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return starts.astype(np.uint32), (ends - starts).astype(np.uint32)
+
+
+class AnimationWriter:
+    def __init__(self, path, width, height, fps=30.0, keyframe_interval=120, level=9):
+        self.file = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.frame_count = 0
+        self.previous = None
+        self.file.write(HEADER.pack(MAGIC, width, height, fps, 0))
+
+    def _write_record(self, kind, payload=b''):
+        data = zlib.compress(payload, self.level) if payload else b''
+        self.file.write(RECORD.pack(kind, len(data)))
+        self.file.write(data)
+
+    def write(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.shape != (self.height, self.width, 3):
+            raise ValueError(f"Frame shape {frame.shape} does not match {(self.height, self.width, 3)}")
+
+        if self.previous is None or self.frame_count % self.keyframe_interval == 0:
+            self._write_record(KEYFRAME, frame.tobytes())
+        else:
+            starts, lengths = _changed_runs(self.previous, frame)
+            if not len(starts):
+                self._write_record(SAME)
+            else:
+                flat = frame.reshape(-1, 3)
+                pixels = np.concatenate([flat[s:s + n] for s, n in zip(starts.tolist(), lengths.tolist())])
+                payload = (struct.pack('<I', len(starts)) + starts.tobytes()
+                           + lengths.tobytes() + pixels.tobytes())
+                self._write_record(DELTA, payload)
+
+        self.previous = frame.copy()
+        self.frame_count += 1
+
+    def close(self):
+        # 帧数在写完后回填到文件头
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, self.width, self.height, self.fps, self.frame_count))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AnimationReader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        magic, self.width, self.height, self.fps, self.frame_count = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"Not an animation file: {path}")
+
+    def __len__(self):
+        return self.frame_count
+
+    def __iter__(self):
+        """Yield every frame; the same buffer is reused, copy it to keep it."""
+        frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        flat = frame.reshape(-1, 3)
+        offset = HEADER.size
+        for _ in range(self.frame_count):
+            kind, size = RECORD.unpack_from(self.data, offset)
+            offset += RECORD.size
+            payload = zlib.decompress(self.data[offset:offset + size]) if size else b''
+            offset += size
+
+            if kind == KEYFRAME:
+                frame[:] = np.frombuffer(payload, dtype=np.uint8).reshape(frame.shape)
+            elif kind == DELTA:
+                runs = struct.unpack_from('<I', payload)[0]
+                starts = np.frombuffer(payload, dtype=np.uint32, count=runs, offset=4)
+                lengths = np.frombuffer(payload, dtype=np.uint32, count=runs, offset=4 + 4 * runs)
+                pixels = np.frombuffer(payload, dtype=np.uint8, offset=4 + 8 * runs).reshape(-1, 3)
+                # 把每段的像素下标展开成一个数组，一次性写回
+                offsets = starts.astype(np.int64) - np.cumsum(lengths, dtype=np.int64) + lengths
+                flat[np.repeat(offsets, lengths) + np.arange(len(pixels))] = pixels
+            elif kind != SAME:
+                raise ValueError(f"Unknown frame kind: {kind}")
+            yield frame
+
+
+def compile_animation(graph_file, output, fps=30.0, steps_per_frame=1, hold_seconds=3.0,
+                      keyframe_interval=120):
+    """Render a whole run of the algorithm on ``graph_file`` into ``output``."""
+    graph_manager = GraphManager.load_from_file(graph_file)
+    graph = graph_manager.get_graph()
+    start_node, end_node = graph_manager.get_endpoints()
+
+    visualizer = LEDGraphVisualizer(graph, start_node, end_node, matrix_backend='virtual')
+    simulator = DijkstraSimulator(graph, start_node, end_node)
+    matrix = visualizer.matrix
+
+    with AnimationWriter(output, matrix.width, matrix.height, fps, keyframe_interval) as writer:
+        state = simulator.get_state()
+        visualizer.draw_frame(state)
+        writer.write(matrix.pixels)
+        while True:
+            advanced = 0
+            for _ in range(steps_per_frame):
+                next_state = simulator.step()
+                if next_state is None:
+                    break
+                state = next_state
+                advanced += 1
+            # 没有再前进就不画，否则最后一个状态会多写一帧
+            if not advanced:
+                break
+            visualizer.draw_frame(state)
+            writer.write(matrix.pixels)
+            if next_state is None:
+                break
+        for _ in range(int(hold_seconds * fps)):
+            writer.write(matrix.pixels)
+        return writer.frame_count
+
+
+def play_animation(path, matrix=None, fps=None, loop=True, preload=True):
+    """Stream an animation file to the matrix at a fixed frame rate."""
+    animation = AnimationReader(path)
+    if matrix is None:
+        matrix = create_matrix(rows=animation.height, cols=animation.width)
+    period = 1.0 / (fps or animation.fps)
+
+    canvases = None
+    if preload:
+        # 和 gif-viewer 一样，预先把每帧放进画布，播放时只需要 SwapOnVSync
+        canvases = []
+        for frame in animation:
+            canvas = matrix.CreateFrameCanvas()
+            upload_frame(canvas, frame)
+            canvases.append(canvas)
+    canvas = matrix.CreateFrameCanvas()
+
+    next_frame = time.monotonic()
+    while True:
+        for item in (canvases if preload else animation):
+            if preload:
+                matrix.SwapOnVSync(item)
+            else:
+                upload_frame(canvas, item)
+                canvas = matrix.SwapOnVSync(canvas)
+            next_frame += period
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame = time.monotonic()
+        if not loop:
+            return matrix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and play LED animations of Dijkstra runs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compile_parser = commands.add_parser('compile', help="render a graph run into an animation file")
+    compile_parser.add_argument('graph')
+    compile_parser.add_argument('output')
+    compile_parser.add_argument('--fps', type=float, default=30.0)
+    compile_parser.add_argument('--steps-per-frame', type=int, default=1)
+    compile_parser.add_argument('--hold', type=float, default=3.0, help="seconds to hold the final frame")
+
+    play_parser = commands.add_parser('play', help="play an animation file on the matrix")
+    play_parser.add_argument('animation')
+    play_parser.add_argument('--fps', type=float, default=None)
+    play_parser.add_argument('--once', action='store_true')
+    play_parser.add_argument('--stream', action='store_true', help="decode while playing instead of preloading")
+
+    args = parser.parse_args(argv)
+    if args.command == 'compile':
+        count = compile_animation(args.graph, args.output, args.fps, args.steps_per_frame, args.hold)
+        print(f"Wrote {count} frames to {args.output}")
+    else:
+        try:
+            print("Press CTRL-C to stop")
+            play_animation(args.animation, fps=args.fps, loop=not args.once, preload=not args.stream)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,557 @@
+"""asyncio front end of the visualizer with a local control socket.
+
+``App`` owns the simulation runtime, the render sinks and pygame event
+pumping, all on one asyncio loop, and listens on a Unix socket for JSON
+lines such as::
+
+    {"cmd": "load_graph", "path": "assets/graphs/graph1.pkl"}
+    {"cmd": "set_endpoints", "start": [8, 8], "end": [56, 48]}
+    {"cmd": "pause"}   {"cmd": "resume"}   {"cmd": "rate", "steps_per_second": 30}
+    {"cmd": "rate", "duration": 20}
+    {"cmd": "engine", "name": "trace", "path": "run.djt"}
+    {"cmd": "reload"}   {"cmd": "status"}
+    {"cmd": "profile", "seconds": 5, "memory": true}   {"cmd": "profile", "stop": true}
+
+Every request gets one JSON line back, ``{"ok": true, ...}`` or
+``{"ok": false, "error": "..."}``.  Graphs are cached per file: switching
+back to a graph reuses its ``GraphIndex`` and visualizers, and the LED
+matrix is initialized once for the whole process (with ``led_process=True``
+it lives in a separate driver process, see ``leddriver.py``).  With ``watch=True`` the
+current graph file is polled and reloaded incrementally when it changes
+(see ``hotreload.py``).  Profile captures (``profiling.py``) are started by
+the ``profile`` command, the ``P`` key, SIGUSR1 (cProfile) or SIGUSR2
+(cProfile and tracemalloc).
+
+Graph files are pickles, and unpickling runs code, so ``load_graph`` over the
+socket only accepts files inside ``graph_dirs`` (default ``assets/graphs``
+plus the directories in ``$DIJK_GRAPH_DIRS``), and the socket is created
+with mode 0600.  Anyone who can write to the socket can still drive the
+demo.
+
+    python src/control.py pause
+    python src/control.py set_endpoints start=[8,8] end=[56,48]
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+from pathlib import Path
+
+from GraphIndex import GraphIndex
+from GraphManager import GraphManager
+from dijkstra import DijkstraSimulator
+from hotreload import GraphWatcher, apply_diff, diff_graphs
+from profiling import CAPTURE
+from renderer import FanOutRenderer, LEDSink, PygameSink
+from runtime import SimulationRuntime
+from timing import TIMINGS
+
+DEFAULT_SOCKET = os.environ.get('DIJK_CONTROL', '/tmp/dijk_raspi.sock')
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_GRAPH_DIRS = [str(ROOT_DIR / 'assets' / 'graphs')] + \
+    [path for path in os.environ.get('DIJK_GRAPH_DIRS', '').split(os.pathsep) if path]
+
+
+class GraphSession:
+    """Everything built for one graph file, kept for reuse."""
+
+    def __init__(self, path, graph_manager):
+        self.path = path
+        self.graph_manager = graph_manager
+        self.index = GraphIndex(graph_manager.get_graph())
+        self.watcher = GraphWatcher(path)
+        self.visualizer = None
+        self.led_visualizer = None
+
+
+class App:
+    def __init__(self, socket_path=DEFAULT_SOCKET, steps_per_second=120, fps=60,
+                 window=True, led=True, watch=True, watch_interval=0.5, duration=None,
+                 led_process=False, graph_dirs=None):
+        self.socket_path = socket_path
+        self.graph_dirs = [os.path.realpath(path) for path in (graph_dirs or DEFAULT_GRAPH_DIRS)]
+        self.steps_per_second = steps_per_second
+        self.duration = duration
+        self.fps = fps
+        self.window = window
+        self.led = led
+        self.led_process = led_process
+        self.watch = watch
+        self.watch_interval = watch_interval
+
+        self.sessions = {}
+        self.session = None
+        self.matrix = None
+        self.engine = 'dijkstra'
+        self.engine_options = {}
+        self.simulator = None
+        self.runtime = None
+        self.renderer = None
+        self.paused = False
+        self.rewinding = False
+        self.running = True
+        self.profiler = CAPTURE
+
+        self.commands = {
+            'load_graph': self.load_allowed_graph,
+            'set_endpoints': self.set_endpoints,
+            'pause': self.pause,
+            'resume': self.resume,
+            'toggle_pause': self.toggle_pause,
+            'rate': self.set_rate,
+            'engine': self.set_engine,
+            'restart': self.restart,
+            'reload': self.reload_graph,
+            'step': self.step_forward,
+            'step_back': self.step_back,
+            'status': self.status,
+            'profile': self.profile,
+            'quit': self.quit,
+        }
+
+    # ---- 图和引擎 ----
+
+    def load_graph(self, path, graph_manager=None):
+        """Switch to the graph in ``path`` (cached after the first load)."""
+        key = os.path.abspath(path)
+        session = self.sessions.get(key)
+        if session is None:
+            if graph_manager is None:
+                graph_manager = GraphManager.load_from_file(path)
+            session = self.sessions[key] = GraphSession(path, graph_manager)
+        self.session = session
+        self._build_visualizers(session)
+        self._build_renderer()
+        self.restart()
+        return {'nodes': session.index.n_nodes, 'edges': session.index.n_edges}
+
+    def load_allowed_graph(self, path):
+        """``load_graph`` for the control socket: only files inside ``graph_dirs``."""
+        real = os.path.realpath(path)
+        if not any(os.path.commonpath([real, root]) == root for root in self.graph_dirs):
+            raise PermissionError(f"{path} is outside the graph directories {self.graph_dirs}")
+        return self.load_graph(path)
+
+    def reload_graph(self):
+        """Re-read the current graph file and apply only what changed."""
+        session = self.session
+        graph_manager = GraphManager.load_from_file(session.path)
+        diff = diff_graphs(session.graph_manager.get_graph(), graph_manager.get_graph())
+        if diff.geometry_changed:
+            # 节点变了：这张图的缓存全部重建（LED 矩阵仍然复用）
+            del self.sessions[os.path.abspath(session.path)]
+            reply = self.load_graph(session.path, graph_manager)
+            return {'full': True, **reply}
+
+        # 先停下仿真线程和 LED 渲染线程，它们都在读这张图
+        self.runtime.stop()
+        self.renderer.close()
+        segments = apply_diff(session, graph_manager, diff)
+        self._build_renderer()
+        try:
+            self.restart()
+        except (OSError, ValueError):
+            # 比如轨迹是在旧图上录的
+            self.engine, self.engine_options = 'dijkstra', {}
+            self.restart()
+        return {'full': False, 'added': len(diff.added), 'removed': len(diff.removed),
+                'reweighted': len(diff.reweighted), 'redrawn': len(segments)}
+
+    async def _watch(self):
+        while self.running:
+            await asyncio.sleep(self.watch_interval)
+            if not self.session.watcher.changed():
+                continue
+            try:
+                reply = self.reload_graph()
+            except (OSError, ValueError, EOFError) as error:
+                # 文件可能还没写完，下次变化时再试
+                print(f"Reloading {self.session.path} failed: {error}")
+                continue
+            print(f"Reloaded {self.session.path}: {reply}")
+
+    def _build_visualizers(self, session):
+        graph = session.graph_manager.get_graph()
+        start, end = session.graph_manager.get_endpoints()
+        if self.window:
+            import pygame
+            from GraphVisualizer import GraphVisualizer
+
+            if session.visualizer is None:
+                session.visualizer = GraphVisualizer(
+                    graph=graph, start_node=start, end_node=end, use_led=False,
+                    weight_stats=session.graph_manager.get_stats())
+            else:
+                # 换回已缓存的图时重新取得窗口表面
+                visualizer = session.visualizer
+                visualizer.screen = pygame.display.set_mode(visualizer.drawing_area)
+        if self.led and session.led_visualizer is None:
+            from LEDGraphVisualizer import LEDGraphVisualizer
+
+            if self.matrix is None and self.led_process:
+                from leddriver import SharedMatrix
+
+                self.matrix = SharedMatrix()
+            session.led_visualizer = LEDGraphVisualizer(graph=graph, start_node=start, end_node=end,
+                                                        matrix=self.matrix)
+            self.matrix = session.led_visualizer.matrix
+
+    def _build_renderer(self):
+        if self.renderer is not None:
+            self.renderer.close()
+        session = self.session
+        sinks = []
+        if session.visualizer is not None:
+            sinks.append(PygameSink(session.visualizer))
+        if session.led_visualizer is not None:
+            sinks.append(LEDSink(session.led_visualizer))
+        self.renderer = FanOutRenderer(sinks)
+
+    def _make_simulator(self):
+        graph_manager = self.session.graph_manager
+        graph = graph_manager.get_graph()
+        if self.engine == 'dijkstra':
+            start, end = graph_manager.get_endpoints()
+            return DijkstraSimulator(graph, start, end, index=self.session.index)
+        if self.engine == 'trace':
+            from tracing import TraceReplay
+
+            return TraceReplay(self.engine_options['path'], graph)
+        raise ValueError(f"Unknown engine: {self.engine}")
+
+    def restart(self):
+        """Start the current engine from step 0 (keeps pause state and rate)."""
+        simulator = self._make_simulator()
+        if self.runtime is not None:
+            self.runtime.stop()
+        self.simulator = simulator
+        for visualizer in (self.session.visualizer, self.session.led_visualizer):
+            if visualizer is not None:
+                visualizer.set_endpoints(simulator.start_node, simulator.end_node)
+        self.runtime = SimulationRuntime(simulator, steps_per_second=self.steps_per_second,
+                                         duration=self.duration, fps=self.fps)
+        if self.paused:
+            self.runtime.worker.pause()
+        self.rewinding = False
+        # 暂停时也要画出第 0 步；必须在仿真线程开始推进同一个模拟器之前画
+        self.renderer.render(simulator.get_state())
+        self.runtime.start()
+        return {}
+
+    def set_endpoints(self, start=None, end=None):
+        graph_manager = self.session.graph_manager
+        for node in (start, end):
+            if node is not None and tuple(node) not in graph_manager.nodes:
+                raise ValueError(f"Node {tuple(node)} is not in the graph")
+        graph_manager.set_endpoints(tuple(start) if start is not None else None,
+                                    tuple(end) if end is not None else None)
+        self.engine = 'dijkstra'
+        self.restart()
+        start, end = graph_manager.get_endpoints()
+        return {'start': start, 'end': end}
+
+    def set_engine(self, name, **options):
+        previous = self.engine, self.engine_options
+        self.engine, self.engine_options = name, options
+        try:
+            return self.restart()
+        except Exception:
+            self.engine, self.engine_options = previous
+            raise
+
+    # ---- 运行控制 ----
+
+    def pause(self):
+        self.paused = True
+        self.rewinding = False
+        self.runtime.worker.pause()
+        return {}
+
+    def resume(self):
+        self.paused = False
+        self.rewinding = False
+        self.runtime.worker.resume()
+        return {}
+
+    def toggle_pause(self):
+        return self.resume() if self.paused else self.pause()
+
+    def set_rate(self, steps_per_second=None, duration=None):
+        """Fixed ``steps_per_second``, or finish the run in ``duration`` seconds from now."""
+        self.steps_per_second = steps_per_second or None
+        self.duration = duration or None
+        self.runtime.set_pace(self.steps_per_second, self.duration)
+        return {'steps_per_second': self.steps_per_second, 'duration': self.duration}
+
+    def step_forward(self, count=1):
+        self.paused = True
+        self.runtime.step_forward(count)
+        return {}
+
+    def step_back(self, count=1):
+        if not hasattr(self.simulator, 'step_back'):
+            raise ValueError(f"Engine {self.engine} cannot step back")
+        self.paused = True
+        self.runtime.step_back(count)
+        return {}
+
+    def status(self):
+        simulator = self.simulator
+        return {
+            'graph': self.session.path,
+            'engine': self.engine,
+            'start': simulator.start_node,
+            'end': simulator.end_node,
+            'step': self.runtime.mirror.step,
+            'finished': self.runtime.worker.finished,
+            'paused': self.paused,
+            'steps_per_second': self.steps_per_second,
+            'duration': self.duration,
+            'render_ms': round(self.runtime.scheduler.render_cost * 1000, 3),
+            'dropped_frames': self.runtime.dropped_frames,
+            'sink_errors': {worker.name: worker.errors for worker in self.renderer.workers},
+            'led_driver': self.matrix.stats if self.led_process and self.matrix else None,
+            'profiling': self.profiler.active,
+            'last_profile': self.profiler.last,
+        }
+
+    def profile(self, seconds=None, frames=None, memory=False, top=None, stop=False):
+        """Capture ``seconds`` or ``frames`` of the loop with cProfile (and tracemalloc)."""
+        if stop:
+            return {'paths': self.profiler.stop()}
+        return self.profiler.start(seconds, frames, memory, top)
+
+    def _signal_profile(self, memory):
+        if not self.profiler.active:
+            print(f"Profiling for {self.profiler.start(memory=memory)['seconds']}s")
+
+    def quit(self):
+        self.running = False
+        return {}
+
+    def execute(self, request):
+        """Run one decoded request, return the reply dict."""
+        try:
+            request = dict(request)
+            handler = self.commands.get(request.pop('cmd', None))
+            if handler is None:
+                raise ValueError(f"Unknown command, expected one of {sorted(self.commands)}")
+            reply = handler(**request) or {}
+        except Exception as error:  # 命令出错只回报，不影响正在运行的演示
+            return {'ok': False, 'error': f"{type(error).__name__}: {error}"}
+        return {'ok': True, **reply}
+
+    # ---- 控制套接字 ----
+
+    async def _client(self, reader, writer):
+        try:
+            while self.running:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = self.execute(json.loads(line))
+                except json.JSONDecodeError as error:
+                    reply = {'ok': False, 'error': f"Invalid JSON: {error}"}
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def _serve(self):
+        if os.path.exists(self.socket_path):
+            if not stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                raise FileExistsError(f"{self.socket_path} exists and is not a socket")
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except ConnectionRefusedError:
+                # 上次异常退出留下的套接字，没有进程在监听，可以删掉
+                os.unlink(self.socket_path)
+            else:
+                raise RuntimeError(f"Another instance is already listening on {self.socket_path}")
+            finally:
+                probe.close()
+        server = await asyncio.start_unix_server(self._client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        return server
+
+    # ---- 主循环 ----
+
+    def pump_events(self):
+        import pygame
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.running = False
+            elif event.type == pygame.KEYDOWN:
+                self.handle_key(event.key)
+
+    def handle_key(self, key):
+        import pygame
+
+        led_visualizer = self.session.led_visualizer
+        if key == pygame.K_ESCAPE:
+            self.running = False
+        elif key == pygame.K_SPACE:
+            self.toggle_pause()
+        # 左/右方向键单步后退/前进（会暂停），B 开关连续倒放，H 开关 LED 上的 HUD
+        elif key == pygame.K_LEFT:
+            self.rewinding = False
+            self.execute({'cmd': 'step_back'})
+        elif key == pygame.K_RIGHT:
+            self.rewinding = False
+            self.step_forward()
+        elif key == pygame.K_b:
+            self.rewinding = not self.rewinding and hasattr(self.simulator, 'step_back')
+        elif key == pygame.K_t:
+            # 开关计时统计以及屏幕/LED上的显示，退出时写出统计
+            if TIMINGS.enabled:
+                TIMINGS.disable()
+            else:
+                TIMINGS.enable("frame_timings.json")
+            for visualizer in (self.session.visualizer, led_visualizer):
+                if visualizer is not None:
+                    visualizer.show_timings = TIMINGS.enabled
+        elif key == pygame.K_p:
+            # P 开始/提前结束一次性能采样
+            if self.profiler.active:
+                self.profiler.stop()
+            else:
+                self.profiler.start()
+        elif key == pygame.K_h and led_visualizer is not None:
+            # LED 上的步数/距离/路径长度
+            led_visualizer.show_hud = not led_visualizer.show_hud
+        elif led_visualizer is not None:
+            handle_viewport_key(led_visualizer, key)
+
+    def frame(self):
+        if self.rewinding:
+            self.step_back()
+        started = time.perf_counter()
+        with TIMINGS.stage('frame'):
+            state = self.runtime.poll()
+            if state:
+                self.renderer.render(state)
+            self.renderer.animate()
+        # 没有在采样时只多一次属性检查
+        if self.profiler.active:
+            self.profiler.tick()
+        # 渲染越慢，工作线程每帧的步进预算越少
+        self.runtime.observe_render(time.perf_counter() - started)
+
+    async def run(self):
+        server = watcher = None
+        period = 1.0 / self.fps
+        loop = asyncio.get_running_loop()
+        signals = []
+        # 仿真线程、渲染线程和 LED 驱动进程在 load_graph 时已经启动，
+        # 套接字启动失败也要走下面的清理
+        try:
+            server = await self._serve() if self.socket_path else None
+            watcher = asyncio.create_task(self._watch()) if self.watch else None
+            for signum, memory in ((getattr(signal, 'SIGUSR1', None), False),
+                                   (getattr(signal, 'SIGUSR2', None), True)):
+                try:
+                    loop.add_signal_handler(signum, self._signal_profile, memory)
+                    signals.append(signum)
+                except (TypeError, NotImplementedError, RuntimeError, ValueError):
+                    # Windows 没有 SIGUSR1/2；不在主线程时不能装信号处理器
+                    pass
+            while self.running:
+                started = time.monotonic()
+                if self.window:
+                    self.pump_events()
+                self.frame()
+                # 剩余时间交给事件循环处理控制命令
+                await asyncio.sleep(max(0.0, period - (time.monotonic() - started)))
+        finally:
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+            self.profiler.stop()
+            self.profiler.wait()
+            if watcher is not None:
+                watcher.cancel()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+            self.runtime.stop()
+            self.renderer.close()
+            if self.led_process and self.matrix is not None:
+                self.matrix.close()
+            if self.window:
+                import pygame
+
+                pygame.quit()
+
+
+def handle_viewport_key(led_visualizer, key):
+    """LED 视口：WASD 平移，+/- 缩放，F 跟随搜索前沿，0 复位"""
+    import pygame
+
+    pan = {
+        pygame.K_a: (-8, 0),
+        pygame.K_d: (8, 0),
+        pygame.K_w: (0, -8),
+        pygame.K_s: (0, 8),
+    }
+    viewport = led_visualizer.viewport
+    if key in pan:
+        viewport.pan(*pan[key])
+    elif key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+        viewport.zoom_by(2)
+    elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+        viewport.zoom_by(0.5)
+    elif key == pygame.K_f:
+        led_visualizer.follow = not led_visualizer.follow
+    elif key == pygame.K_0:
+        viewport.reset()
+
+
+def send_command(request, socket_path=DEFAULT_SOCKET, timeout=5.0):
+    """Send one request to a running ``App`` and return its reply."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b'\n')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    return json.loads(reply)
+
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send a command to the running visualizer")
+    parser.add_argument('cmd', help="load_graph, set_endpoints, pause, resume, rate, engine, status, ...")
+    parser.add_argument('args', nargs='*', help="key=value, values are parsed as JSON when possible")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET)
+    args = parser.parse_args(argv)
+
+    request = {'cmd': args.cmd}
+    for arg in args.args:
+        key, _, value = arg.partition('=')
+        request[key] = parse_value(value)
+    reply = send_command(request, args.socket)
+    print(json.dumps(reply))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
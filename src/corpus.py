@@ -0,0 +1,228 @@
+"""Reproducible graph corpora for benchmarks and demo playlists.
+
+``build_corpus`` generates many ``GraphManager`` graphs across a process
+pool.  Every graph is fully determined by its generator parameters and a
+seed derived from them (``derive_seed``), so building the same corpus twice
+gives byte-identical files, whatever the number of processes.  The workers
+also validate each graph: both endpoints must be nodes, and the end must be
+reachable from the start (otherwise the next attempt seed is used).
+
+A corpus directory holds one ``.npz`` file per graph in ``GraphIndex``
+layout, much smaller and faster to load than the adjacency-dict pickles::
+
+    nodes     int32[n, 2]   sorted node coordinates
+    indptr    int64[n + 1]  edges of node i are indptr[i]:indptr[i + 1]
+    edge_dst  int32[m]      target node ids
+    weights   float64[m]
+    meta      int64[4]      start id, end id, width, height
+
+and a ``manifest.json`` listing every file with its parameters, seed, size,
+checksum and validation results.  ``GraphManager.load_from_file`` reads the
+``.npz`` files too, so corpus graphs can be loaded by the control socket.
+
+    python src/corpus.py assets/corpus --sizes 64 128 256 --count 100 --seed 0
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+
+import numpy as np
+
+from GraphIndex import GraphIndex
+from GraphManager import GraphManager
+from tracing import graph_crc
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+MAX_ATTEMPTS = 16
+
+# generate_new_graph 的默认参数
+DEFAULT_PARAMS = {
+    'step': 8,
+    'min_connections': 2,
+    'max_connections': 4,
+    'min_weight': 1,
+    'max_weight': 10,
+    'distance_factor': 2.5,
+}
+
+
+def derive_seed(params, seed, attempt=0):
+    """64-bit generator seed for one graph, from its parameters and the corpus seed."""
+    key = json.dumps([params, seed, attempt], sort_keys=True).encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+
+
+def reachable_count(index, source):
+    """How many nodes can be reached from node id ``source``."""
+    seen = np.zeros(index.n_nodes, dtype=np.bool_)
+    seen[source] = True
+    queue = deque([source])
+    indptr, edge_dst = index.indptr, index.edge_dst
+    while queue:
+        u = queue.popleft()
+        for v in edge_dst[indptr[u]:indptr[u + 1]].tolist():
+            if not seen[v]:
+                seen[v] = True
+                queue.append(v)
+    return int(seen.sum())
+
+
+def _write_npz(path, arrays):
+    """``np.savez_compressed`` with fixed zip timestamps, so the bytes only depend on the arrays."""
+    tmp = path + '.tmp'
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, array in arrays.items():
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.ascontiguousarray(array), allow_pickle=False)
+            info = zipfile.ZipInfo(name + '.npy', date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, buffer.getvalue())
+    os.replace(tmp, path)
+
+
+def save_graph(path, graph_manager):
+    index = GraphIndex(graph_manager.get_graph())
+    start, end = graph_manager.get_endpoints()
+    _write_npz(path, {
+        'nodes': index.coords.astype(np.int32),
+        'indptr': index.indptr,
+        'edge_dst': index.edge_dst,
+        'weights': index.weights,
+        'meta': np.array([index.node_id[start], index.node_id[end],
+                          graph_manager.width, graph_manager.height], dtype=np.int64),
+    })
+    return index
+
+
+def load_graph(path):
+    """``GraphManager`` for a corpus ``.npz`` file."""
+    with np.load(path, allow_pickle=False) as data:
+        nodes = [tuple(node) for node in data['nodes'].tolist()]
+        indptr, edge_dst = data['indptr'].tolist(), data['edge_dst'].tolist()
+        weights = data['weights'].tolist()
+        start, end, width, height = data['meta'].tolist()
+
+    graph = {}
+    for i, node in enumerate(nodes):
+        # 生成器的权重都是整数，还原成 int 与 pickle 图保持一致
+        graph[node] = [(nodes[edge_dst[e]], int(weights[e]) if weights[e].is_integer() else weights[e])
+                       for e in range(indptr[i], indptr[i + 1])]
+    instance = GraphManager(width=width, height=height)
+    instance.graph = graph
+    instance.nodes = set(graph)
+    instance.start_node, instance.end_node = nodes[start], nodes[end]
+    instance._calculate_stats()
+    return instance
+
+
+def corpus_jobs(sizes, count, seed, params=None):
+    """``(file name, generator parameters, corpus seed)`` of every graph, in manifest order."""
+    jobs = []
+    for size in sizes:
+        job_params = dict(DEFAULT_PARAMS, **(params or {}), width=size, height=size)
+        for i in range(count):
+            jobs.append((f"g{size}_{i:04d}.npz", job_params, [seed, i]))
+    return jobs
+
+
+def _build_one(job):
+    """Generate, validate and write one graph (runs in a worker process)."""
+    name, params, seed, out_dir = job
+    width, height, step = params['width'], params['height'], params['step']
+    # 终点取网格上最远的一角
+    start = (0, 0)
+    end = (width // step * step, height // step * step)
+    for attempt in range(MAX_ATTEMPTS):
+        graph_seed = derive_seed(params, seed, attempt)
+        graph_manager = GraphManager(width, height, step, start, end, seed=graph_seed)
+        graph_manager.generate_new_graph(params['min_connections'], params['max_connections'],
+                                         params['min_weight'], params['max_weight'],
+                                         params['distance_factor'])
+        if start in graph_manager.nodes and end in graph_manager.nodes \
+                and graph_manager.validate_path_exists():
+            break
+    else:
+        raise ValueError(f"{name}: no graph with a path from {start} to {end} "
+                         f"after {MAX_ATTEMPTS} attempts")
+
+    index = save_graph(os.path.join(out_dir, name), graph_manager)
+    return {
+        'file': name,
+        'params': params,
+        'seed': seed,
+        'graph_seed': graph_seed,
+        'attempts': attempt + 1,
+        'nodes': index.n_nodes,
+        'edges': index.n_edges,
+        'start': start,
+        'end': end,
+        'reachable': reachable_count(index, index.node_id[start]),
+        'crc': graph_crc(index),
+    }
+
+
+def build_corpus(out_dir, sizes, count, seed=0, params=None, processes=None, chunksize=1):
+    """Write ``count`` graphs per size to ``out_dir``, return the manifest."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    jobs = [job + (out_dir,) for job in corpus_jobs(sizes, count, seed, params)]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        entries = [_build_one(job) for job in jobs]
+    else:
+        # 图的大小差别很大，逐个分发；imap 保持任务顺序，清单与进程数无关
+        with multiprocessing.Pool(processes) as pool:
+            entries = list(pool.imap(_build_one, jobs, chunksize=chunksize))
+
+    manifest = {'version': FORMAT_VERSION, 'seed': seed, 'graphs': entries}
+    # 清单最后写，存在即表示语料库完整
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def load_manifest(corpus_dir):
+    with open(os.path.join(corpus_dir, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported corpus version in {corpus_dir}: {manifest.get('version')}")
+    return manifest
+
+
+def iter_corpus(corpus_dir):
+    """``(manifest entry, GraphManager)`` for every graph of a corpus."""
+    for entry in load_manifest(corpus_dir)['graphs']:
+        yield entry, load_graph(os.path.join(corpus_dir, entry['file']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a reproducible graph corpus")
+    parser.add_argument('out_dir')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64], help="grid width/height")
+    parser.add_argument('--count', type=int, default=10, help="graphs per size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--step', type=int, default=DEFAULT_PARAMS['step'])
+    parser.add_argument('--processes', type=int, default=None, help="default: one per CPU")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    manifest = build_corpus(args.out_dir, args.sizes, args.count, args.seed,
+                            {'step': args.step}, args.processes)
+    graphs = manifest['graphs']
+    size = sum(os.path.getsize(os.path.join(args.out_dir, entry['file'])) for entry in graphs)
+    print(f"{len(graphs)} graphs in {time.perf_counter() - started:.2f}s, "
+          f"{size / 2 ** 20:.1f} MiB in {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
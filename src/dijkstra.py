@@ -1,40 +1,416 @@
 import csv
 import heapq
 import pickle
+import time
 import numpy as np
-from collections import namedtuple
+from collections import Counter, deque, namedtuple
+from collections.abc import Mapping
 from pathlib import Path
 import sys
 
+from GraphIndex import GraphIndex
+from timing import timed
+
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.append(str(ROOT_DIR))
 
 
-DijkState = namedtuple('AlgorithmState', ['current_node', 'visited', 'current_path', 'processing_edge', 'distances', 'previous'])
+DijkState = namedtuple('AlgorithmState', ['current_node', 'visited', 'current_path', 'processing_edge', 'distances', 'previous', 'tree', 'node_state', 'step'],
+                       defaults=(None, None, None))
+
+# 每个节点一个字节的状态（按 GraphIndex 的节点编号），>= VISITED 的节点已确定
+UNVISITED, FRONTIER, VISITED, CURRENT, PATH = 0, 1, 2, 3, 4
+N_STATES = 5
+
+
+class VisitedSet:
+    """Set-like view of the settled nodes, backed by a ``uint8`` state plane."""
+
+    __slots__ = ('index', 'plane')
+
+    def __init__(self, index, plane):
+        self.index = index
+        self.plane = plane
+
+    def __contains__(self, node):
+        i = self.index.node_id.get(node)
+        return i is not None and self.plane[i] >= VISITED
+
+    def __len__(self):
+        return int(np.count_nonzero(self.plane >= VISITED))
+
+    def __iter__(self):
+        nodes = self.index.nodes
+        return (nodes[i] for i in np.flatnonzero(self.plane >= VISITED).tolist())
+
+
+class NodeMapping(Mapping):
+    """Read-only ``{node: value}`` view over a per-node array."""
+
+    def __init__(self, index, values, convert):
+        self.index = index
+        self.values = values
+        self.convert = convert
+
+    def __getitem__(self, node):
+        return self.convert(self.values[self.index.node_id[node]])
+
+    def __iter__(self):
+        return iter(self.index.nodes)
+
+    def __len__(self):
+        return self.index.n_nodes
+
+    def snapshot(self):
+        """Copy whose values no longer follow the underlying array."""
+        return NodeMapping(self.index, _frozen(self.values), self.convert)
+
+
+class NodeStates:
+    """The state plane of one search and the transitions applied to it."""
+
+    def __init__(self, index, start_node):
+        self.index = index
+        self.plane = np.zeros(index.n_nodes, dtype=np.uint8)
+        self.plane[index.node_id[start_node]] = FRONTIER
+        self.current = -1
+        self.visited = VisitedSet(index, self.plane)
+
+    def relax(self, node):
+        self.plane[self.index.node_id[node]] = FRONTIER
+
+    def settle(self, node):
+        i = self.index.node_id[node]
+        if i == self.current:
+            return
+        # 上一个当前节点变回已访问（路径上的保持 PATH）
+        if self.current >= 0 and self.plane[self.current] == CURRENT:
+            self.plane[self.current] = VISITED
+        self.current = i
+        self.plane[i] = CURRENT
+
+    def mark_path(self, path):
+        self.plane[[self.index.node_id[node] for node in path]] = PATH
+
+
+def state_plane(state, index):
+    """Per-node state plane of ``state``, rebuilt from the sets when it has none."""
+    if getattr(state, 'node_state', None) is not None:
+        return state.node_state
+    plane = np.zeros(index.n_nodes, dtype=np.uint8)
+    plane[[index.node_id[node] for node in state.visited]] = VISITED
+    if state.current_node in state.visited:
+        plane[index.node_id[state.current_node]] = CURRENT
+    plane[[index.node_id[node] for node in state.current_path]] = PATH
+    return plane
+
+
+class ShortestPathTree:
+    """Predecessor tree maintained by the simulator on every relaxation.
+
+    Keeps parent/depth/children per node id and an ``in_tree`` bitmap over
+    edge ids.  ``path_to`` reuses the root path computed for the previous
+    query, so following the search costs only the part of the path that
+    changed; ``changed_edges`` reports tree edges toggled since the last call.
+    Depth is updated in O(1) because Dijkstra only re-parents nodes that are
+    not settled yet, and those have no children.
+    """
+
+    def __init__(self, index, root):
+        self.index = index
+        n = index.n_nodes
+        self.parent = np.full(n, -1, dtype=np.int32)
+        self.parent_edge = np.full(n, -1, dtype=np.int32)
+        self.depth = np.zeros(n, dtype=np.int32)
+        self.children = [[] for _ in range(n)]
+        self.in_tree = np.zeros(index.n_edges, dtype=np.bool_)
+        self.root = index.node_id[root]
+
+        self._changed = {}
+        self._path = [self.root]
+        self._path_nodes = [root]
+        self._path_pos = {self.root: 0}
+        self._path_changed_from = 0
+
+    def load(self, parent_edge):
+        """Replace the whole tree by the one given as a parent edge id per node.
+
+        Used when jumping to a keyframe; edges that differ from the current
+        tree are reported by ``changed_edges`` like ordinary relaxations.
+        """
+        index = self.index
+        parent_edge = np.asarray(parent_edge, dtype=np.int32)
+        attached = parent_edge >= 0
+        parent = np.where(attached, index.edge_src[np.maximum(parent_edge, 0)], -1).astype(np.int32)
+
+        in_tree = np.zeros(index.n_edges, dtype=np.bool_)
+        in_tree[parent_edge[attached]] = True
+        for eid in np.flatnonzero(in_tree != self.in_tree).tolist():
+            self._mark(eid, bool(in_tree[eid]))
+
+        # 指针跳跃求深度：每轮跳跃距离翻倍，O(log n) 次向量运算
+        depth = attached.astype(np.int32)
+        jump = parent.copy()
+        while (jump >= 0).any():
+            active = jump >= 0
+            target = np.where(active, jump, 0)
+            depth = depth + np.where(active, depth[target], 0)
+            jump = np.where(active, jump[target], -1)
+        self.parent = parent
+        self.parent_edge = parent_edge.copy()
+        self.in_tree = in_tree
+        self.depth = depth
+        self.children = [[] for _ in range(index.n_nodes)]
+        for v in np.flatnonzero(attached).tolist():
+            self.children[parent[v]].append(v)
+
+        self._path = [self.root]
+        self._path_nodes = [index.nodes[self.root]]
+        self._path_pos = {self.root: 0}
+        self._path_changed_from = 0
+
+    def relax(self, node, neighbor):
+        index = self.index
+        self.set_parent(index.node_id[neighbor], index.node_id[node], index.edge_id[(node, neighbor)])
+
+    def set_parent(self, v, u, eid):
+        """Attach node id ``v`` below ``u`` through edge ``eid`` (``u = -1`` detaches)."""
+        old_edge = self.parent_edge[v]
+        if old_edge >= 0:
+            self.in_tree[old_edge] = False
+            self.children[self.parent[v]].remove(v)
+            self._mark(old_edge, False)
+        if v in self._path_pos:
+            self._truncate_path(self._path_pos[v])
+
+        self.parent[v] = u
+        self.parent_edge[v] = eid
+        if u >= 0:
+            self.in_tree[eid] = True
+            self.children[u].append(v)
+            self.depth[v] = self.depth[u] + 1
+            self._mark(eid, True)
+        else:
+            self.depth[v] = 0
+
+    def _mark(self, eid, in_tree):
+        # 在两次查询之间来回切换的边等于没变
+        if self._changed.get(eid, in_tree) != in_tree:
+            del self._changed[eid]
+        else:
+            self._changed[eid] = in_tree
+
+    def _truncate_path(self, keep):
+        for dropped in self._path[keep:]:
+            del self._path_pos[dropped]
+        del self._path[keep:]
+        del self._path_nodes[keep:]
+        self._path_changed_from = min(self._path_changed_from, keep)
 
+    def path_to(self, node):
+        """Root-to-node path as a list of node tuples (do not modify it)."""
+        walk = []
+        v = self.index.node_id[node]
+        while v not in self._path_pos:
+            if v < 0:
+                return []
+            walk.append(v)
+            v = self.parent[v]
+        self._truncate_path(self._path_pos[v] + 1)
+        for v in reversed(walk):
+            self._path_pos[v] = len(self._path)
+            self._path.append(v)
+            self._path_nodes.append(self.index.nodes[v])
+        return self._path_nodes
 
-class DijkstraSimulator:
-    def __init__(self, graph, start_node=(24,8), end_node=(24,56)):
+    def path_changed_from(self):
+        """Position from which the last ``path_to`` result differs from the one before."""
+        changed_from = self._path_changed_from
+        self._path_changed_from = len(self._path)
+        return changed_from
+
+    def changed_edges(self):
+        """``{edge_id: in_tree}`` for tree edges that changed since the last call."""
+        changed, self._changed = self._changed, {}
+        return changed
+
+    def snapshot(self):
+        """Read-only copy of the tree for a frame that other threads may draw."""
+        return TreeSnapshot(self)
+
+
+class TreeSnapshot:
+    """Frozen copy of a ``ShortestPathTree``: parent arrays and the ``in_tree`` bitmap.
+
+    ``path_changed_from`` is the value the live tree reported when the
+    snapshot was taken, i.e. relative to the previous snapshot.
+    """
+
+    def __init__(self, tree):
+        self.index = tree.index
+        self.root = tree.root
+        self.parent = _frozen(tree.parent)
+        self.parent_edge = _frozen(tree.parent_edge)
+        self.in_tree = _frozen(tree.in_tree)
+        self._path_changed_from = tree.path_changed_from()
+
+    def path_to(self, node):
+        path = []
+        v = self.index.node_id[node]
+        while v >= 0:
+            path.append(self.index.nodes[v])
+            if v == self.root:
+                return path[::-1]
+            v = self.parent[v]
+        return []
+
+    def path_changed_from(self):
+        return self._path_changed_from
+
+
+def _frozen(array):
+    array = array.copy()
+    array.flags.writeable = False
+    return array
+
+
+def exploring_path(state):
+    """Path from the start node to ``state.current_node``."""
+    precomputed = getattr(state, 'exploring_path', None)
+    if precomputed is not None:
+        return precomputed
+    if state.tree is not None:
+        return state.tree.path_to(state.current_node)
+    path = []
+    current = state.current_node
+    while current is not None:
+        path.append(current)
+        current = state.previous.get(current)
+    path.reverse()
+    return path
+
+
+# 一步的撤销记录：恢复这些旧值即可回到这一步之前
+StepDelta = namedtuple('StepDelta', [
+    'popped',           # 从堆中弹出的 (distance, node)
+    'current_node',     # 这一步之前的 current_node / processing_edge / NodeStates.current
+    'processing_edge',
+    'states_current',
+    'current_path',     # 找到路径时之前的路径，否则 None
+    'plane',            # [(node_id, old_state)]，按修改顺序
+    'relaxed',          # [(neighbor, old_distance, old_previous, old_parent_edge, pushed_entry)]
+])
+
+
+def undo_delta(target, delta):
+    """Revert one step on anything holding the search state (simulator or mirror)."""
+    tree = target.tree
+    node_id = tree.index.node_id
+    for neighbor, distance, previous, parent_edge, _ in reversed(delta.relaxed):
+        target.distances[neighbor] = distance
+        target.previous[neighbor] = previous
+        parent = int(tree.index.edge_src[parent_edge]) if parent_edge >= 0 else -1
+        tree.set_parent(node_id[neighbor], parent, parent_edge)
+    plane = target.states.plane
+    for i, old in reversed(delta.plane):
+        plane[i] = old
+    target.states.current = delta.states_current
+    target.current_node = delta.current_node
+    target.processing_edge = delta.processing_edge
+    if delta.current_path is not None:
+        target.current_path = delta.current_path
+
+
+def restore_snapshot(target, snapshot):
+    """Load a full ``DijkstraSimulator.snapshot()`` into ``target``."""
+    target.distances = dict(snapshot['distances'])
+    target.previous = dict(snapshot['previous'])
+    target.tree.load(snapshot['parent_edge'])
+    target.states.plane[:] = snapshot['plane']
+    target.states.current = snapshot['states_current']
+    target.current_node = snapshot['current_node']
+    target.processing_edge = snapshot['processing_edge']
+    target.current_path = list(snapshot['current_path'])
+
+
+class Stepper:
+    """Multi-step driving for anything with a ``step()`` that returns None when done."""
+
+    def advance(self, budget_ms=None, max_steps=None, on_step=None):
+        """Run steps until ``budget_ms`` is spent or ``max_steps`` are done.
+
+        At least one step is attempted; ``on_step()`` is called after every
+        step (the runtime collects its events there).  Returns the number of
+        steps taken, 0 once the search is finished.
+        """
+        deadline = None if budget_ms is None else time.perf_counter() + budget_ms / 1000
+        count = 0
+        while max_steps is None or count < max_steps:
+            if self.step() is None:
+                break
+            count += 1
+            if on_step is not None:
+                on_step()
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        return count
+
+    def step_many(self, n, on_step=None):
+        """Run up to ``n`` steps, return how many were taken."""
+        return self.advance(max_steps=n, on_step=on_step)
+
+
+class DijkstraSimulator(Stepper):
+    """Step-by-step Dijkstra that can also step backwards.
+
+    Every step appends a ``StepDelta`` to an undo log (the last
+    ``undo_limit`` steps), so ``step_back()`` costs as much as the step it
+    reverts.  Heap pushes cannot be removed from ``heapq`` cheaply, so undone
+    pushes are counted in ``cancelled`` and skipped when they are popped.
+    Every ``checkpoint_interval`` steps a full snapshot is kept (at most
+    ``max_checkpoints``); stepping back past the log restores the nearest
+    snapshot and steps forward again.  By default the interval grows with the
+    graph so snapshots cost O(1) per step, and the log covers one interval.
+    """
+
+    def __init__(self, graph, start_node=(24,8), end_node=(24,56),
+                 undo_limit=None, checkpoint_interval=None, max_checkpoints=16, index=None):
         self.graph = graph
-        self.visited = set()
         self.current_path = []
         self.processing_edge = None
+        self.start_node = start_node
         self.current_node = start_node
         self.end_node = end_node
+        # 同一张图上换端点时可以复用已经建好的 GraphIndex
+        self.index = index if index is not None else GraphIndex(graph)
+        self.checkpoint_interval = checkpoint_interval or max(4096, self.index.n_nodes // 4)
+        self.undo_limit = undo_limit or self.checkpoint_interval
+        self.max_checkpoints = max_checkpoints
         self.reset()
 
 
     def reset(self):
+        self.current_node = self.start_node
         self.distances = {node: np.inf for node in self.graph}
         self.distances[self.current_node] = 0
         self.previous = {node: None for node in self.graph}
 
         # The same as __init__
-        self.visited = set()
+        # 已访问集合由状态平面承担，每个节点一个字节
+        self.states = NodeStates(self.index, self.start_node)
+        self.node_state = self.states.plane
+        self.visited = self.states.visited
         self.current_path = []
         self.processing_edge = None
+        self.relaxed = []  # (neighbor, distance) pairs updated by the last step
+        self.tree = ShortestPathTree(self.index, self.start_node)
+        self.steps = 0
 
         self.pq = [(0, self.current_node)]
+        self.cancelled = Counter()
+        self.undo_log = deque(maxlen=self.undo_limit)
+        self.checkpoints = {}
+        self.last_undo = None
 
     def get_state(self):
         return DijkState(
@@ -43,20 +419,48 @@ class DijkstraSimulator:
             current_path=self.current_path,
             processing_edge=self.processing_edge,
             distances=self.distances,
-            previous=self.previous
+            previous=self.previous,
+            tree=self.tree,
+            node_state=self.node_state,
+            step=self.steps
         )
             
 
+    def _pop(self):
+        """Next live heap entry, skipping pushes that were undone."""
+        while self.pq:
+            entry = heapq.heappop(self.pq)
+            if self.cancelled[entry]:
+                self.cancelled[entry] -= 1
+                if not self.cancelled[entry]:
+                    del self.cancelled[entry]
+                continue
+            return entry
+        return None
+
+    @timed('step')
     def step(self):
         # print("stepping")
-        if not self.pq:
+        entry = self._pop()
+        if entry is None:
             return None # if there is no more nodes to visit, return None
-        current_distance, current_node = heapq.heappop(self.pq)
-        if current_node in self.visited:
+        current_distance, current_node = entry
+        self.steps += 1
+        self.relaxed = []
+        node_id = self.index.node_id
+        plane = self.node_state
+        changed = []
+        delta = StepDelta(entry, self.current_node, self.processing_edge, self.states.current,
+                          None, changed, [])
+        if plane[node_id[current_node]] >= VISITED:
+            self._log(delta)
             return self.get_state()
 
         self.current_node = current_node
-        self.visited.add(current_node)
+        if self.states.current >= 0:
+            changed.append((self.states.current, plane[self.states.current]))
+        changed.append((node_id[current_node], plane[node_id[current_node]]))
+        self.states.settle(current_node)
 
         if current_node == self.end_node:
             # Reconstruct path
@@ -65,35 +469,109 @@ class DijkstraSimulator:
             while current is not None:
                 path.append(current)
                 current = self.previous[current]
+            delta = delta._replace(current_path=self.current_path)
             self.current_path = path[::-1]
+            changed.extend((node_id[node], plane[node_id[node]]) for node in self.current_path)
+            self.states.mark_path(self.current_path)
+            self._log(delta)
             print(self.current_path)
             print("Path found")
             return self.get_state()
 
         # Process neighbors
         for neighbor, weight in self.graph[current_node]:
-            if neighbor not in self.visited:
+            if plane[node_id[neighbor]] < VISITED:
                 self.processing_edge = (current_node, neighbor)
                 distance = current_distance + weight
                 if distance < self.distances[neighbor]:
+                    v = node_id[neighbor]
+                    delta.relaxed.append((neighbor, self.distances[neighbor], self.previous[neighbor],
+                                          int(self.tree.parent_edge[v]), (distance, neighbor)))
+                    changed.append((v, plane[v]))
                     self.distances[neighbor] = distance
                     self.previous[neighbor] = current_node
+                    self.tree.relax(current_node, neighbor)
+                    plane[v] = FRONTIER
                     heapq.heappush(self.pq, (distance, neighbor))
+                    self.relaxed.append((neighbor, distance))
 
+        self._log(delta)
         return self.get_state()
 
+    def _log(self, delta):
+        self.undo_log.append(delta)
+        if self.steps % self.checkpoint_interval == 0:
+            self.checkpoints[self.steps] = self.snapshot()
+            if len(self.checkpoints) > self.max_checkpoints:
+                del self.checkpoints[min(self.checkpoints)]
+
+    def snapshot(self):
+        """Full copy of the search state (O(n)), used for checkpoints."""
+        return {
+            'steps': self.steps,
+            'distances': dict(self.distances),
+            'previous': dict(self.previous),
+            'parent_edge': self.tree.parent_edge.copy(),
+            'plane': self.node_state.copy(),
+            'states_current': self.states.current,
+            'current_node': self.current_node,
+            'processing_edge': self.processing_edge,
+            'current_path': list(self.current_path),
+            'pq': list(self.pq),
+            'cancelled': Counter(self.cancelled),
+        }
+
+    def restore(self, snapshot):
+        restore_snapshot(self, snapshot)
+        self.steps = snapshot['steps']
+        self.pq = list(snapshot['pq'])
+        self.cancelled = Counter(snapshot['cancelled'])
+        self.relaxed = []
+        self.undo_log.clear()
+
+    def step_back(self):
+        """Undo the last step; returns the new state, or None at step 0.
+
+        ``last_undo`` tells what happened: ``('delta', StepDelta)`` for an
+        O(step) undo, ``('snapshot', snapshot)`` when the log had run out and
+        the state was rebuilt from a checkpoint.
+        """
+        if self.steps == 0:
+            return None
+        if self.undo_log:
+            delta = self.undo_log.pop()
+            undo_delta(self, delta)
+            for *_, pushed in delta.relaxed:
+                self.cancelled[pushed] += 1
+            heapq.heappush(self.pq, delta.popped)
+            self.steps -= 1
+            self.relaxed = []
+            self.last_undo = ('delta', delta)
+            return self.get_state()
+
+        # 撤销记录不够了：回到最近的检查点（或起点）再向前走
+        target = self.steps - 1
+        base = max((step for step in self.checkpoints if step <= target), default=None)
+        if base is None:
+            self.reset_search()
+        else:
+            self.restore(self.checkpoints[base])
+        while self.steps < target:
+            self.step()
+        self.last_undo = ('snapshot', self.snapshot())
+        return self.get_state()
+
+    def reset_search(self):
+        """Back to step 0 while keeping the checkpoints."""
+        checkpoints = self.checkpoints
+        self.reset()
+        self.checkpoints = checkpoints
+
 def get_stat_weight(graph):
-    weight_list = []
-    for start, edges in graph.items():
-        for end, weight in edges:
-            weight_list.append(weight)
-
-    deviation = np.std(weight_list)
-    mean = np.mean(weight_list)
-
-    # print(f"Max weight: {max_weight}")
-    # print(f"Min weight: {min_weight}")
-    # print(f"Mean weight: {mean}")
-    # print(f"Standard deviation: {deviation}")
-    # print()
-    return (mean, deviation)
+    """(mean, standard deviation) of all edge weights.
+
+    Prefer ``GraphManager.get_stats()``, which stores these with the graph.
+    """
+    weights = np.fromiter((weight for edges in graph.values() for _, weight in edges),
+                          dtype=np.float64)
+    return (float(weights.mean()), float(weights.std()))
@@ -0,0 +1,191 @@
+"""Whole-frame helpers shared by the LED renderers.
+
+A frame is a ``(height, width, 3)`` ``uint8`` array, i.e. the same layout PIL
+uses, so it can be handed to ``Canvas.SetImage`` in one call instead of going
+through ``SetPixel`` once per LED.  Renderers rasterize lines and points into
+such frames with NumPy and apply the gamma/brightness table once, right
+before the upload.
+
+Code that draws on a matrix canvas directly uses ``canvas_draw_lines`` /
+``canvas_set_pixels``: one call for a whole batch of segments or pixels,
+through ``DrawLines`` / ``SetPixels`` of the ``led_lib`` graphics bindings
+(native loop without the GIL, hardware canvases only) or the same methods
+of ``VirtualCanvas``/``SharedCanvas``, and a per-pixel ``SetPixel`` loop
+only when neither is available.  A ``graphics`` module built before the
+batch functions existed is reported with a warning at import.
+"""
+import sys
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR))
+
+try:
+    from PIL import Image
+except ImportError:  # PIL 只用于批量上传，没有时退回逐像素
+    Image = None
+
+try:
+    from led_lib.rgbmatrix import core, graphics
+except ImportError:  # 只有 aarch64 的 .so
+    core = graphics = None
+# 旧版本编译的 graphics 模块没有批量接口
+BATCH_GRAPHICS = graphics is not None and all(hasattr(graphics, name) for name in ('DrawLines', 'SetPixels'))
+if graphics is not None and not BATCH_GRAPHICS:
+    warnings.warn("led_lib.rgbmatrix.graphics was built without DrawLines/SetPixels; LED drawing falls "
+                  "back to one SetPixel call per pixel. Rebuild the bindings with `make -C led_lib`.",
+                  RuntimeWarning)
+
+
+def brightness_lut(brightness=1.0, gamma=1.0):
+    """256-entry table mapping a channel value to its gamma-corrected, dimmed value."""
+    levels = np.arange(256, dtype=np.float32)
+    if gamma != 1.0:
+        levels = 255.0 * (levels / 255.0) ** gamma
+    return np.clip(np.floor(levels * brightness), 0, 255).astype(np.uint8)
+
+
+def line_pixels(x1, y1, x2, y2):
+    """Pixel coordinates of many line segments at once.
+
+    Produces exactly the pixels of the integer Bresenham loop the renderers
+    used to run per segment (walk the major axis from the lower end, error
+    starting at ``dx // 2``).  Returns ``(xs, ys, segment)`` where
+    ``segment`` is the index of the segment each pixel belongs to.
+    """
+    x1, y1, x2, y2 = (np.asarray(a, dtype=np.int64).ravel() for a in (x1, y1, x2, y2))
+    steep = np.abs(y2 - y1) > np.abs(x2 - x1)
+    # 主轴坐标 a，副轴坐标 b，并让 a 递增
+    a1, b1 = np.where(steep, y1, x1), np.where(steep, x1, y1)
+    a2, b2 = np.where(steep, y2, x2), np.where(steep, x2, y2)
+    flip = a1 > a2
+    a1, a2 = np.where(flip, a2, a1), np.where(flip, a1, a2)
+    b1, b2 = np.where(flip, b2, b1), np.where(flip, b1, b2)
+
+    da, db = a2 - a1, np.abs(b2 - b1)
+    segment = np.repeat(np.arange(len(da)), da + 1)
+    starts = np.cumsum(da + 1) - (da + 1)
+    k = np.arange(len(segment)) - starts[segment]
+    # 第 k 步时误差项一共回绕了 ceil((k*dy - dx//2) / dx) 次
+    d = np.maximum(da, 1)[segment]
+    wraps = -np.floor_divide(-(k * db[segment] - da[segment] // 2), d)
+    a = a1[segment] + k
+    b = b1[segment] + np.where(b1 < b2, 1, -1)[segment] * wraps
+    s = steep[segment]
+    return np.where(s, b, a), np.where(s, a, b), segment
+
+
+def draw_lines(frame, x1, y1, x2, y2, color):
+    """Rasterize segments into ``frame``; ``color`` is one RGB or one per segment.
+
+    Returns the number of pixels rasterized (including off-frame ones).
+    """
+    xs, ys, segment = line_pixels(x1, y1, x2, y2)
+    height, width = frame.shape[:2]
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    color = np.asarray(color, dtype=np.uint8)
+    if color.ndim == 2:
+        color = color[segment[inside]]
+    frame[ys[inside], xs[inside]] = color
+    return len(xs)
+
+
+def draw_points(frame, xs, ys, color, size=2):
+    """Draw ``size`` x ``size`` squares with their top-left corner at ``(xs, ys)``."""
+    xs = np.asarray(xs, dtype=np.int64)
+    ys = np.asarray(ys, dtype=np.int64)
+    color = np.asarray(color, dtype=np.uint8)
+    height, width = frame.shape[:2]
+    for ox in range(size):
+        for oy in range(size):
+            px, py = xs + ox, ys + oy
+            inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+            frame[py[inside], px[inside]] = color[inside] if color.ndim == 2 else color
+
+
+def sample_indices(extent, count):
+    """Source index of every destination pixel for nearest-neighbour sampling."""
+    return np.arange(count) * extent // count
+
+
+def downsample(pixels, width, height, mode='stride', extent=None):
+    """Shrink a pygame ``(x, y, 3)`` surfarray into a ``(height, width, 3)`` frame.
+
+    ``extent`` limits sampling to the top-left ``(w, h)`` part of the surface.
+    ``mode='stride'`` picks one source pixel per LED, ``mode='box'`` averages
+    the whole block of source pixels that maps onto each LED.
+    """
+    src_w, src_h = pixels.shape[:2]
+    ext_w, ext_h = extent if extent is not None else (src_w, src_h)
+    ext_w, ext_h = min(ext_w, src_w), min(ext_h, src_h)
+
+    if mode == 'box' and ext_w >= width and ext_h >= height:
+        fx, fy = ext_w // width, ext_h // height
+        block = pixels[:width * fx, :height * fy]
+        block = block.reshape(width, fx, height, fy, 3).mean(axis=(1, 3))
+        return block.astype(np.uint8).transpose(1, 0, 2)
+    if mode not in ('stride', 'box'):
+        raise ValueError(f"Unknown downsample mode: {mode}")
+
+    xs = sample_indices(ext_w, width)
+    ys = sample_indices(ext_h, height)
+    return pixels[xs[np.newaxis, :], ys[:, np.newaxis]]
+
+
+def color_rows(color, count):
+    """``color`` (one RGB or one per item) as a contiguous ``(1 or count, 3)`` uint8 array."""
+    colors = np.ascontiguousarray(color, dtype=np.uint8).reshape(-1, 3)
+    if len(colors) not in (1, count):
+        raise ValueError(f"Expected 1 or {count} colors, got {len(colors)}")
+    return colors
+
+
+def _coords(*arrays):
+    return [np.ascontiguousarray(a, dtype=np.intc).ravel() for a in arrays]
+
+
+def canvas_draw_lines(canvas, x1, y1, x2, y2, color):
+    """Draw many segments on a matrix canvas in one call (same pixels as ``draw_lines``)."""
+    x1, y1, x2, y2 = _coords(x1, y1, x2, y2)
+    colors = color_rows(color, len(x1))
+    if hasattr(canvas, 'DrawLines'):
+        canvas.DrawLines(x1, y1, x2, y2, colors)
+    elif BATCH_GRAPHICS and isinstance(canvas, core.Canvas):
+        # graphics 只接受原生画布，其他对象传进去会抛 TypeError
+        graphics.DrawLines(canvas, x1, y1, x2, y2, colors)
+    else:
+        xs, ys, segment = line_pixels(x1, y1, x2, y2)
+        _set_pixels_slow(canvas, xs, ys, colors[segment] if len(colors) > 1 else colors)
+
+
+def canvas_set_pixels(canvas, xs, ys, color):
+    """Set many pixels on a matrix canvas in one call, later pixels win."""
+    xs, ys = _coords(xs, ys)
+    colors = color_rows(color, len(xs))
+    if hasattr(canvas, 'SetPixels'):
+        canvas.SetPixels(xs, ys, colors)
+    elif BATCH_GRAPHICS and isinstance(canvas, core.Canvas):
+        graphics.SetPixels(canvas, xs, ys, colors)
+    else:
+        _set_pixels_slow(canvas, xs, ys, colors)
+
+
+def _set_pixels_slow(canvas, xs, ys, colors):
+    colors = np.broadcast_to(colors, (len(xs), 3))
+    for x, y, (r, g, b) in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist(), colors.tolist()):
+        canvas.SetPixel(x, y, r, g, b)
+
+
+def upload_frame(canvas, frame):
+    """Copy a full frame onto a canvas with as few calls as possible."""
+    frame = np.ascontiguousarray(frame, dtype=np.uint8)
+    if Image is not None:
+        canvas.SetImage(Image.fromarray(frame, 'RGB'))
+        return
+
+    canvas.Clear()
+    ys, xs = np.nonzero(frame.any(axis=2))
+    canvas_set_pixels(canvas, xs, ys, frame[ys, xs])
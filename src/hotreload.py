@@ -0,0 +1,118 @@
+"""Reload graph files while the visualizer runs.
+
+``GraphWatcher`` polls the modification time and size of a graph file (no
+inotify dependency; the demo graphs are tiny and a poll is one ``stat``).
+``diff_graphs`` compares the reloaded adjacency dict with the running one,
+and ``apply_diff`` brings a ``control.GraphSession`` up to date:
+
+* reweighted edges only patch ``GraphIndex.weights`` in place and redraw the
+  pygame background around those edges;
+* added/removed edges rebuild the ``GraphIndex`` (edge ids shift) and
+  re-rasterize only the screen regions the changed edges cover, on pygame
+  and in the LED edge-layer cache;
+* a different node set (geometry) is not handled here: the caller builds
+  the session from scratch.
+
+The adjacency dict is updated in place, so every object holding it (graph
+manager, visualizers) sees the new edges without being rebuilt.
+"""
+import os
+from collections import Counter, namedtuple
+
+from GraphIndex import GraphIndex
+
+# added/removed: [(u, v, weight)]
+# reweighted: [(u, position, v, old_weight, new_weight)]，position 是 v 在 u 邻接表中的下标
+# reordered: 邻接表内容没变只是顺序变了的节点（边号和绘制顺序会变）
+GraphDiff = namedtuple('GraphDiff', ['added', 'removed', 'reweighted', 'reordered',
+                                     'geometry_changed'])
+
+
+def graph_nodes(graph):
+    nodes = set(graph)
+    for edges in graph.values():
+        nodes.update(neighbor for neighbor, _ in edges)
+    return nodes
+
+
+def diff_graphs(old, new):
+    """What changed between two adjacency dicts."""
+    if graph_nodes(old) != graph_nodes(new):
+        return GraphDiff([], [], [], [], True)
+    added, removed, reweighted, reordered = [], [], [], []
+    for u in set(old) | set(new):
+        before, after = old.get(u, []), new.get(u, [])
+        if before == after:
+            continue
+        if [v for v, _ in before] == [v for v, _ in after]:
+            reweighted.extend((u, j, v, w0, w1)
+                              for j, ((v, w0), (_, w1)) in enumerate(zip(before, after)) if w0 != w1)
+            continue
+        gone = Counter(before) - Counter(after)
+        new_edges = Counter(after) - Counter(before)
+        removed.extend((u, v, w) for v, w in gone.elements())
+        added.extend((u, v, w) for v, w in new_edges.elements())
+        if not gone and not new_edges:
+            reordered.append(u)
+    return GraphDiff(added, removed, reweighted, reordered, False)
+
+
+def is_structural(diff):
+    """Whether edge ids change (anything but pure reweighting)."""
+    return bool(diff.added or diff.removed or diff.reordered)
+
+
+def dirty_segments(diff, graph):
+    """``(u, v)`` segments whose pixels have to be redrawn."""
+    segments = [(u, v) for u, v, _ in diff.added + diff.removed]
+    segments += [(u, v) for u, _, v, _, _ in diff.reweighted]
+    for u in diff.reordered:
+        segments += [(u, v) for v, _ in graph.get(u, [])]
+    return segments
+
+
+def apply_diff(session, graph_manager, diff):
+    """Move ``session`` (a ``control.GraphSession``) onto ``graph_manager``'s graph."""
+    graph = session.graph_manager.get_graph()
+    graph.clear()
+    graph.update(graph_manager.get_graph())
+    # 新的 GraphManager 接管原来的字典，其余属性（端点、统计量、全源表）用新加载的
+    graph_manager.graph = graph
+    session.graph_manager = graph_manager
+
+    if is_structural(diff):
+        session.index = GraphIndex(graph)
+    else:
+        index = session.index
+        for u, position, _, _, weight in diff.reweighted:
+            index.weights[index.indptr[index.node_id[u]] + position] = weight
+
+    segments = dirty_segments(diff, graph)
+    if session.visualizer is not None:
+        session.visualizer.update_graph(session.index, segments)
+    if session.led_visualizer is not None and is_structural(diff):
+        # LED 上的边不区分权重，只有边集变化才需要重画
+        session.led_visualizer.update_graph(session.index, segments)
+    return segments
+
+
+class GraphWatcher:
+    """Polls a file and reports when it was rewritten."""
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def changed(self):
+        signature = self._stat()
+        if signature is None or signature == self.signature:
+            return False
+        self.signature = signature
+        return True
@@ -0,0 +1,252 @@
+"""LED refresh in a dedicated process, fed through shared memory.
+
+``rgbmatrix`` refreshes the panels from its own thread and flickers when the
+process it lives in is busy with pygame and the simulator under the GIL.
+``SharedMatrix`` moves the real matrix into a driver process and hands the
+compositor a stand-in with the matrix interface the visualizers use
+(``CreateFrameCanvas``, ``SwapOnVSync``, ``width``/``height``, ``pixels``).
+
+Frames travel through a ``multiprocessing.shared_memory`` double buffer::
+
+    header   int64[8]: latest slot, published frame number, slot 0 state,
+             slot 1 state, closed flag, frames shown, frames skipped, ready
+    slot 0   uint8[height, width, 3]
+    slot 1   uint8[height, width, 3]
+
+The compositor renders straight into the back slot (``SharedCanvas.shared_pixels``
+is a view on it, so nothing is copied on the way) and ``SwapOnVSync``
+publishes it with a new frame number.  A slot's state is odd while it is
+being written; the driver copies the latest slot and keeps the copy only if
+the state did not change meanwhile (a seqlock), so it never shows a torn
+frame and never waits for the compositor.  It swaps the newest complete
+frame onto the panels on vsync, and skips frames that were overwritten
+before it got to them.
+"""
+import multiprocessing
+import os
+import signal
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from framebuffer import draw_lines, upload_frame
+from VirtualMatrix import create_matrix
+
+HEADER_FIELDS = 8
+LATEST, PUBLISHED, SLOT_STATE, CLOSED, SHOWN, SKIPPED, READY = 0, 1, 2, 4, 5, 6, 7
+
+
+class SharedFrames:
+    """The shared double buffer (see the module docstring for the layout)."""
+
+    def __init__(self, width, height, name=None):
+        self.width = width
+        self.height = height
+        frame_bytes = width * height * 3
+        size = HEADER_FIELDS * 8 + 2 * frame_bytes
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=self.shm.buf)
+        self.slots = [np.ndarray((height, width, 3), dtype=np.uint8, buffer=self.shm.buf,
+                                 offset=HEADER_FIELDS * 8 + i * frame_bytes)
+                      for i in range(2)]
+        if self.owner:
+            self.header[:] = 0
+            self.header[LATEST] = 1
+            for slot in self.slots:
+                slot.fill(0)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def closed(self):
+        return bool(self.header[CLOSED])
+
+    def begin(self, slot):
+        """Mark ``slot`` as being written (state becomes odd)."""
+        self.header[SLOT_STATE + slot] += 1
+
+    def publish(self, slot):
+        """Mark ``slot`` complete and make it the latest frame."""
+        self.header[SLOT_STATE + slot] += 1
+        self.header[LATEST] = slot
+        self.header[PUBLISHED] += 1
+
+    def read_latest(self, out, after=0):
+        """Copy the newest complete frame into ``out``.
+
+        Returns its frame number, or None when there is nothing newer than
+        ``after`` (or the frame was being rewritten; just try again).
+        """
+        header = self.header
+        published = int(header[PUBLISHED])
+        if published <= after:
+            return None
+        slot = int(header[LATEST])
+        state = int(header[SLOT_STATE + slot])
+        if state & 1:
+            return None
+        np.copyto(out, self.slots[slot])
+        # 复制期间被改写过就丢掉这一份
+        if int(header[SLOT_STATE + slot]) != state:
+            return None
+        return published
+
+    def close(self):
+        # 先丢掉指向共享内存的视图，否则 close 会因为仍有导出的缓冲区而失败
+        self.header = None
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SharedCanvas:
+    """The back slot of the double buffer, usable like a ``FrameCanvas``.
+
+    It always points at whichever slot is currently the back buffer, so
+    several visualizers sharing one ``SharedMatrix`` never draw into the
+    frame the driver is reading.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.width = matrix.width
+        self.height = matrix.height
+
+    @property
+    def slot(self):
+        return self.matrix.back
+
+    @property
+    def shared_pixels(self):
+        """Writable ``(height, width, 3)`` view on the slot; render into it directly."""
+        return self.matrix.frames.slots[self.slot]
+
+    def SetPixel(self, x, y, red, green, blue):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.shared_pixels[y, x] = (red, green, blue)
+
+    def Clear(self):
+        self.shared_pixels.fill(0)
+
+    def Fill(self, red, green, blue):
+        self.shared_pixels[:] = (red, green, blue)
+
+    def DrawLines(self, x1, y1, x2, y2, colors):
+        """Batched segments like ``graphics.DrawLines``, drawn straight into the slot."""
+        draw_lines(self.shared_pixels, x1, y1, x2, y2, colors if len(colors) > 1 else colors[0])
+
+    def SetPixels(self, xs, ys, colors):
+        """Batched pixels like ``graphics.SetPixels``, later pixels win."""
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        self.shared_pixels[ys[inside], xs[inside]] = colors[inside] if len(colors) > 1 else colors[0]
+
+    def SetImage(self, image, offset_x=0, offset_y=0, unsafe=True):
+        src = np.asarray(image, dtype=np.uint8)
+        x0, y0 = max(0, offset_x), max(0, offset_y)
+        x1 = min(self.width, offset_x + src.shape[1])
+        y1 = min(self.height, offset_y + src.shape[0])
+        if x0 < x1 and y0 < y1:
+            self.shared_pixels[y0:y1, x0:x1] = src[y0 - offset_y:y1 - offset_y,
+                                                   x0 - offset_x:x1 - offset_x]
+
+
+def run_driver(name, width, height, matrix_options, poll_interval):
+    """Body of the driver process: show every new complete frame on the real matrix."""
+    # Ctrl-C 发给整个进程组；驱动进程由父进程通过 CLOSED 标志关闭
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    frames = SharedFrames(width, height, name=name)
+    matrix = create_matrix(**matrix_options)
+    canvas = matrix.CreateFrameCanvas()
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    parent = os.getppid()
+    shown = 0
+    frames.header[READY] = 1
+    try:
+        while not frames.closed and os.getppid() == parent:
+            published = frames.read_latest(frame, after=shown)
+            if published is None:
+                time.sleep(poll_interval)
+                continue
+            upload_frame(canvas, frame)
+            # 硬件上 SwapOnVSync 会一直等到垂直同步
+            canvas = matrix.SwapOnVSync(canvas)
+            frames.header[SKIPPED] += published - shown - 1
+            frames.header[SHOWN] += 1
+            shown = published
+    finally:
+        frames.close()
+
+
+class SharedMatrix:
+    """Matrix stand-in for the compositor process; the real matrix lives in a driver process.
+
+    Accepts the arguments of ``create_matrix``; ``poll_interval`` is how long
+    the driver sleeps when no new frame has been published.
+    """
+
+    def __init__(self, rows=64, cols=64, chain_length=1, parallel=1, hardware_mapping='regular',
+                 backend=None, poll_interval=0.001, start_timeout=10.0):
+        self.width = cols * chain_length
+        self.height = rows * parallel
+        self.frames = SharedFrames(self.width, self.height)
+        matrix_options = {'rows': rows, 'cols': cols, 'chain_length': chain_length,
+                          'parallel': parallel, 'hardware_mapping': hardware_mapping,
+                          'backend': backend}
+        # spawn：驱动进程不继承 pygame 等已经初始化的状态
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(
+            target=run_driver, name='led-driver', daemon=True,
+            args=(self.frames.name, self.width, self.height, matrix_options, poll_interval))
+        self.process.start()
+
+        deadline = time.monotonic() + start_timeout
+        while not self.frames.header[READY]:
+            if not self.process.is_alive() or time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError("LED driver process failed to start")
+            time.sleep(0.01)
+
+        self.back = 0
+        self.frames.begin(self.back)
+
+    @property
+    def pixels(self):
+        """The last published frame (shared, copy it to keep it)."""
+        return self.frames.slots[int(self.frames.header[LATEST])]
+
+    @property
+    def stats(self):
+        header = self.frames.header
+        return {'published': int(header[PUBLISHED]), 'shown': int(header[SHOWN]),
+                'skipped': int(header[SKIPPED])}
+
+    def CreateFrameCanvas(self):
+        return SharedCanvas(self)
+
+    def SwapOnVSync(self, canvas, framerate_fraction=1):
+        """Publish the back slot; ``canvas`` then points at the other one.
+
+        Never blocks: the vsync wait happens in the driver process.
+        """
+        self.frames.publish(self.back)
+        self.back = 1 - self.back
+        self.frames.begin(self.back)
+        return canvas
+
+    def close(self, timeout=2.0):
+        if self.frames.shm is None:
+            return
+        self.frames.header[CLOSED] = 1
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.frames.close()
+        self.frames.shm = None
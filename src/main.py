@@ -1,64 +1,32 @@
-import pygame
-import time
-from collections import namedtuple
-from dijkstra import get_stat_weight, DijkstraSimulator
+import asyncio
 from GraphManager import GraphManager
-from GraphVisualizer import GraphVisualizer
+from control import App
 
-# DijkState = namedtuple('AlgorithmState', ['current_node', 'visited', 'current_path', 'processing_edge'])
-DijkState = namedtuple('AlgorithmState', ['current_node', 'visited', 'current_path', 'processing_edge', 'distances', 'previous'])
 
-
-        
 def main():
     # 图结构
+    graph_file = "./assets/graphs/graph2.pkl"
     try:
-        graph_manager = GraphManager.load_from_file("./assets/graphs/graph2.pkl")
+        graph_manager = GraphManager.load_from_file(graph_file)
     except (FileNotFoundError, ValueError):
         print("No graph found, generating new graph")
         graph_manager = GraphManager()
         graph_manager.generate_new_graph()
-        graph_manager.save_to_file("./assets/graphs/generated_graph.pkl")
-    
-    graph = graph_manager.get_graph()
-    start_node, end_node = graph_manager.get_endpoints()
-    
-    visualizer = GraphVisualizer(
-        graph=graph,
-        start_node=start_node,
-        end_node=end_node
-    )
-    simulator = DijkstraSimulator(
-        graph=graph,
-        start_node=start_node,
-        end_node=end_node
-    )
-
-    # 主循环
-    clock = pygame.time.Clock()
-    running = True
-    paused = False
-
-    while running:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-                elif event.key == pygame.K_SPACE:
-                    paused = not paused
-
-        if not paused:
-            state = simulator.step()
-            if state:
-                visualizer.draw_frame(state)
-            
-        clock.tick(120)  #  120 FPS
-
-    pygame.quit()
+        graph_file = "./assets/graphs/generated_graph.pkl"
+        graph_manager.save_to_file(graph_file)
+
+    # pygame 窗口、LED 渲染线程和仿真线程都归 App 管理；
+    # 运行中可以通过控制套接字换图、换端点、调速度（见 control.py）
+    # 按键：SPACE 暂停，左/右单步，B 倒放，T 计时，H LED HUD，P 性能采样，WASD/+/-/F/0 控制 LED 视口，ESC 退出
+    # LED 刷新放在单独的驱动进程里，不受 pygame 和仿真线程争用 GIL 的影响
+    app = App(steps_per_second=120, fps=60, led_process=True)
+    app.load_graph(graph_file, graph_manager)
+    try:
+        asyncio.run(app.run())
+    except KeyboardInterrupt:
+        # Ctrl-C：App.run 的 finally 已经停掉线程和驱动进程
+        pass
 
 
 if __name__ == "__main__":
     main()
-
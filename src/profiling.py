@@ -0,0 +1,209 @@
+"""On-demand cProfile / tracemalloc captures of the running loop.
+
+``ProfileCapture.start()`` opens a capture window of ``seconds`` or
+``frames`` (whichever ends first) and the loop calls ``tick()`` once per
+frame.  While no capture runs the loop only checks ``capture.active``, so
+the hook stays in the code permanently, like ``timing.TIMINGS``.
+
+``cProfile`` only sees the thread that enables it, so the other threads of
+the demo join in themselves: the render sink workers and the simulation
+worker call ``CAPTURE.thread_tick()`` once per frame/tick, which starts a
+profiler on that thread when a capture begins and hands it back when the
+capture ends (one generation counter check otherwise).  The stats of the
+event loop and of every thread that joined are merged into one file.  The
+LED driver process is not included.  With ``memory=True`` allocations of
+the whole process are traced as well.  When the window ends it writes, next
+to each other in ``DIJK_PROFILE_DIR`` (default ``profiles``)::
+
+    profile-<time>.pstats       for ``python -m pstats`` / snakeviz
+    profile-<time>.tracemalloc  ``tracemalloc.Snapshot`` (memory=True only)
+    profile-<time>.txt          profiled threads, top functions by cumulative
+                                and own time, top allocation sites
+
+``<time>`` has millisecond resolution plus a per-process counter, so quick
+successive captures never overwrite each other.
+
+The files are written by a background thread, so the end of a capture does
+not stall the loop either.  ``control.App`` starts captures on SIGUSR1
+(SIGUSR2 adds tracemalloc), the ``P`` key and the ``profile`` command.
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+DEFAULT_DIR = os.environ.get('DIJK_PROFILE_DIR', 'profiles')
+DEFAULT_SECONDS = 10.0
+# 结束采样后等其他线程交回各自 profiler 的最长时间
+JOIN_TIMEOUT = 1.0
+
+
+class ProfileCapture:
+    def __init__(self, out_dir=DEFAULT_DIR, top=30):
+        self.out_dir = out_dir
+        self.top = top
+        self.active = False
+        self.last = None
+        self.captures = 0
+        # 开始和结束都加一；线程发现代数变了才去开关自己的 profiler
+        self.generation = 0
+        self._profile = None
+        self._writers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._joined = {}
+
+    def start(self, seconds=None, frames=None, memory=False, top=None):
+        """Start a capture of ``seconds`` and/or ``frames`` (default: 10 seconds)."""
+        if self.active:
+            raise RuntimeError("A profile capture is already running")
+        if seconds is None and frames is None:
+            seconds = DEFAULT_SECONDS
+        self.deadline = time.monotonic() + seconds if seconds is not None else None
+        self.frames_left = frames
+        self.memory = memory
+        self.frames = 0
+        self.started = time.monotonic()
+        self.capture_top = top or self.top
+        # tracemalloc 已经由别人开启时不去关它
+        self._own_tracemalloc = memory and not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start(16)
+        self._profile = cProfile.Profile()
+        with self._lock:
+            self.generation += 1
+            self._started_generation = self.generation
+            self._joined[self.generation] = {'threads': 0, 'profiles': [], 'done': threading.Condition(self._lock)}
+            self.active = True
+        self._profile.enable()
+        return {'seconds': seconds, 'frames': frames, 'memory': memory}
+
+    def thread_tick(self):
+        """Called once per frame by worker threads to take part in captures."""
+        local = self._local
+        if getattr(local, 'generation', 0) == self.generation:
+            return
+        with self._lock:
+            self._hand_in(local)
+            local.generation = self.generation
+            if self.active:
+                local.joined = self.generation
+                self._joined[self.generation]['threads'] += 1
+                local.profile = cProfile.Profile()
+                local.profile.enable()
+
+    def tick(self):
+        """Count one frame; ends the capture when its window is over."""
+        self.frames += 1
+        if self.frames_left is not None and self.frames >= self.frames_left:
+            return self.stop()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return self.stop()
+        return None
+
+    def thread_exit(self):
+        """Hand back this thread's profiler before the thread ends."""
+        with self._lock:
+            self._hand_in(self._local)
+
+    def _hand_in(self, local):
+        profile = getattr(local, 'profile', None)
+        if profile is None:
+            return
+        # 停下本线程的 profiler 交给写文件的线程
+        profile.disable()
+        local.profile = None
+        joined = self._joined.get(local.joined)
+        if joined is not None:
+            joined['profiles'].append((threading.current_thread().name, profile))
+            joined['done'].notify_all()
+
+    def stop(self):
+        """End the capture now; returns the paths that are being written."""
+        if not self.active:
+            return None
+        # disable 必须在 start 的线程里调用
+        self._profile.disable()
+        with self._lock:
+            self.active = False
+            self.generation += 1
+            joined = self._joined[self._started_generation]
+        snapshot = None
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            if self._own_tracemalloc:
+                tracemalloc.stop()
+
+        self.captures += 1
+        now = time.time()
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f"-{int(now * 1000) % 1000:03d}"
+        base = os.path.join(self.out_dir, f"profile-{stamp}-{self.captures}")
+        paths = {'stats': base + '.pstats', 'summary': base + '.txt'}
+        if snapshot is not None:
+            paths['memory'] = base + '.tracemalloc'
+        header = f"{self.frames} frames in {time.monotonic() - self.started:.2f}s"
+        profile, self._profile = self._profile, None
+        main = (threading.current_thread().name, profile)
+        writer = threading.Thread(target=self._write, name='profile-writer', daemon=True,
+                                  args=(main, joined, snapshot, paths, header, self.capture_top))
+        writer.start()
+        # 连续两次采样时前一个文件可能还没写完，退出前都要等
+        self._writers = [thread for thread in self._writers if thread.is_alive()] + [writer]
+        self.last = paths
+        return paths
+
+    def _collect(self, joined):
+        """Wait (briefly) until every thread that joined handed its profiler back."""
+        deadline = time.monotonic() + JOIN_TIMEOUT
+        with self._lock:
+            while len(joined['profiles']) < joined['threads']:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                joined['done'].wait(remaining)
+            # 之后才交回的线程找不到这一代，直接丢掉自己的 profiler
+            self._joined = {generation: entry for generation, entry in self._joined.items()
+                            if entry is not joined}
+            return list(joined['profiles']), joined['threads']
+
+    def _write(self, main, joined, snapshot, paths, header, top):
+        profiles, expected = self._collect(joined)
+        profiles.insert(0, main)
+        names = ', '.join(name for name, _ in profiles)
+        missing = expected + 1 - len(profiles)
+        header += f"\nprofiled threads: {names}"
+        if missing:
+            # 阻塞着的线程（例如暂停时的渲染线程）来不及交回
+            header += f" ({missing} thread(s) did not report back in time)"
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        text = io.StringIO()
+        text.write(header + '\n\n')
+        stats = pstats.Stats(profiles[0][1], stream=text)
+        for _, profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(paths['stats'])
+        for key in ('cumulative', 'tottime'):
+            text.write(f"==== top {top} by {key} ====\n")
+            stats.sort_stats(key).print_stats(top)
+        if snapshot is not None:
+            snapshot.dump(paths['memory'])
+            text.write(f"==== top {top} allocation sites ====\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                text.write(f"{stat}\n")
+        with open(paths['summary'], 'w') as f:
+            f.write(text.getvalue())
+        print(f"Profile written to {paths['summary']}")
+
+    def wait(self, timeout=None):
+        """Block until the files of every pending capture are written."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for writer in self._writers:
+            writer.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+
+# 整个进程共用一个采样器，工作线程通过它加入采样
+CAPTURE = ProfileCapture()
@@ -0,0 +1,228 @@
+"""Fan one computed frame out to several render sinks.
+
+``FanOutRenderer.render(state)`` turns the algorithm state into an
+immutable ``FrameDescription`` once and hands that same object to every
+sink.  Sinks that can run off the main thread each get a ``SinkWorker``
+with a one-slot mailbox: a slow sink only ever sees the newest frame and
+never stalls the others.  The pygame sink stays inline because SDL has to be
+driven from the main thread.
+"""
+import threading
+import traceback
+from collections import deque, namedtuple
+from types import MappingProxyType
+
+from dijkstra import NodeMapping, VisitedSet, exploring_path
+from profiling import CAPTURE
+
+# 空闲渲染线程检查采样状态的间隔（秒）
+IDLE_POLL = 0.2
+
+FrameDescription = namedtuple('FrameDescription', [
+    'step', 'current_node', 'visited', 'current_path', 'processing_edge',
+    'exploring_path', 'distances', 'previous', 'tree', 'node_state',
+])
+
+
+def _snapshot_mapping(mapping):
+    if mapping is None:
+        return None
+    if isinstance(mapping, NodeMapping):
+        return mapping.snapshot()
+    return MappingProxyType(dict(mapping))
+
+
+def describe_frame(state, frame_number=0):
+    """Immutable snapshot of ``state`` that is safe to share between threads.
+
+    ``step`` is the simulator step of the state when it has one, otherwise
+    ``frame_number``; distances, predecessors and the shortest-path tree are
+    read-only copies.
+    """
+    path = ()
+    if state.current_node is not None and not state.current_path:
+        path = tuple(exploring_path(state))
+    node_state = None if state.node_state is None else state.node_state.copy()
+    # 状态平面的拷贝只有一个字节/节点，已访问集合直接建立在它上面
+    if isinstance(state.visited, VisitedSet) and node_state is not None:
+        visited = VisitedSet(state.visited.index, node_state)
+    else:
+        visited = frozenset(state.visited)
+    # 树快照要在 exploring_path 之后取，才能带上这一帧路径的变化位置
+    tree = None if state.tree is None else state.tree.snapshot()
+    return FrameDescription(
+        step=frame_number if state.step is None else state.step,
+        current_node=state.current_node,
+        visited=visited,
+        current_path=tuple(state.current_path),
+        processing_edge=state.processing_edge,
+        exploring_path=path,
+        distances=_snapshot_mapping(state.distances),
+        previous=_snapshot_mapping(state.previous),
+        tree=tree,
+        node_state=node_state,
+    )
+
+
+class Sink:
+    """Something that can draw a ``FrameDescription``."""
+
+    threaded = True
+
+    def render(self, frame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PygameSink(Sink):
+    threaded = False
+
+    def __init__(self, visualizer):
+        self.visualizer = visualizer
+
+    def render(self, frame):
+        self.visualizer.draw_frame(frame)
+
+    def animate(self):
+        self.visualizer.animate()
+
+
+class LEDSink(Sink):
+    def __init__(self, visualizer):
+        self.visualizer = visualizer
+
+    def render(self, frame):
+        self.visualizer.draw_frame(frame)
+
+
+class BufferSink(Sink):
+    """Headless sink keeping the last ``max_frames`` LED frames as arrays."""
+
+    def __init__(self, visualizer, max_frames=1):
+        self.visualizer = visualizer
+        self.frames = deque(maxlen=max_frames)
+
+    def render(self, frame):
+        self.visualizer.draw_frame(frame)
+        self.frames.append(self.visualizer.matrix.pixels.copy())
+
+
+class RecorderSink(BufferSink):
+    """Records LED frames and writes them as a GIF or a PNG sequence on close.
+
+    ``path`` ending in ``.gif`` produces one animated GIF, anything else is a
+    format string such as ``frames/{:05d}.png``.
+    """
+
+    def __init__(self, visualizer, path, fps=30, scale=4):
+        super().__init__(visualizer, max_frames=None)
+        self.path = str(path)
+        self.fps = fps
+        self.scale = scale
+
+    def close(self):
+        from PIL import Image
+
+        images = [Image.fromarray(frame, 'RGB') for frame in self.frames]
+        if self.scale != 1:
+            images = [image.resize((image.width * self.scale, image.height * self.scale), Image.NEAREST)
+                      for image in images]
+        if not images:
+            return
+        if self.path.endswith('.gif'):
+            images[0].save(self.path, save_all=True, append_images=images[1:],
+                           duration=int(1000 / self.fps), loop=0)
+        else:
+            for i, image in enumerate(images):
+                image.save(self.path.format(i))
+
+
+class SinkWorker(threading.Thread):
+    """Runs one sink on its own thread, always rendering the newest frame."""
+
+    def __init__(self, sink):
+        super().__init__(name=f"sink-{type(sink).__name__}", daemon=True)
+        self.sink = sink
+        self.dropped = 0
+        self.rendered = 0
+        self.errors = 0
+        self.last_error = None
+        self._pending = None
+        self._closing = False
+        self._cond = threading.Condition()
+
+    def submit(self, frame):
+        with self._cond:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = frame
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closing:
+                    # 空闲时也定时醒来，让结束的采样及时收回本线程的 profiler
+                    self._cond.wait(IDLE_POLL)
+                    CAPTURE.thread_tick()
+                frame, self._pending = self._pending, None
+                if frame is None:
+                    break
+            CAPTURE.thread_tick()
+            try:
+                self.sink.render(frame)
+            except Exception as error:
+                self._report(error)
+                continue
+            self.rendered += 1
+        CAPTURE.thread_exit()
+        self.sink.close()
+
+    def _report(self, error):
+        # 出错的帧跳过，线程继续渲染下一帧；同样的错误只打印一次完整堆栈
+        self.errors += 1
+        key = (type(error), str(error))
+        if key != self.last_error:
+            print(f"{self.name}: rendering a frame failed")
+            traceback.print_exc()
+        self.last_error = key
+
+
+class FanOutRenderer:
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self.inline = [sink for sink in self.sinks if not sink.threaded]
+        self.workers = [SinkWorker(sink) for sink in self.sinks if sink.threaded]
+        self.frames = 0
+        for worker in self.workers:
+            worker.start()
+
+    def render(self, state):
+        self.frames += 1
+        frame = describe_frame(state, self.frames)
+        for worker in self.workers:
+            worker.submit(frame)
+        for sink in self.inline:
+            sink.render(frame)
+        return frame
+
+    def animate(self):
+        for sink in self.inline:
+            if hasattr(sink, 'animate'):
+                sink.animate()
+
+    def close(self):
+        """Stop the workers (each renders its last pending frame first)."""
+        for worker in self.workers:
+            worker.close()
+        for worker in self.workers:
+            worker.join()
+        for sink in self.inline:
+            sink.close()
@@ -0,0 +1,365 @@
+"""Producer/consumer runtime that decouples stepping from rendering.
+
+The simulator runs in a ``SimulationWorker`` thread.  Once per display
+frame a ``StepScheduler`` decides how many steps to run (a fixed
+``steps_per_second`` or a target ``duration`` for the whole run, capped by
+the frame time left after rendering), and the worker pushes the
+``StepEvent`` of every one of those steps as one list into a bounded
+queue.  The render loop calls
+``SimulationRuntime.poll()`` once per displayed frame: it drains every
+pending event into a ``StateMirror`` and hands back a single coalesced state,
+so intermediate steps are never drawn when the display falls behind, and a
+full queue blocks the worker instead of letting it run away.
+
+Stepping backwards goes through the worker too (``step_back()`` queues a
+command that is executed even while paused); each undone step is published
+as an ``UndoEvent`` carrying the simulator's ``StepDelta`` (or a full
+snapshot when the simulator had to rebuild from a checkpoint), which the
+mirror reverts the same way the simulator did.
+"""
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from GraphIndex import GraphIndex
+from dijkstra import DijkState, NodeStates, ShortestPathTree, restore_snapshot, undo_delta
+from profiling import CAPTURE
+
+
+StepEvent = namedtuple('StepEvent', ['step', 'node', 'processing_edge', 'relaxed', 'path'])
+# delta 和 snapshot 二选一，对应 DijkstraSimulator.last_undo
+UndoEvent = namedtuple('UndoEvent', ['step', 'delta', 'snapshot'])
+
+
+class StepScheduler:
+    """Decides how many steps to run in each frame.
+
+    The pace is either ``steps_per_second`` or ``duration`` seconds for the
+    whole run (about ``total_steps`` steps, re-planned every frame from what
+    is left); with neither, as many steps as fit in the frame.  The steps of
+    a frame never take longer than the frame period minus the measured
+    render cost, whatever the pace asks for: a slow display slows the run
+    down instead of making frames late.
+    """
+
+    def __init__(self, steps_per_second=None, duration=None, total_steps=None, fps=60,
+                 headroom=0.8):
+        self.steps_per_second = steps_per_second
+        self.duration = duration
+        self.total_steps = total_steps
+        self.fps = fps
+        self.headroom = headroom
+        # 单步耗时和每帧渲染耗时的指数滑动平均
+        self.step_cost = 1e-5
+        self.render_cost = 0.0
+        self.done = 0
+        self.elapsed = 0.0
+        self._carry = 0.0
+        self._last = None
+
+    @property
+    def period(self):
+        return 1.0 / self.fps
+
+    def set_pace(self, steps_per_second=None, duration=None):
+        self.steps_per_second = steps_per_second
+        self.duration = duration
+        # 新的目标时长从现在算起
+        self.done = 0
+        self.elapsed = 0.0
+
+    def budget(self):
+        """Seconds of stepping that fit in one frame."""
+        return max(self.period * self.headroom - self.render_cost, self.period * 0.1)
+
+    def rate(self):
+        """Steps per second wanted right now, None for as fast as possible."""
+        if self.duration and self.total_steps:
+            # 步数估计偏小时往上调，避免剩余步数变成 0 而停住
+            self.total_steps = max(self.total_steps, int(self.done * 1.1) + 1)
+            left = self.duration - self.elapsed
+            if left <= 0:
+                return None
+            return (self.total_steps - self.done) / left
+        return self.steps_per_second or None
+
+    def pause(self):
+        self._last = None
+
+    def plan(self, now):
+        """``(max_steps, budget_seconds)`` for this frame (``max_steps`` None = no limit)."""
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+        self.elapsed += dt
+        budget = self.budget()
+        rate = self.rate()
+        if rate is None:
+            return None, budget
+        self._carry += rate * dt
+        steps = int(self._carry)
+        # 预算内放不下的步数顺延到下一帧，但最多积压一帧
+        fit = max(1, int(budget / self.step_cost))
+        self._carry = min(self._carry - min(steps, fit), fit)
+        return min(steps, fit), budget
+
+    def observe_steps(self, count, seconds):
+        self.done += count
+        if count:
+            self.step_cost += 0.2 * (seconds / count - self.step_cost)
+
+    def observe_render(self, seconds):
+        self.render_cost += 0.2 * (seconds - self.render_cost)
+
+
+def estimate_steps(simulator):
+    """Roughly how many steps a full run of ``simulator`` takes."""
+    if hasattr(simulator, '__len__'):
+        return len(simulator)
+    index = getattr(simulator, 'index', None)
+    return index.n_nodes if index is not None else None
+
+
+class SimulationWorker(threading.Thread):
+    """Steps the simulator as its ``scheduler`` plans and publishes step events."""
+
+    def __init__(self, simulator, events, scheduler):
+        super().__init__(name="dijkstra-simulation", daemon=True)
+        self.simulator = simulator
+        self.events = events
+        self.scheduler = scheduler
+        self.finished = False
+        self.commands = queue.Queue()
+
+        self._running = threading.Event()
+        self._running.set()
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+
+    def pause(self):
+        self._running.clear()
+
+    def resume(self):
+        self._running.set()
+        self._wake.set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set()
+
+    def stop(self):
+        self._stopping.set()
+        self._running.set()
+        self._wake.set()
+
+    def command(self, name, count=1):
+        """Queue ``('back' | 'forward', count)``; runs even while paused."""
+        self.commands.put((name, count))
+        self._wake.set()
+
+    def _publish(self, event):
+        # 队列满时阻塞（背压），但仍然响应 stop()
+        while not self._stopping.is_set():
+            try:
+                self.events.put(event, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _step_event(self):
+        sim = self.simulator
+        return StepEvent(
+            step=sim.steps,
+            node=sim.current_node,
+            processing_edge=sim.processing_edge,
+            relaxed=sim.relaxed,
+            path=list(sim.current_path) if sim.current_path else None,
+        )
+
+    def _publish_step(self):
+        self._publish(self._step_event())
+
+    def _run_commands(self):
+        sim = self.simulator
+        while not self._stopping.is_set():
+            try:
+                name, count = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            for _ in range(count):
+                if name == 'back':
+                    if sim.step_back() is None:
+                        break
+                    kind, undo = sim.last_undo
+                    self.finished = False
+                    self._publish(UndoEvent(
+                        step=sim.steps,
+                        delta=undo if kind == 'delta' else None,
+                        snapshot=undo if kind == 'snapshot' else None,
+                    ))
+                else:
+                    if sim.step() is None:
+                        self.finished = True
+                        break
+                    self._publish_step()
+
+    def run(self):
+        scheduler = self.scheduler
+        next_frame = time.monotonic()
+        while not self._stopping.is_set():
+            CAPTURE.thread_tick()
+            self._run_commands()
+            if not self._running.is_set():
+                # 暂停时等待命令或 resume()
+                self._wake.wait(timeout=0.1)
+                self._wake.clear()
+                scheduler.pause()
+                next_frame = time.monotonic()
+                continue
+
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_frame = max(next_frame + scheduler.period, time.monotonic() - scheduler.period)
+
+            max_steps, budget = scheduler.plan(time.monotonic())
+            if max_steps == 0:
+                continue
+            # 这一帧的所有步骤作为一个列表发布，由 StateMirror 依次应用
+            events = []
+            started = time.perf_counter()
+            count = self.simulator.advance(budget * 1000, max_steps,
+                                           on_step=lambda: events.append(self._step_event()))
+            scheduler.observe_steps(count, time.perf_counter() - started)
+            if events:
+                self._publish(events)
+            if not count:
+                # 跑完后暂停而不是退出，之后仍然可以后退
+                self.finished = True
+                self.pause()
+        CAPTURE.thread_exit()
+
+
+class StateMirror:
+    """Renderer-side copy of the simulator state, rebuilt from step events."""
+
+    def __init__(self, graph, start_node, index=None):
+        self.graph = graph
+        self.start_node = start_node
+        self.index = index if index is not None else GraphIndex(graph)
+        self.reset()
+
+    def reset(self):
+        self.distances = {node: np.inf for node in self.graph}
+        self.distances[self.start_node] = 0
+        self.previous = {node: None for node in self.graph}
+        self.states = NodeStates(self.index, self.start_node)
+        self.node_state = self.states.plane
+        self.visited = self.states.visited
+        self.current_node = self.start_node
+        self.current_path = []
+        self.processing_edge = None
+        self.tree = ShortestPathTree(self.index, self.start_node)
+        self.step = 0
+
+    def apply(self, event):
+        if isinstance(event, list):
+            for step_event in event:
+                self.apply(step_event)
+            return
+        if isinstance(event, UndoEvent):
+            if event.delta is not None:
+                undo_delta(self, event.delta)
+            else:
+                restore_snapshot(self, event.snapshot)
+            self.step = event.step
+            return
+        self.step = event.step
+        self.current_node = event.node
+        self.states.settle(event.node)
+        self.processing_edge = event.processing_edge
+        for neighbor, distance in event.relaxed:
+            self.distances[neighbor] = distance
+            self.previous[neighbor] = event.node
+            self.tree.relax(event.node, neighbor)
+            self.states.relax(neighbor)
+        if event.path:
+            self.current_path = event.path
+            self.states.mark_path(event.path)
+
+    def get_state(self):
+        return DijkState(
+            current_node=self.current_node,
+            visited=self.visited,
+            current_path=self.current_path,
+            processing_edge=self.processing_edge,
+            distances=self.distances,
+            previous=self.previous,
+            tree=self.tree,
+            node_state=self.node_state,
+            step=self.step
+        )
+
+
+class SimulationRuntime:
+    """Owns the worker thread, the bounded event queue and the mirror."""
+
+    def __init__(self, simulator, steps_per_second=None, queue_size=256, duration=None, fps=60):
+        self.simulator = simulator
+        self.events = queue.Queue(maxsize=queue_size)
+        self.mirror = StateMirror(simulator.graph, simulator.start_node,
+                                  getattr(simulator, 'index', None))
+        self.scheduler = StepScheduler(steps_per_second, duration, estimate_steps(simulator), fps)
+        self.worker = SimulationWorker(simulator, self.events, self.scheduler)
+        self.dropped_frames = 0
+
+    def start(self):
+        self.worker.start()
+
+    def stop(self):
+        self.worker.stop()
+        self.worker.join(timeout=1.0)
+
+    def toggle_pause(self):
+        if self.worker.paused:
+            self.worker.resume()
+        else:
+            self.worker.pause()
+
+    def step_back(self, count=1):
+        """Pause and undo ``count`` steps."""
+        self.worker.pause()
+        self.worker.command('back', count)
+
+    def step_forward(self, count=1):
+        """Pause and do ``count`` single steps."""
+        self.worker.pause()
+        self.worker.command('forward', count)
+
+    def set_pace(self, steps_per_second=None, duration=None):
+        self.scheduler.set_pace(steps_per_second, duration)
+
+    def observe_render(self, seconds):
+        """Report how long the last frame took to draw; the step budget adapts."""
+        self.scheduler.observe_render(seconds)
+
+    def drain(self):
+        """Apply every pending event to the mirror, return how many steps were applied."""
+        applied = 0
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return applied
+            self.mirror.apply(event)
+            applied += len(event) if isinstance(event, list) else 1
+
+    def poll(self):
+        """Coalesced state for this frame, or None when nothing happened."""
+        applied = self.drain()
+        if not applied:
+            return None
+        self.dropped_frames += applied - 1
+        return self.mirror.get_state()
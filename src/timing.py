@@ -0,0 +1,183 @@
+"""Per-stage frame timing with ring buffers and percentile summaries.
+
+Hot paths are wrapped with ``@timed('stage')`` or ``with TIMINGS.stage('stage')``.
+While ``TIMINGS.enabled`` is false both reduce to a single attribute check,
+so the instrumentation can stay in the code permanently.  Enable it with
+``DIJK_TIMING=1`` (dumped to ``DIJK_TIMING_DUMP``, default
+``frame_timings.json``, on exit) or at runtime with ``TIMINGS.toggle()``.
+
+Stages are recorded from the render loop and from the sink threads at once.
+Each stage should be recorded by one thread; creating a stage's buffer takes
+a lock, and readers iterate over a snapshot of the stages.
+"""
+import atexit
+import csv
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+import numpy as np
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('timings', 'name', 'started')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class FrameTimings:
+    def __init__(self, capacity=2048, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self._buffers = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._dump_registered = False
+
+    def record(self, stage, seconds):
+        buffer = self._buffers.get(stage)
+        if buffer is None:
+            # 只有第一次出现的阶段才加锁，之后的记录不需要
+            with self._lock:
+                buffer = self._buffers.get(stage)
+                if buffer is None:
+                    self._counts[stage] = 0
+                    buffer = self._buffers[stage] = np.zeros(self.capacity, dtype=np.float64)
+        count = self._counts.get(stage, 0)
+        buffer[count % self.capacity] = seconds
+        self._counts[stage] = count + 1
+
+    def stage(self, name):
+        if not self.enabled:
+            return NULL_STAGE
+        return _Stage(self, name)
+
+    def enable(self, dump_path=None):
+        self.enabled = True
+        if dump_path and not self._dump_registered:
+            atexit.register(self.dump, dump_path)
+            self._dump_registered = True
+
+    def disable(self):
+        self.enabled = False
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+            self._counts.clear()
+
+    def stages(self):
+        """Names of the recorded stages (a copy, safe while other threads record)."""
+        with self._lock:
+            return list(self._buffers)
+
+    def samples(self, stage):
+        """Recorded durations (seconds) of ``stage``, oldest first."""
+        buffer = self._buffers.get(stage)
+        count = self._counts.get(stage, 0)
+        if buffer is None:
+            return np.zeros(0)
+        if count <= self.capacity:
+            return buffer[:count].copy()
+        start = count % self.capacity
+        return np.concatenate((buffer[start:], buffer[:start]))
+
+    def last(self, stage):
+        count = self._counts.get(stage, 0)
+        if not count:
+            return 0.0
+        return self._buffers[stage][(count - 1) % self.capacity]
+
+    def summary(self):
+        """``{stage: {count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}}`` over the ring buffers."""
+        result = {}
+        for stage in self.stages():
+            ms = self.samples(stage) * 1000.0
+            if not len(ms):
+                continue
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            result[stage] = {
+                'count': self._counts.get(stage, len(ms)),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(p50),
+                'p95_ms': float(p95),
+                'p99_ms': float(p99),
+                'max_ms': float(ms.max()),
+            }
+        return result
+
+    def overlay_lines(self):
+        return [f"{stage} {s['p50_ms']:.2f}/{s['p95_ms']:.2f}/{s['p99_ms']:.2f}ms"
+                for stage, s in self.summary().items()]
+
+    def dump_json(self, path):
+        data = {
+            'summary': self.summary(),
+            'samples_ms': {stage: (self.samples(stage) * 1000.0).tolist() for stage in self.stages()},
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+
+    def dump_csv(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['stage', 'index', 'ms'])
+            for stage in self.stages():
+                for i, ms in enumerate((self.samples(stage) * 1000.0).tolist()):
+                    writer.writerow([stage, i, f"{ms:.6f}"])
+
+    def dump(self, path):
+        if not self._buffers:
+            return
+        if str(path).endswith('.csv'):
+            self.dump_csv(path)
+        else:
+            self.dump_json(path)
+
+
+TIMINGS = FrameTimings()
+if os.environ.get('DIJK_TIMING') == '1':
+    TIMINGS.enable(os.environ.get('DIJK_TIMING_DUMP', 'frame_timings.json'))
+
+
+def timed(stage):
+    """Decorator recording each call of the function under ``stage``."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TIMINGS.enabled:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                TIMINGS.record(stage, time.perf_counter() - started)
+        return wrapper
+    return decorator
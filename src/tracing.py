@@ -0,0 +1,367 @@
+"""Binary traces of algorithm runs and seekable replay.
+
+``TraceRecorder`` stores what every ``DijkstraSimulator.step()`` changed, as
+``GraphIndex`` ids, plus a keyframe of the full search state every
+``keyframe_interval`` steps.  ``TraceReplay`` rebuilds the states from such a
+file without running the algorithm.  It jumps to any step by loading the
+nearest keyframe and applying at most ``keyframe_interval`` step records, and
+it has the simulator's interface (``step``, ``reset``, ``get_state``, ...), so
+the visualizers and ``SimulationRuntime`` accept it unchanged.
+
+File layout (little endian)::
+
+    header    b'DJKTRAC1', n_nodes u32, n_edges u32, keyframe_interval u32,
+              step_count u32, start i32, end i32, graph_crc u32
+    step      b'S', node i32, processing_edge i32, n_relaxed u16,
+              n_relaxed x (edge i32, distance f64)
+    keyframe  b'K', step u32, current i32, processing_edge i32, size u32,
+              zlib(distances f64[n], parent_edge i32[n], state u8[n])
+    index     keyframe_count x (step u32, offset u64)
+    footer    index_offset u64, keyframe_count u32, b'DJKX'
+
+``node`` is the node settled by the step, or -1 when the step popped an
+already settled node.  The index and footer are written on close; a trace
+cut short without them is indexed by scanning it.
+"""
+import argparse
+import bisect
+import struct
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from GraphIndex import GraphIndex
+from GraphManager import GraphManager
+from dijkstra import (DijkState, DijkstraSimulator, NodeMapping, NodeStates, PATH, ShortestPathTree,
+                      Stepper)
+
+MAGIC = b'DJKTRAC1'
+FOOTER_MAGIC = b'DJKX'
+HEADER = struct.Struct('<8sIIIIiiI')
+STEP = struct.Struct('<BiiH')
+KEYFRAME = struct.Struct('<BIiiI')
+INDEX_ENTRY = struct.Struct('<IQ')
+FOOTER = struct.Struct('<QI4s')
+RELAXED = np.dtype([('edge', '<i4'), ('distance', '<f8')])
+
+STEP_KIND, KEYFRAME_KIND = b'S'[0], b'K'[0]
+
+
+def graph_crc(index):
+    """Checksum of the graph structure, to refuse replaying on another graph."""
+    crc = zlib.crc32(index.edge_src.tobytes())
+    crc = zlib.crc32(index.edge_dst.tobytes(), crc)
+    return zlib.crc32(index.weights.tobytes(), crc)
+
+
+class TraceRecorder:
+    """Writes the steps of a simulator to a trace file.
+
+    Call ``record()`` after every ``simulator.step()`` that returned a state.
+    """
+
+    def __init__(self, path, simulator, keyframe_interval=None):
+        self.file = open(path, 'wb')
+        self.simulator = simulator
+        self.index = simulator.index
+        # 默认让大图的关键帧总量保持在图本身大小的十几倍以内
+        self.keyframe_interval = keyframe_interval or max(256, self.index.n_nodes // 16)
+        self.step_count = 0
+        self.keyframes = []
+        self._current = simulator.states.current
+        # 距离数组只在开始时从字典转换一次，之后按每步的松弛结果更新
+        self.dist = np.array([simulator.distances.get(node, np.inf) for node in self.index.nodes],
+                             dtype=np.float64)
+        self.file.write(self._header())
+        self._write_keyframe()
+
+    def _header(self):
+        index = self.index
+        return HEADER.pack(MAGIC, index.n_nodes, index.n_edges, self.keyframe_interval,
+                           self.step_count, index.node_id[self.simulator.start_node],
+                           index.node_id.get(self.simulator.end_node, -1), graph_crc(index))
+
+    def _edge(self, edge):
+        if edge is None:
+            return -1
+        return self.index.edge_id.get(edge, -1)
+
+    def _write_keyframe(self):
+        sim = self.simulator
+        payload = zlib.compress(self.dist.tobytes() + sim.tree.parent_edge.astype('<i4').tobytes()
+                                + sim.node_state.tobytes())
+        self.keyframes.append((self.step_count, self.file.tell()))
+        self.file.write(KEYFRAME.pack(KEYFRAME_KIND, self.step_count, sim.states.current,
+                                      self._edge(sim.processing_edge), len(payload)))
+        self.file.write(payload)
+
+    def record(self):
+        sim = self.simulator
+        current = sim.states.current
+        node = current if current != self._current else -1
+        self._current = current
+
+        relaxed = np.empty(len(sim.relaxed), dtype=RELAXED)
+        for i, (neighbor, distance) in enumerate(sim.relaxed):
+            relaxed[i] = (self.index.edge_id[(sim.current_node, neighbor)], distance)
+            self.dist[self.index.node_id[neighbor]] = distance
+        self.file.write(STEP.pack(STEP_KIND, node, self._edge(sim.processing_edge), len(relaxed)))
+        self.file.write(relaxed.tobytes())
+
+        self.step_count += 1
+        if self.step_count % self.keyframe_interval == 0:
+            self._write_keyframe()
+
+    def close(self):
+        index_offset = self.file.tell()
+        for step, offset in self.keyframes:
+            self.file.write(INDEX_ENTRY.pack(step, offset))
+        self.file.write(FOOTER.pack(index_offset, len(self.keyframes), FOOTER_MAGIC))
+        # 步数在写完后回填到文件头
+        self.file.seek(0)
+        self.file.write(self._header())
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReplay(Stepper):
+    """Replays a trace file of ``graph``; a drop-in for ``DijkstraSimulator``."""
+
+    def __init__(self, path, graph):
+        with open(path, 'rb') as f:
+            self.data = f.read()
+        (magic, n_nodes, n_edges, self.keyframe_interval, self.step_count,
+         start, end, crc) = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a trace file: {path}")
+
+        self.graph = graph
+        self.index = GraphIndex(graph)
+        if (n_nodes, n_edges, crc) != (self.index.n_nodes, self.index.n_edges, graph_crc(self.index)):
+            raise ValueError(f"Trace {path} was recorded on a different graph")
+        self.start_node = self.index.nodes[start]
+        self.end_node = self.index.nodes[end] if end >= 0 else None
+        self._end = end
+        self.keyframes = self._read_index()
+        self._keyframe_steps = [step for step, _ in self.keyframes]
+        self.reset()
+
+    def _read_index(self):
+        footer_at = len(self.data) - FOOTER.size
+        if footer_at >= HEADER.size:
+            index_offset, count, magic = FOOTER.unpack_from(self.data, footer_at)
+            if magic == FOOTER_MAGIC:
+                return [INDEX_ENTRY.unpack_from(self.data, index_offset + i * INDEX_ENTRY.size)
+                        for i in range(count)]
+        return self._scan()
+
+    def _scan(self):
+        """Index keyframes and count steps of a trace that was not closed."""
+        keyframes = []
+        steps = 0
+        offset = HEADER.size
+        while offset + 1 <= len(self.data):
+            kind = self.data[offset]
+            if kind == KEYFRAME_KIND:
+                if offset + KEYFRAME.size > len(self.data):
+                    break
+                size = KEYFRAME.unpack_from(self.data, offset)[4]
+                if offset + KEYFRAME.size + size > len(self.data):
+                    break
+                keyframes.append((steps, offset))
+                offset += KEYFRAME.size + size
+            elif kind == STEP_KIND:
+                if offset + STEP.size > len(self.data):
+                    break
+                end = offset + STEP.size + STEP.unpack_from(self.data, offset)[3] * RELAXED.itemsize
+                if end > len(self.data):
+                    break
+                steps += 1
+                offset = end
+            else:
+                break
+        self.step_count = steps
+        return keyframes
+
+    def __len__(self):
+        return self.step_count
+
+    def reset(self):
+        self.tree = ShortestPathTree(self.index, self.start_node)
+        self.steps = None
+        self.seek(0)
+
+    def _load_keyframe(self, offset):
+        n = self.index.n_nodes
+        _, step, current, processing_edge, size = KEYFRAME.unpack_from(self.data, offset)
+        start = offset + KEYFRAME.size
+        payload = zlib.decompress(self.data[start:start + size])
+        self.dist = np.frombuffer(payload, dtype='<f8', count=n).copy()
+        parent_edge = np.frombuffer(payload, dtype='<i4', count=n, offset=8 * n)
+        self.tree.load(parent_edge)
+
+        self.states = NodeStates(self.index, self.start_node)
+        self.states.plane[:] = np.frombuffer(payload, dtype=np.uint8, count=n, offset=12 * n)
+        self.states.current = current
+        self.node_state = self.states.plane
+        self.visited = self.states.visited
+
+        self.steps = step
+        self.current_node = self.index.nodes[current] if current >= 0 else self.start_node
+        self.processing_edge = self.index.edge_nodes(processing_edge) if processing_edge >= 0 else None
+        self.relaxed = []
+        self.current_path = []
+        if self._end >= 0 and self.node_state[self._end] == PATH:
+            self.current_path = self._path_to_end()
+        self._offset = start + size
+
+    def _path_to_end(self):
+        path = []
+        v = self._end
+        while v >= 0:
+            path.append(self.index.nodes[v])
+            v = self.tree.parent[v]
+        return path[::-1]
+
+    def _apply_step(self):
+        """Apply the step record at the read position."""
+        index = self.index
+        while self.data[self._offset] == KEYFRAME_KIND:
+            self._offset += KEYFRAME.size + KEYFRAME.unpack_from(self.data, self._offset)[4]
+        _, node, processing_edge, n_relaxed = STEP.unpack_from(self.data, self._offset)
+        start = self._offset + STEP.size
+        relaxed = np.frombuffer(self.data, dtype=RELAXED, count=n_relaxed, offset=start)
+        self._offset = start + n_relaxed * RELAXED.itemsize
+
+        self.steps += 1
+        self.relaxed = []
+        if node >= 0:
+            self.current_node = index.nodes[node]
+            self.states.settle(self.current_node)
+            if node == self._end:
+                self.current_path = self._path_to_end()
+                self.states.mark_path(self.current_path)
+        if processing_edge >= 0:
+            self.processing_edge = index.edge_nodes(processing_edge)
+        for eid, distance in zip(relaxed['edge'].tolist(), relaxed['distance'].tolist()):
+            v = int(index.edge_dst[eid])
+            self.dist[v] = distance
+            self.tree.set_parent(v, int(index.edge_src[eid]), eid)
+            self.states.relax(index.nodes[v])
+            self.relaxed.append((index.nodes[v], distance))
+
+    def seek(self, step):
+        """State after ``step`` steps (clamped to the recorded range)."""
+        step = min(max(step, 0), self.step_count)
+        k = bisect.bisect_right(self._keyframe_steps, step) - 1
+        if k < 0:
+            raise ValueError("Trace has no keyframe")
+        keyframe_step, offset = self.keyframes[k]
+        # 目标在当前位置之后且中间没有更近的关键帧时直接向前推进
+        if self.steps is None or not keyframe_step <= self.steps <= step:
+            self._load_keyframe(offset)
+        while self.steps < step:
+            self._apply_step()
+        return self.get_state()
+
+    def step(self):
+        if self.steps >= self.step_count:
+            return None
+        self._apply_step()
+        return self.get_state()
+
+    @property
+    def distances(self):
+        return NodeMapping(self.index, self.dist, float)
+
+    @property
+    def previous(self):
+        index = self.index
+        return NodeMapping(index, self.tree.parent,
+                           lambda v: index.nodes[v] if v >= 0 else None)
+
+    def get_state(self):
+        return DijkState(
+            current_node=self.current_node,
+            visited=self.visited,
+            current_path=self.current_path,
+            processing_edge=self.processing_edge,
+            distances=self.distances,
+            previous=self.previous,
+            tree=self.tree,
+            node_state=self.node_state,
+            step=self.steps
+        )
+
+
+def record_trace(graph_file, output, keyframe_interval=None):
+    """Run the algorithm on ``graph_file`` and record every step into ``output``."""
+    graph_manager = GraphManager.load_from_file(graph_file)
+    graph = graph_manager.get_graph()
+    start_node, end_node = graph_manager.get_endpoints()
+    simulator = DijkstraSimulator(graph, start_node, end_node)
+    with TraceRecorder(output, simulator, keyframe_interval) as recorder:
+        while simulator.step() is not None:
+            recorder.record()
+        return recorder.step_count
+
+
+def play_trace(path, graph_file, steps_per_second=30.0, loop=True, hold_seconds=3.0,
+               matrix_backend=None):
+    """Show a recorded run on the LED matrix, optionally forever."""
+    from LEDGraphVisualizer import LEDGraphVisualizer
+
+    graph_manager = GraphManager.load_from_file(graph_file)
+    graph = graph_manager.get_graph()
+    replay = TraceReplay(path, graph)
+    visualizer = LEDGraphVisualizer(graph, replay.start_node, replay.end_node,
+                                    matrix_backend=matrix_backend)
+    period = 1.0 / steps_per_second
+    while True:
+        state = replay.seek(0)
+        while state is not None:
+            visualizer.draw_frame(state)
+            time.sleep(period)
+            state = replay.step()
+        time.sleep(hold_seconds)
+        if not loop:
+            return visualizer
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay traces of Dijkstra runs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="run the algorithm and record a trace")
+    record_parser.add_argument('graph')
+    record_parser.add_argument('output')
+    record_parser.add_argument('--keyframe-interval', type=int, default=None,
+                               help="steps between keyframes (default: max(256, nodes / 16))")
+
+    play_parser = commands.add_parser('play', help="replay a trace on the LED matrix")
+    play_parser.add_argument('trace')
+    play_parser.add_argument('graph')
+    play_parser.add_argument('--steps-per-second', type=float, default=30.0)
+    play_parser.add_argument('--once', action='store_true')
+
+    args = parser.parse_args(argv)
+    if args.command == 'record':
+        count = record_trace(args.graph, args.output, args.keyframe_interval)
+        print(f"Recorded {count} steps to {args.output}")
+    else:
+        try:
+            print("Press CTRL-C to stop")
+            play_trace(args.trace, args.graph, args.steps_per_second, loop=not args.once)
+        except KeyboardInterrupt:
+            sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
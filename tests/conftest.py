@@ -0,0 +1,43 @@
+"""Shared fixtures: the modules live in ``src/`` and import each other by name."""
+import os
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / 'src'))
+os.environ.setdefault('DIJK_MATRIX', 'virtual')
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+GRAPHS_DIR = ROOT_DIR / 'assets' / 'graphs'
+
+
+def lattice_graph(side, seed, step=8):
+    """Directed ``side`` x ``side`` lattice with random weights, both directions per edge."""
+    rng = random.Random(seed)
+    graph = {}
+    for x in range(side):
+        for y in range(side):
+            node = (x * step, y * step)
+            edges = []
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1)):
+                if 0 <= x + dx < side and 0 <= y + dy < side:
+                    edges.append((((x + dx) * step, (y + dy) * step), rng.randint(1, 10)))
+            graph[node] = edges
+    return graph, (0, 0), ((side - 1) * step, (side - 1) * step)
+
+
+@pytest.fixture
+def lattice():
+    return lattice_graph(12, seed=7)
+
+
+@pytest.fixture
+def graph2():
+    from GraphManager import GraphManager
+
+    graph_manager = GraphManager.load_from_file(str(GRAPHS_DIR / 'graph2.pkl'))
+    start, end = graph_manager.get_endpoints()
+    return graph_manager.get_graph(), start, end
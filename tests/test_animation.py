@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from animation import (DELTA, HEADER, KEYFRAME, RECORD, SAME, AnimationReader, AnimationWriter,
+                       compile_animation)
+from conftest import GRAPHS_DIR
+
+
+def frame_kinds(path):
+    data = path.read_bytes()
+    kinds, offset = [], HEADER.size
+    while offset < len(data):
+        kind, size = RECORD.unpack_from(data, offset)
+        kinds.append(kind)
+        offset += RECORD.size + size
+    return kinds
+
+
+def edited_frames(width=16, height=8, count=12, seed=3):
+    """Frames that change in runs, including the first/last pixel and across rows."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    frames = [frame.copy()]
+    flat = frame.reshape(-1, 3)
+    edits = [[0], [width * height - 1], [width - 1, width], list(range(5, 30)), [], [7, 9, 11]]
+    for i in range(count - 1):
+        pixels = edits[i % len(edits)]
+        flat[pixels] = rng.integers(0, 256, (len(pixels), 3), dtype=np.uint8)
+        frames.append(frame.copy())
+    return frames
+
+
+def write(path, frames, keyframe_interval):
+    height, width = frames[0].shape[:2]
+    with AnimationWriter(str(path), width, height, fps=25.0, keyframe_interval=keyframe_interval) as writer:
+        for frame in frames:
+            writer.write(frame)
+
+
+@pytest.mark.parametrize('keyframe_interval', [1, 4, 1000])
+def test_decoded_frames_match(tmp_path, keyframe_interval):
+    frames = edited_frames()
+    path = tmp_path / 'edits.djka'
+    write(path, frames, keyframe_interval)
+
+    reader = AnimationReader(str(path))
+    assert (reader.width, reader.height, reader.fps, len(reader)) == (16, 8, 25.0, len(frames))
+    decoded = [frame.copy() for frame in reader]
+    assert len(decoded) == len(frames)
+    for expected, frame in zip(frames, decoded):
+        assert np.array_equal(expected, frame)
+
+
+def test_unchanged_frames_are_stored_as_repeats(tmp_path):
+    frames = edited_frames()
+    path = tmp_path / 'edits.djka'
+    write(path, frames, keyframe_interval=1000)
+    kinds = frame_kinds(path)
+    assert kinds[0] == KEYFRAME
+    # 第 5 帧没有任何改动
+    assert kinds[5] == SAME
+    assert set(kinds[1:]) == {DELTA, SAME}
+
+
+def test_frame_shape_is_checked(tmp_path):
+    with AnimationWriter(str(tmp_path / 'bad.djka'), 4, 4) as writer:
+        with pytest.raises(ValueError):
+            writer.write(np.zeros((4, 5, 3), dtype=np.uint8))
+
+
+def test_compiled_run_matches_live_rendering(tmp_path):
+    from GraphManager import GraphManager
+    from LEDGraphVisualizer import LEDGraphVisualizer
+    from dijkstra import DijkstraSimulator
+
+    path = tmp_path / 'graph2.djka'
+    compile_animation(str(GRAPHS_DIR / 'graph2.pkl'), str(path), hold_seconds=0, keyframe_interval=16)
+
+    graph_manager = GraphManager.load_from_file(str(GRAPHS_DIR / 'graph2.pkl'))
+    graph = graph_manager.get_graph()
+    start, end = graph_manager.get_endpoints()
+    visualizer = LEDGraphVisualizer(graph, start, end, matrix_backend='virtual')
+    simulator = DijkstraSimulator(graph, start, end)
+    # 先画第 0 步，之后每走一步画一帧，最后一个状态不重复
+    visualizer.draw_frame(simulator.get_state())
+    expected = [visualizer.matrix.pixels.copy()]
+    while simulator.step() is not None:
+        visualizer.draw_frame(simulator.get_state())
+        expected.append(visualizer.matrix.pixels.copy())
+
+    decoded = [frame.copy() for frame in AnimationReader(str(path))]
+    assert len(decoded) == len(expected)
+    for frame, live in zip(decoded, expected):
+        assert np.array_equal(frame, live)
@@ -0,0 +1,154 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from GraphIndex import GraphIndex
+from GraphManager import GraphManager
+from hotreload import GraphWatcher, apply_diff, diff_graphs, dirty_segments, is_structural
+
+
+def copy_graph(graph):
+    return {node: list(edges) for node, edges in graph.items()}
+
+
+def manager(graph):
+    graph_manager = GraphManager()
+    graph_manager.graph = graph
+    graph_manager.nodes = set(graph)
+    return graph_manager
+
+
+def assert_same_index(index, expected):
+    assert index.nodes == expected.nodes
+    assert np.array_equal(index.indptr, expected.indptr)
+    assert np.array_equal(index.edge_src, expected.edge_src)
+    assert np.array_equal(index.edge_dst, expected.edge_dst)
+    assert np.array_equal(index.weights, expected.weights)
+    assert index.edge_id == expected.edge_id
+
+
+def test_identical_graphs_have_no_diff(lattice):
+    graph, _, _ = lattice
+    diff = diff_graphs(graph, copy_graph(graph))
+    assert diff == ([], [], [], [], False)
+    assert not is_structural(diff)
+    assert dirty_segments(diff, graph) == []
+
+
+def test_reweighted_edges(lattice):
+    graph, _, _ = lattice
+    new = copy_graph(graph)
+    u = (8, 8)
+    v, weight = new[u][1]
+    new[u][1] = (v, weight + 5)
+    diff = diff_graphs(graph, new)
+    assert diff.reweighted == [(u, 1, v, weight, weight + 5)]
+    assert not (diff.added or diff.removed or diff.reordered or diff.geometry_changed)
+    assert not is_structural(diff)
+    assert dirty_segments(diff, new) == [(u, v)]
+
+
+def test_added_removed_and_reordered_edges(lattice):
+    graph, _, _ = lattice
+    new = copy_graph(graph)
+    a, b, c = (0, 0), (16, 16), (24, 24)
+    removed_edge = new[a].pop(0)
+    new[b].append(((0, 0), 3))
+    new[c].reverse()
+    diff = diff_graphs(graph, new)
+    assert diff.removed == [(a, *removed_edge)]
+    assert diff.added == [(b, (0, 0), 3)]
+    assert diff.reordered == [c]
+    assert diff.reweighted == []
+    assert is_structural(diff)
+    segments = dirty_segments(diff, new)
+    assert (b, (0, 0)) in segments and (a, removed_edge[0]) in segments
+    assert all((c, v) in segments for v, _ in new[c])
+
+
+def test_duplicate_edges_are_counted(lattice):
+    graph, _, _ = lattice
+    new = copy_graph(graph)
+    u = (8, 8)
+    new[u].append(new[u][0])
+    diff = diff_graphs(graph, new)
+    assert diff.added == [(u, *graph[u][0])]
+
+
+def test_changed_node_set_is_geometry(lattice):
+    graph, _, _ = lattice
+    new = copy_graph(graph)
+    new[(0, 0)].append(((500, 500), 1))
+    assert diff_graphs(graph, new).geometry_changed
+
+    # 只删掉邻接表而别的节点仍指向它时，节点还在
+    new = copy_graph(graph)
+    del new[(0, 0)]
+    assert not diff_graphs(graph, new).geometry_changed
+    new = {u: [(v, w) for v, w in edges if v != (0, 0)] for u, edges in new.items()}
+    assert diff_graphs(graph, new).geometry_changed
+
+
+@pytest.mark.parametrize('edit', ['reweight', 'structural'])
+def test_apply_diff_matches_a_fresh_index(lattice, edit):
+    graph, _, _ = lattice
+    graph = copy_graph(graph)
+    session = SimpleNamespace(graph_manager=manager(graph), index=GraphIndex(graph),
+                              visualizer=None, led_visualizer=None)
+    old_index = session.index
+
+    new = copy_graph(graph)
+    if edit == 'reweight':
+        for u in list(new)[::5]:
+            new[u] = [(v, w * 2) for v, w in new[u]]
+    else:
+        new[(8, 8)].pop()
+        new[(16, 8)].append(((8, 8), 4))
+    diff = diff_graphs(graph, new)
+    segments = apply_diff(session, manager(new), diff)
+
+    # 字典原地更新，持有它的对象不必重建
+    assert session.graph_manager.get_graph() is graph
+    assert graph == new
+    assert_same_index(session.index, GraphIndex(new))
+    # 只改权重时复用原来的 GraphIndex
+    assert (session.index is old_index) == (edit == 'reweight')
+    assert segments == dirty_segments(diff, graph)
+
+
+@pytest.mark.parametrize('edit', ['reweight', 'structural'])
+def test_visualizer_background_matches_a_fresh_one(lattice, edit):
+    pygame = pytest.importorskip('pygame')
+    from GraphVisualizer import GraphVisualizer
+
+    graph, start, end = lattice
+    graph = copy_graph(graph)
+    visualizer = GraphVisualizer(graph, start, end, use_led=False)
+    session = SimpleNamespace(graph_manager=manager(graph), index=visualizer.index,
+                              visualizer=visualizer, led_visualizer=None)
+
+    new = copy_graph(graph)
+    if edit == 'reweight':
+        # 只改一条边也会挪动均值，所有边的亮度都要跟着变
+        v, weight = new[(8, 8)][0]
+        new[(8, 8)][0] = (v, weight + 40)
+    else:
+        new[(8, 8)].pop()
+        new[(16, 8)].append(((8, 8), 4))
+    apply_diff(session, manager(new), diff_graphs(graph, new))
+
+    fresh = GraphVisualizer(copy_graph(new), start, end, use_led=False)
+    assert (visualizer.mean_weight, visualizer.weight_deviation) == (fresh.mean_weight, fresh.weight_deviation)
+    assert np.array_equal(pygame.surfarray.array3d(visualizer.background),
+                          pygame.surfarray.array3d(fresh.background))
+
+
+def test_watcher_reports_rewrites(tmp_path):
+    path = tmp_path / 'graph.pkl'
+    path.write_bytes(b'one')
+    watcher = GraphWatcher(str(path))
+    assert not watcher.changed()
+    path.write_bytes(b'three')
+    assert watcher.changed()
+    assert not watcher.changed()
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from conftest import GRAPHS_DIR, lattice_graph
+from dijkstra import DijkstraSimulator
+from tracing import TraceRecorder, TraceReplay, record_trace
+
+
+def fingerprint(sim, index):
+    state = sim.get_state()
+    return (
+        state.step,
+        state.current_node,
+        state.processing_edge,
+        tuple(state.current_path),
+        state.node_state.tobytes(),
+        np.array([state.distances[node] for node in index.nodes], dtype=np.float64).tobytes(),
+        sim.tree.parent_edge.tobytes(),
+    )
+
+
+def record(graph, start, end, path, keyframe_interval):
+    sim = DijkstraSimulator(graph, start, end)
+    states = [fingerprint(sim, sim.index)]
+    with TraceRecorder(path, sim, keyframe_interval) as recorder:
+        while sim.step() is not None:
+            recorder.record()
+            states.append(fingerprint(sim, sim.index))
+    return states
+
+
+@pytest.fixture
+def recorded(lattice, tmp_path):
+    graph, start, end = lattice
+    path = tmp_path / 'run.djt'
+    states = record(graph, start, end, str(path), keyframe_interval=8)
+    return graph, path, states
+
+
+def test_replay_matches_the_recorded_run(recorded):
+    graph, path, states = recorded
+    replay = TraceReplay(str(path), graph)
+    assert len(replay) == len(states) - 1
+    assert fingerprint(replay, replay.index) == states[0]
+    for expected in states[1:]:
+        assert replay.step() is not None
+        assert fingerprint(replay, replay.index) == expected
+    assert replay.step() is None
+
+
+def test_seek_lands_on_the_same_state_from_anywhere(recorded):
+    graph, path, states = recorded
+    replay = TraceReplay(str(path), graph)
+    last = len(states) - 1
+    # 前进、后退、跨关键帧、落在关键帧上、越界
+    for step in [5, 3, 40, 16, 17, last, 0, last // 2, last + 10, -3]:
+        replay.seek(step)
+        clamped = min(max(step, 0), last)
+        assert fingerprint(replay, replay.index) == states[clamped]
+
+
+def test_unclosed_trace_is_scanned(recorded, tmp_path):
+    graph, path, states = recorded
+    # 去掉末尾的关键帧索引，模拟录制中途被打断
+    data = path.read_bytes()
+    truncated = tmp_path / 'cut.djt'
+    replay = TraceReplay(str(path), graph)
+    cut = replay.keyframes[-1][1]
+    truncated.write_bytes(data[:cut + 3])
+    partial = TraceReplay(str(truncated), graph)
+    assert len(partial) == replay.keyframes[-1][0]
+    partial.seek(len(partial))
+    assert fingerprint(partial, partial.index) == states[len(partial)]
+
+
+def test_trace_refuses_a_different_graph(recorded):
+    _, path, _ = recorded
+    other, _, _ = lattice_graph(12, seed=8)
+    with pytest.raises(ValueError):
+        TraceReplay(str(path), other)
+
+
+def test_record_trace_from_graph_file(graph2, tmp_path):
+    graph, start, end = graph2
+    path = tmp_path / 'graph2.djt'
+    steps = record_trace(str(GRAPHS_DIR / 'graph2.pkl'), str(path))
+    replay = TraceReplay(str(path), graph)
+    assert len(replay) == steps
+    replay.seek(steps)
+    assert replay.current_path[0] == start and replay.current_path[-1] == end
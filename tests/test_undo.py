@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from dijkstra import DijkstraSimulator
+
+
+def fingerprint(sim):
+    """Everything a later step or a renderer depends on."""
+    return (
+        sim.steps,
+        sim.current_node,
+        sim.processing_edge,
+        tuple(sim.current_path),
+        sim.node_state.tobytes(),
+        sim.tree.parent_edge.tobytes(),
+        sorted(sim.distances.items()),
+        sorted(sim.previous.items(), key=lambda item: item[0]),
+    )
+
+
+def run_forward(sim):
+    states = [fingerprint(sim)]
+    while sim.step() is not None:
+        states.append(fingerprint(sim))
+    return states
+
+
+@pytest.mark.parametrize('options', [
+    {},                                            # 只用撤销记录
+    {'undo_limit': 3, 'checkpoint_interval': 5},   # 记录不够时从检查点重放
+    {'undo_limit': 1, 'checkpoint_interval': 1000},  # 没有检查点，从起点重放
+])
+def test_step_back_retraces_every_state(lattice, options):
+    graph, start, end = lattice
+    sim = DijkstraSimulator(graph, start, end, **options)
+    states = run_forward(sim)
+    assert sim.current_path and sim.current_path[-1] == end
+
+    for expected in reversed(states[:-1]):
+        assert sim.step_back() is not None
+        assert fingerprint(sim) == expected
+    assert sim.steps == 0
+    assert sim.step_back() is None
+
+
+def test_redo_after_undo_matches_original_run(lattice):
+    graph, start, end = lattice
+    sim = DijkstraSimulator(graph, start, end, undo_limit=4, checkpoint_interval=6)
+    states = run_forward(sim)
+
+    sim.reset_search()
+    for _ in range(20):
+        sim.step()
+    for _ in range(13):
+        sim.step_back()
+    assert fingerprint(sim) == states[7]
+    # 撤销留下的堆项被标记为取消，重新向前走必须和第一次完全相同
+    while sim.step() is not None:
+        assert fingerprint(sim) == states[sim.steps]
+    assert sim.steps == len(states) - 1
+
+
+def test_last_undo_reports_delta_or_snapshot(lattice):
+    graph, start, end = lattice
+    sim = DijkstraSimulator(graph, start, end, undo_limit=2, checkpoint_interval=4)
+    for _ in range(10):
+        sim.step()
+    kinds = []
+    for _ in range(4):
+        sim.step_back()
+        kinds.append(sim.last_undo[0])
+    # 从检查点重放时撤销记录重新填满，之后又是廉价的撤销
+    assert kinds == ['delta', 'delta', 'snapshot', 'delta']
+
+
+def test_checkpoints_are_bounded(lattice):
+    graph, start, end = lattice
+    sim = DijkstraSimulator(graph, start, end, checkpoint_interval=2, max_checkpoints=3)
+    run_forward(sim)
+    assert len(sim.checkpoints) == 3
+    assert max(sim.checkpoints) == sim.steps - sim.steps % 2
+    # 检查点是拷贝，之后的步骤不会改到它
+    snapshot = sim.checkpoints[min(sim.checkpoints)]
+    assert snapshot['steps'] == min(sim.checkpoints)
+    assert not np.shares_memory(snapshot['plane'], sim.node_state)